@@ -0,0 +1,267 @@
+"""
+任務即時狀態
+記錄每個執行中的下載任務（與解析請求）目前的策略、步驟、子程序與瀏覽器工作階段，
+供 GET /admin/state 查看卡住的任務在做什麼；同時依策略累計任務的資源成本（見 costs.py）
+
+以 ContextVar 取得目前任務：下載器、子程序監管器等只需呼叫本模組的函式，
+不在任務範圍內時（例如單元測試或預熱）皆不做任何事
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from .costs import Cost, cost_ledger
+
+# 不屬於任何策略的步驟（例如直接下載）
+_TASK_LEVEL = ""
+
+
+@dataclass
+class StrategyActivity:
+    """單一策略的進行狀態（對沖模式下同一任務可能同時有多個）"""
+    name: str
+    started_at: float
+    step: Optional[str] = None
+    step_started_at: Optional[float] = None
+
+
+@dataclass
+class TaskActivity:
+    """
+    Args:
+        task_id: 任務 ID（解析請求為 parse-<序號>）
+        kind: "download" 或 "parse"
+    """
+    task_id: str
+    platform: str
+    kind: str = "download"
+    started_at: float = field(default_factory=time.monotonic)
+    strategies: Dict[str, StrategyActivity] = field(default_factory=dict)
+    pids: Set[int] = field(default_factory=set)
+    browser_session: Optional[str] = None
+    browser_since: Optional[float] = None
+    costs: Dict[str, Cost] = field(default_factory=dict)  # 依策略累計（任務層級為 ""）
+    winner: Optional[str] = None  # 成功的策略
+
+    def cost_of(self, strategy: str) -> Cost:
+        return self.costs.setdefault(strategy, Cost())
+
+    def total_cost(self) -> Cost:
+        total = Cost()
+        for cost in self.costs.values():
+            total.add(cost)
+        return total
+
+    def summary(self) -> dict:
+        """任務結束時寫入嘗試紀錄的成本總結"""
+        return {
+            "step": "task",
+            "success": self.winner is not None,
+            "elapsed": round(time.monotonic() - self.started_at, 3),
+            "strategy": self.winner or None,
+            "cost": self.total_cost().as_dict(),
+        }
+
+    def snapshot(self, now: Optional[float] = None) -> dict:
+        now = now if now is not None else time.monotonic()
+        return {
+            "task_id": self.task_id,
+            "kind": self.kind,
+            "platform": self.platform,
+            "elapsed": round(now - self.started_at, 1),
+            "strategies": [
+                {
+                    "name": strategy.name or None,
+                    "elapsed": round(now - strategy.started_at, 1),
+                    "step": strategy.step,
+                    "step_elapsed": round(now - strategy.step_started_at, 1)
+                    if strategy.step_started_at is not None else None,
+                }
+                for strategy in self.strategies.values()
+            ],
+            "pids": sorted(self.pids),
+            "browser": {
+                "session": self.browser_session,
+                "elapsed": round(now - self.browser_since, 1),
+            } if self.browser_since is not None else None,
+            "cost": self.total_cost().as_dict(),
+        }
+
+
+_current_task: ContextVar[Optional[TaskActivity]] = ContextVar("current_task_activity", default=None)
+_current_strategy: ContextVar[str] = ContextVar("current_strategy", default=_TASK_LEVEL)
+
+
+class ActivityRegistry:
+    """執行中任務的登記表"""
+
+    def __init__(self):
+        self._active: Dict[str, TaskActivity] = {}
+        self._parse_sequence = 0
+
+    @contextmanager
+    def track(
+        self,
+        task_id: Optional[str],
+        platform: str,
+        kind: str = "download",
+    ) -> Iterator[TaskActivity]:
+        """
+        在此範圍內的呼叫都歸屬於該任務（task_id 為 None 時自動編號）
+
+        結束時各策略的成本計入全局成本帳
+        """
+        if task_id is None:
+            self._parse_sequence += 1
+            task_id = f"{kind}-{self._parse_sequence}"
+        activity = TaskActivity(task_id=task_id, platform=platform, kind=kind)
+        self._active[task_id] = activity
+        token = _current_task.set(activity)
+        try:
+            yield activity
+        finally:
+            _current_task.reset(token)
+            self._active.pop(task_id, None)
+            for strategy, cost in activity.costs.items():
+                cost_ledger.record(platform, strategy, cost)
+
+    def get(self, task_id: str) -> Optional[TaskActivity]:
+        return self._active.get(task_id)
+
+    def active_ids(self) -> Set[str]:
+        return set(self._active)
+
+    def snapshot(self) -> List[dict]:
+        now = time.monotonic()
+        return [activity.snapshot(now) for activity in list(self._active.values())]
+
+
+def current_activity() -> Optional[TaskActivity]:
+    return _current_task.get()
+
+
+@contextmanager
+def strategy_scope(name: str) -> Iterator[None]:
+    """標記目前執行的策略（於策略的 asyncio.Task 內設定，對沖時彼此獨立）"""
+    activity = _current_task.get()
+    if activity is None:
+        yield
+        return
+    activity.strategies[name] = StrategyActivity(name=name, started_at=time.monotonic())
+    token = _current_strategy.set(name)
+    try:
+        yield
+    finally:
+        _current_strategy.reset(token)
+        activity.strategies.pop(name, None)
+
+
+def set_step(step: str):
+    """記錄目前策略正在執行的步驟（ytdlp、cdn_download、render 等）"""
+    activity = _current_task.get()
+    if activity is None:
+        return
+    name = _current_strategy.get()
+    strategy = activity.strategies.get(name)
+    if strategy is None:
+        strategy = activity.strategies[name] = StrategyActivity(name=name, started_at=time.monotonic())
+    strategy.step = step
+    strategy.step_started_at = time.monotonic()
+
+
+def attach_pid(pid: int):
+    activity = _current_task.get()
+    if activity is not None:
+        activity.pids.add(pid)
+
+
+def detach_pid(pid: int):
+    activity = _current_task.get()
+    if activity is not None:
+        activity.pids.discard(pid)
+
+
+def attach_browser(session: Optional[str]):
+    activity = _current_task.get()
+    if activity is not None:
+        activity.browser_session = session
+        activity.browser_since = time.monotonic()
+
+
+def detach_browser():
+    """歸還瀏覽器，持有時間計入目前策略的成本"""
+    activity = _current_task.get()
+    if activity is not None and activity.browser_since is not None:
+        add_cost(browser_seconds=time.monotonic() - activity.browser_since)
+        activity.browser_session = None
+        activity.browser_since = None
+
+
+def add_cost(**amounts):
+    """把資源用量計入目前任務的目前策略，例如 add_cost(bytes_in=1024)"""
+    activity = _current_task.get()
+    if activity is None:
+        return
+    cost = activity.cost_of(_current_strategy.get())
+    for name, value in amounts.items():
+        setattr(cost, name, getattr(cost, name) + value)
+
+
+def strategy_cost(name: str) -> Optional[dict]:
+    """目前任務中某策略已累計的成本（沒有任何用量時為 None）"""
+    activity = _current_task.get()
+    if activity is None:
+        return None
+    cost = activity.costs.get(name)
+    return cost.as_dict() if cost else None
+
+
+def mark_succeeded():
+    """記錄目前策略為任務的成功策略"""
+    activity = _current_task.get()
+    if activity is not None:
+        activity.winner = _current_strategy.get()
+
+
+def directory_usage(path: str, task_ids: Iterable[str] = ()) -> dict:
+    """
+    目錄的檔案數與總大小、所在磁碟的剩餘空間，
+    以及各任務 <task_id>.* 檔案目前的大小（即已傳輸的位元組數，含對沖策略的暫存檔）
+
+    阻塞呼叫，於 cpu 執行緒池執行
+    """
+    wanted = set(task_ids)
+    per_task: Dict[str, int] = dict.fromkeys(wanted, 0)
+    files = size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                file_size = os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+            files += 1
+            size += file_size
+            task_id = name.split(".", 1)[0]
+            if root == path and task_id in wanted:
+                per_task[task_id] += file_size
+    try:
+        stat = os.statvfs(path)
+        free, total = stat.f_bavail * stat.f_frsize, stat.f_blocks * stat.f_frsize
+    except OSError:
+        free = total = None
+    return {
+        "path": path,
+        "files": files,
+        "bytes": size,
+        "disk_free": free,
+        "disk_total": total,
+        "tasks": per_task,
+    }
+
+
+# 全局登記表
+activity_registry = ActivityRegistry()
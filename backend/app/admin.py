@@ -0,0 +1,131 @@
+"""
+管理端點（/admin/*）
+線上診斷用：執行中任務與資源的即時狀態、CPU 取樣剖析、記憶體配置快照。以 X-Admin-Token 標頭驗證，
+未設定 admin_token 時所有端點回傳 404，如同不存在
+"""
+
+import hmac
+import sys
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from . import executors
+from .activity import activity_registry, directory_usage
+from .admission import admission
+from .config import get_settings
+from .executors import CPU, run_in_executor
+from .profiling import ProfilerBusy, collapsed, cpu_profiler, memory_tracker
+from .scheduler import scheduler
+from .supervisor import supervisor
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """驗證管理權杖（以固定時間比較，避免時間側通道）"""
+    token = get_settings().admin_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="管理權杖錯誤")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/state")
+async def state():
+    """
+    執行中任務與資源的即時狀態
+
+    - tasks：每個執行中任務（與解析請求）的策略、步驟、經過時間、已傳輸位元組、子程序 PID 與瀏覽器工作階段
+    - queued：已受理但仍在公平佇列中等待執行名額的任務
+    - lanes：各客戶端佇列與各類子程序的等待／執行數
+    - pools / executors / storage：瀏覽器池、子程序、記憶體准入、執行緒池與本地存儲用量
+    """
+    tasks = activity_registry.snapshot()
+    active = activity_registry.active_ids()
+    queued = [task_id for task_id in scheduler.task_ids() if task_id not in active]
+
+    storage = await run_in_executor(
+        CPU, directory_usage, get_settings().local_storage_path, [task["task_id"] for task in tasks]
+    )
+    await admission.sample()
+    transferred = storage.pop("tasks")
+    for task in tasks:
+        task["bytes_transferred"] = transferred.get(task["task_id"], 0)
+
+    subprocesses = supervisor.snapshot()
+    # 瀏覽器模組只在實際使用時才載入
+    browser = sys.modules.get("app.downloaders.browser")
+    return {
+        "tasks": tasks,
+        "queued": queued,
+        "lanes": {
+            "clients": scheduler.fair_queue.lanes(),
+            "subprocesses": {
+                kind: {
+                    "running": subprocesses["by_kind"].get(kind, 0),
+                    "waiting": subprocesses["waiting"].get(kind, 0),
+                    "limit": limit,
+                }
+                for kind, limit in subprocesses["limits"].items()
+            },
+        },
+        "pools": {
+            "tasks": scheduler.fair_queue.snapshot(),
+            "browsers": browser.driver_pool.snapshot() if browser is not None else None,
+            "subprocesses": {
+                "running": subprocesses["running"],
+                "children": subprocesses["children"],
+            },
+            "admission": admission.snapshot(),
+        },
+        "executors": executors.snapshot(),
+        "storage": storage,
+    }
+
+
+@router.post("/profile/cpu", response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = Query(10.0, gt=0),
+    interval: float = Query(0.005, ge=0.001, le=1.0),
+):
+    """
+    取樣所有執行緒 seconds 秒，回傳 collapsed stacks
+
+    輸出可直接交給 flamegraph.pl 或貼到 speedscope 產生火焰圖
+    """
+    max_seconds = get_settings().profile_max_seconds
+    if seconds > max_seconds:
+        raise HTTPException(status_code=400, detail=f"seconds 不可超過 {max_seconds}")
+    try:
+        stacks = await cpu_profiler.profile(seconds, interval)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(collapsed(stacks), headers={"X-Profile-Samples": str(sum(stacks.values()))})
+
+
+@router.post("/memory/start")
+async def memory_start(frames: int = Query(1, ge=1, le=64)):
+    """開始追蹤記憶體配置並記錄基準快照（已在追蹤時重設基準）"""
+    return await run_in_executor(CPU, memory_tracker.start, frames)
+
+
+@router.get("/memory/snapshot")
+async def memory_snapshot(
+    limit: int = Query(25, ge=1, le=500),
+    key_type: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    reset: bool = False,
+):
+    """與基準快照比較，列出增長最多的配置位置（reset=true 時以本次快照作為新基準）"""
+    try:
+        return await run_in_executor(CPU, memory_tracker.snapshot, limit, key_type, reset)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/memory/stop")
+async def memory_stop():
+    """停止追蹤並釋放快照"""
+    return memory_tracker.stop()
@@ -0,0 +1,276 @@
+"""
+記憶體感知的准入控制
+在固定記憶體的容器中同時執行 Chromium 與 ffmpeg，突發流量容易觸發 OOM 而遺失所有進行中的任務。
+此處讀取 cgroup 記憶體用量；沒有 cgroup 上限時改以本程序與所有子孫程序（Chromium、yt-dlp、ffmpeg）的 RSS
+對照設定的記憶體預算（未設定時為整機記憶體），不以整機用量判斷：
+- 超過高水位：延後新的瀏覽器啟動與下載，直到記憶體回落或等待逾時
+- 超過臨界水位或積壓過多：直接拒絕新任務（429/503 + Retry-After）
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+from . import executors
+from .config import get_settings
+
+_CGROUP_V2 = ("/sys/fs/cgroup/memory.current", "/sys/fs/cgroup/memory.max")
+_CGROUP_V1 = (
+    "/sys/fs/cgroup/memory/memory.usage_in_bytes",
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+)
+# cgroup v1 未設上限時回傳的極大值
+_UNLIMITED = 1 << 60
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    if value == "max":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def read_memory_total() -> Optional[int]:
+    """整機記憶體（/proc/meminfo 的 MemTotal，bytes）"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key == "MemTotal":
+                    return int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def read_memory_usage() -> Tuple[Optional[int], Optional[int]]:
+    """
+    讀取容器記憶體用量與上限（bytes）
+
+    優先 cgroup v2，其次 cgroup v1；沒有 cgroup 上限或無法讀取時回傳 (None, None)
+    """
+    for usage_path, limit_path in (_CGROUP_V2, _CGROUP_V1):
+        usage = _read_int(usage_path)
+        limit = _read_int(limit_path)
+        if usage is not None and limit is not None and limit < _UNLIMITED:
+            return usage, limit
+    return None, None
+
+
+def process_tree_rss() -> int:
+    """本程序加上所有子孫程序的 RSS（bytes）"""
+    return descendant_rss(include_root=True)
+
+
+def descendant_rss(root_pid: Optional[int] = None, include_root: bool = False) -> int:
+    """
+    加總所有子孫程序（chromedriver、Chromium、yt-dlp、ffmpeg 等）的 RSS（bytes）
+
+    阻塞呼叫（掃描整個 /proc），需在執行緒池中執行
+    """
+    root_pid = root_pid or os.getpid()
+    children = {}
+    rss = {}
+    page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return 0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        # fields[1] 為 ppid，fields[21] 為 rss（頁數）
+        pid = int(entry)
+        children.setdefault(int(fields[1]), []).append(pid)
+        rss[pid] = int(fields[21]) * page_size
+
+    total = rss.get(root_pid, 0) if include_root else 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total
+
+
+@dataclass
+class MemorySample:
+    usage: Optional[int]
+    limit: Optional[int]
+    tree_rss: int  # 本程序與子孫程序的 RSS
+    source: str  # cgroup：容器用量；process：程序樹 RSS 對照記憶體預算
+    sampled_at: float
+
+    @property
+    def ratio(self) -> float:
+        if not self.usage or not self.limit:
+            return 0.0
+        return self.usage / self.limit
+
+
+class AdmissionRejected(Exception):
+    """目前負載過高，拒絕新工作"""
+
+    def __init__(self, reason: str, retry_after: float, status_code: int = 503):
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+        super().__init__(reason)
+
+
+class AdmissionController:
+    """
+    准入控制器
+
+    Args:
+        high_watermark: 記憶體使用比例超過此值時延後瀏覽器啟動與下載
+        critical_watermark: 超過此值時拒絕新任務
+        max_backlog: 等待中加處理中的任務上限（0 表示不限制）
+        wait_timeout: 延後等待的最長秒數，逾時仍過高則放棄
+        retry_after: 拒絕時建議的重試秒數
+        sample_interval: 記憶體取樣快取時間
+        memory_limit: 沒有 cgroup 上限時的記憶體預算（bytes，0 表示整機記憶體）
+        reader: 讀取 cgroup (usage, limit) 的函式（測試可替換）
+        rss_reader: 讀取本程序與子孫程序 RSS 的函式
+    """
+
+    def __init__(
+        self,
+        high_watermark: float = 0.8,
+        critical_watermark: float = 0.92,
+        max_backlog: int = 0,
+        wait_timeout: float = 30.0,
+        retry_after: float = 10.0,
+        sample_interval: float = 1.0,
+        memory_limit: int = 0,
+        reader: Callable[[], Tuple[Optional[int], Optional[int]]] = read_memory_usage,
+        rss_reader: Callable[[], int] = process_tree_rss,
+    ):
+        self.high_watermark = high_watermark
+        self.critical_watermark = critical_watermark
+        self.max_backlog = max_backlog
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self.sample_interval = sample_interval
+        self.memory_limit = memory_limit
+        self._reader = reader
+        self._rss_reader = rss_reader
+        self._sample: Optional[MemorySample] = None
+        self._refreshing: Optional[asyncio.Future] = None
+        self.delayed = 0
+        self.rejected = 0
+
+    def _measure(self) -> MemorySample:
+        """讀取記憶體用量（阻塞呼叫，於 CPU 執行緒池執行）"""
+        usage, limit = self._reader()
+        tree_rss = self._rss_reader()
+        if limit:
+            return MemorySample(usage, limit, tree_rss, "cgroup", time.monotonic())
+        # 沒有 cgroup 上限：整機用量包含其他程序，改以程序樹 RSS 判斷
+        limit = self.memory_limit or read_memory_total()
+        return MemorySample(tree_rss, limit, tree_rss, "process", time.monotonic())
+
+    def _refreshed(self, future: asyncio.Future):
+        self._refreshing = None
+        if not future.cancelled() and future.exception() is None:
+            self._sample = future.result()
+
+    async def sample(self) -> MemorySample:
+        """
+        取得記憶體樣本：sample_interval 內重複使用上一次結果；
+        過期時在 CPU 執行緒池中重新取樣，同一時間只有一次取樣，所有等待者共用
+        """
+        sample = self._sample
+        if sample is not None and time.monotonic() - sample.sampled_at < self.sample_interval:
+            return sample
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(
+                executors.run_in_executor(executors.CPU, self._measure)
+            )
+            self._refreshing.add_done_callback(self._refreshed)
+        return await asyncio.shield(self._refreshing)
+
+    async def check_new_task(self, backlog: int):
+        """
+        建立任務前檢查；積壓過多拋出 429、記憶體達臨界水位拋出 503
+
+        Raises:
+            AdmissionRejected
+        """
+        if self.max_backlog and backlog >= self.max_backlog:
+            self.rejected += 1
+            raise AdmissionRejected(
+                "目前排隊的任務過多，請稍後再試", self.retry_after, status_code=429
+            )
+        if (await self.sample()).ratio >= self.critical_watermark:
+            self.rejected += 1
+            raise AdmissionRejected(
+                "伺服器忙碌中，請稍後再試", self.retry_after, status_code=503
+            )
+
+    async def wait_for_memory(self, kind: str, poll_interval: float = 0.5):
+        """
+        記憶體超過高水位時等待回落後才放行（瀏覽器啟動、下載前呼叫）
+
+        Raises:
+            AdmissionRejected: 等待逾時仍超過高水位
+        """
+        if (await self.sample()).ratio < self.high_watermark:
+            return
+        self.delayed += 1
+        print(f"⏳ 記憶體用量過高，延後 {kind}")
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+            if (await self.sample()).ratio < self.high_watermark:
+                return
+        self.rejected += 1
+        raise AdmissionRejected(
+            f"記憶體不足，暫停 {kind}，請稍後再試", self.retry_after, status_code=503
+        )
+
+    def snapshot(self) -> dict:
+        """最近一次樣本的狀態（呼叫端需先 await sample() 取得最新值）"""
+        sample = self._sample or MemorySample(None, None, 0, "none", time.monotonic())
+        return {
+            "memory_source": sample.source,
+            "memory_usage": sample.usage,
+            "memory_limit": sample.limit,
+            "memory_ratio": round(sample.ratio, 3),
+            "process_tree_rss": sample.tree_rss,
+            "high_watermark": self.high_watermark,
+            "critical_watermark": self.critical_watermark,
+            "max_backlog": self.max_backlog,
+            "delayed": self.delayed,
+            "rejected": self.rejected,
+        }
+
+
+def _create_controller(settings=None) -> AdmissionController:
+    settings = settings or get_settings()
+    return AdmissionController(
+        high_watermark=settings.memory_high_watermark,
+        critical_watermark=settings.memory_critical_watermark,
+        max_backlog=settings.max_backlog_tasks,
+        wait_timeout=settings.admission_wait_seconds,
+        retry_after=settings.admission_retry_after_seconds,
+        memory_limit=settings.memory_limit_mb * 1024 * 1024,
+    )
+
+
+# 全局准入控制器
+admission = _create_controller()
@@ -0,0 +1,117 @@
+"""
+瀏覽器層轉交
+lite 部署（deployment_profile=lite）不安裝 Chromium；只有瀏覽器才能取得的貼文，
+在設定 browser_worker_url 時轉交給另一組完整部署（full）的 worker，由本機代為查詢結果
+
+轉交的請求以 X-Worker-Token 帶上共用密鑰（browser_worker_token）並以 X-Forwarded-Client 附上原客戶端識別，
+讓瀏覽器 worker 的公平排程與限流仍依原客戶端分組，而不是全部算在 lite worker 的 IP 上
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urljoin
+
+import aiohttp
+
+from .config import get_settings
+from .deadline import budget
+
+# 瀏覽器 worker 上任務的終止狀態
+_FINISHED = ("completed", "failed", "cancelled")
+
+# 單一 HTTP 請求的逾時（整體時間受任務時限限制）
+_REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30)
+
+
+@dataclass
+class ForwardedDownload:
+    success: bool
+    download_url: Optional[str] = None
+    error: Optional[str] = None
+
+
+def enabled(settings=None) -> bool:
+    """是否有可轉交的瀏覽器 worker（full 部署本身不轉交）"""
+    settings = settings or get_settings()
+    return not settings.browser_enabled and bool(settings.browser_worker_url)
+
+
+def _headers(client: str) -> dict:
+    token = get_settings().browser_worker_token
+    if not token:
+        return {}
+    return {"X-Worker-Token": token, "X-Forwarded-Client": client}
+
+
+def _endpoint(path: str) -> str:
+    return urljoin(get_settings().browser_worker_url.rstrip("/") + "/", path.lstrip("/"))
+
+
+async def forward_download(
+    url: str,
+    platform: str,
+    media_type: Optional[str],
+    client: str,
+) -> ForwardedDownload:
+    """
+    在瀏覽器 worker 建立下載任務並輪詢到結束（受任務剩餘時間限制）
+
+    逾時或本機任務被取消時一併取消遠端任務
+    """
+    timeout = budget(get_settings().task_timeout_seconds)
+    try:
+        return await asyncio.wait_for(_forward_download(url, platform, media_type, client), timeout)
+    except asyncio.TimeoutError:
+        return ForwardedDownload(success=False, error="瀏覽器 worker 處理逾時")
+    except aiohttp.ClientError as e:
+        return ForwardedDownload(success=False, error=f"無法連線到瀏覽器 worker: {e}")
+
+
+async def _forward_download(url: str, platform: str, media_type: Optional[str], client: str) -> ForwardedDownload:
+    settings = get_settings()
+    async with aiohttp.ClientSession(timeout=_REQUEST_TIMEOUT, headers=_headers(client)) as session:
+        payload = {"url": url, "platform": platform, "mediaType": media_type}
+        async with session.post(_endpoint("/api/download"), json=payload) as resp:
+            if resp.status != 200:
+                return ForwardedDownload(success=False, error=f"瀏覽器 worker 拒絕任務（HTTP {resp.status}）")
+            task_id = (await resp.json())["taskId"]
+
+        try:
+            while True:
+                async with session.get(_endpoint(f"/api/status/{task_id}")) as resp:
+                    resp.raise_for_status()
+                    status = await resp.json()
+                if status["status"] in _FINISHED:
+                    break
+                await asyncio.sleep(settings.browser_worker_poll_interval)
+        except BaseException:
+            await asyncio.shield(_cancel_remote(session, task_id))
+            raise
+
+    if status["status"] != "completed":
+        return ForwardedDownload(success=False, error=status.get("error") or "瀏覽器 worker 下載失敗")
+    # 本地存儲的下載網址是相對路徑，改為指向瀏覽器 worker
+    return ForwardedDownload(success=True, download_url=_endpoint(status["downloadUrl"]))
+
+
+async def _cancel_remote(session: aiohttp.ClientSession, task_id: str):
+    try:
+        async with session.delete(_endpoint(f"/api/tasks/{task_id}"), timeout=aiohttp.ClientTimeout(total=5)):
+            pass
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        pass
+
+
+async def forward_parse(url: str, platform: str, client: str) -> dict:
+    """
+    請瀏覽器 worker 解析貼文，回傳其 /api/parse 的回應內容（受任務剩餘時間限制）
+
+    Raises:
+        aiohttp.ClientError / asyncio.TimeoutError: 無法連線或逾時
+    """
+    timeout = aiohttp.ClientTimeout(total=budget(get_settings().task_timeout_seconds))
+    async with aiohttp.ClientSession(timeout=timeout, headers=_headers(client)) as session:
+        async with session.post(_endpoint("/api/parse"), json={"url": url, "platform": platform}) as resp:
+            resp.raise_for_status()
+            return await resp.json()
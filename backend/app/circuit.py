@@ -0,0 +1,231 @@
+"""
+斷路器
+上游（yt-dlp 擷取器、Selenium、抖音 API、小紅書頁面、CDN 主機）連續失敗時快速失敗，
+避免每個請求都耗盡逾時時間，並以少量探測請求偵測上游恢復
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from enum import Enum
+from typing import Callable, Dict, Iterator
+from urllib.parse import urlparse
+
+from .config import get_settings
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，呼叫被拒絕"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(
+            f"上游服務暫時不可用（{name}），請於 {int(retry_after) + 1} 秒後再試"
+        )
+
+
+class CircuitCall:
+    """單次受保護呼叫，由呼叫端回報成功或失敗"""
+
+    def __init__(self, breaker: "CircuitBreaker", probe: bool):
+        self._breaker = breaker
+        self._probe = probe
+        self._done = False
+
+    def success(self):
+        if not self._done:
+            self._done = True
+            self._breaker._on_success(self._probe)
+
+    def failure(self):
+        if not self._done:
+            self._done = True
+            self._breaker._on_failure(self._probe)
+
+    def release(self):
+        """未回報結果就結束（例如任務被取消），僅釋放探測名額"""
+        if not self._done:
+            self._done = True
+            self._breaker._on_release(self._probe)
+
+
+class CircuitBreaker:
+    """
+    斷路器
+
+    CLOSED：正常放行，連續失敗達門檻後轉為 OPEN
+    OPEN：直接拒絕，經過 recovery_timeout 後轉為 HALF_OPEN
+    HALF_OPEN：僅放行少量探測請求，成功則 CLOSED，失敗則重新 OPEN
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 60.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> CircuitState:
+        if (
+            self._state == CircuitState.OPEN
+            and self._clock() - self._opened_at >= self.recovery_timeout
+        ):
+            self._state = CircuitState.HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        """距離下一次允許探測的秒數"""
+        with self._lock:
+            if self._current_state() != CircuitState.OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (self._clock() - self._opened_at))
+
+    def _acquire(self) -> CircuitCall:
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitState.CLOSED:
+                return CircuitCall(self, probe=False)
+            if (
+                state == CircuitState.HALF_OPEN
+                and self._probes_in_flight < self.half_open_max_calls
+            ):
+                self._probes_in_flight += 1
+                return CircuitCall(self, probe=True)
+            retry_after = max(
+                0.0, self.recovery_timeout - (self._clock() - self._opened_at)
+            )
+        raise CircuitOpenError(self.name, retry_after)
+
+    def _on_success(self, probe: bool):
+        with self._lock:
+            if probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            self._state = CircuitState.CLOSED
+            self._failures = 0
+
+    def _on_failure(self, probe: bool):
+        with self._lock:
+            if probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            self._failures += 1
+            if probe or self._failures >= self.failure_threshold:
+                self._state = CircuitState.OPEN
+                self._opened_at = self._clock()
+
+    def _on_release(self, probe: bool):
+        with self._lock:
+            if probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    @contextmanager
+    def guard(self) -> Iterator[CircuitCall]:
+        """
+        保護一次上游呼叫
+
+        斷路器開啟時拋出 CircuitOpenError；區塊內拋出例外視為失敗，
+        未回報結果即離開（例如被取消）則不計入統計
+
+        Example:
+            with breaker.guard() as call:
+                ok = await fetch()
+                if ok:
+                    call.success()
+                else:
+                    call.failure()
+        """
+        call = self._acquire()
+        try:
+            yield call
+        except Exception:
+            call.failure()
+            raise
+        finally:
+            call.release()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._current_state().value,
+                "failures": self._failures,
+            }
+
+
+class CircuitBreakerRegistry:
+    """依名稱管理斷路器（例如 threads:ytdlp、douyin:api、cdn:<host>）"""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 60.0,
+        half_open_max_calls: int = 1,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    failure_threshold=self.failure_threshold,
+                    recovery_timeout=self.recovery_timeout,
+                    half_open_max_calls=self.half_open_max_calls,
+                )
+                self._breakers[name] = breaker
+            return breaker
+
+    def for_cdn(self, url: str) -> CircuitBreaker:
+        """取得 CDN 主機對應的斷路器"""
+        host = urlparse(url).hostname or "unknown"
+        return self.get(f"cdn:{host}")
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+    def reset(self):
+        with self._lock:
+            self._breakers.clear()
+
+
+def _create_registry(settings=None) -> CircuitBreakerRegistry:
+    settings = settings or get_settings()
+    return CircuitBreakerRegistry(
+        failure_threshold=settings.circuit_failure_threshold,
+        recovery_timeout=settings.circuit_recovery_seconds,
+        half_open_max_calls=settings.circuit_half_open_probes,
+    )
+
+
+# 全局斷路器註冊表
+circuit_breakers = _create_registry()
@@ -0,0 +1,84 @@
+"""
+客戶端識別
+公平排程與限流共用：
+- API key 必須列在 api_keys 設定中才會採用，並以設定的名稱分組；未列出的 key 視同沒有
+- 只在直接連線的對端是內部位址（本機、私有網段）時才參考 X-Forwarded-For，
+  並跳過右側 forwarded_trusted_hops 個可信代理附加的位址，取第一個不可信的位址；
+  使用者自行帶入的值只會出現在更左側，無法冒充其他使用者
+- lite worker 轉交給瀏覽器 worker 的請求帶有共用密鑰（browser_worker_token），
+  以其附上的原客戶端識別分組與限流，不受 lite worker 本身 IP 的限制
+"""
+
+import hmac
+import ipaddress
+from typing import Dict, Optional
+
+from fastapi import Request
+from slowapi.util import get_remote_address
+
+from .config import get_settings
+
+
+def parse_api_keys(value: str) -> Dict[str, str]:
+    """解析 "name=key,name2=key2"，回傳 key → 名稱"""
+    keys: Dict[str, str] = {}
+    for item in value.split(","):
+        name, sep, key = item.strip().partition("=")
+        if sep and name.strip() and key.strip():
+            keys[key.strip()] = name.strip()
+    return keys
+
+
+def _is_internal(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return ip.is_loopback or ip.is_private
+
+
+def client_address(request: Request, settings=None) -> str:
+    """使用者 IP：從 X-Forwarded-For 右側跳過可信代理後的第一個位址"""
+    settings = settings or get_settings()
+    peer = get_remote_address(request)
+    hops = settings.forwarded_trusted_hops
+    forwarded_for = request.headers.get("X-Forwarded-For")
+    if hops <= 0 or not forwarded_for or not _is_internal(peer):
+        return peer
+    # 直接連線的對端算第一個可信代理，其餘代理各自附加了前一跳的位址
+    chain = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()] + [peer]
+    return chain[max(0, len(chain) - 1 - hops)]
+
+
+def forwarded_client(request: Request, settings=None) -> Optional[str]:
+    """帶有正確 X-Worker-Token 的轉交請求，回傳 lite worker 附上的原客戶端識別；其他請求回傳 None"""
+    settings = settings or get_settings()
+    token = settings.browser_worker_token
+    given = request.headers.get("X-Worker-Token")
+    client = request.headers.get("X-Forwarded-Client")
+    if not token or not given or not client:
+        return None
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        return None
+    return client
+
+
+def client_id(request: Request, settings=None) -> str:
+    """公平排程用的客戶端識別：轉交請求沿用原客戶端，有效的 API key 以名稱分組，否則以 IP 分組"""
+    settings = settings or get_settings()
+    forwarded = forwarded_client(request, settings)
+    if forwarded:
+        return forwarded
+    api_key = request.headers.get("X-API-Key")
+    name: Optional[str] = None
+    if api_key and settings.api_keys:
+        name = parse_api_keys(settings.api_keys).get(api_key)
+    if name:
+        return f"key:{name}"
+    return f"ip:{client_address(request, settings)}"
+
+
+def rate_limit_key(request: Request) -> str:
+    """限流計數的鍵：轉交請求以原客戶端計數，其餘以使用者 IP 計數"""
+    settings = get_settings()
+    return forwarded_client(request, settings) or client_address(request, settings)
@@ -6,6 +6,7 @@ class Settings(BaseSettings):
     # App settings
     app_name: str = "Video Downloader API"
     debug: bool = False
+    rate_limit_enabled: bool = True  # 每個 IP 的請求次數限制（壓力測試時關閉）
 
     # Cloudflare R2 settings
     r2_account_id: str = ""
@@ -23,9 +24,121 @@ class Settings(BaseSettings):
     gcs_bucket_name: str = ""
     gcs_project_id: str = ""  # Optional, auto-detected from environment
 
+    # Shared state settings（uvicorn --workers N 時各 worker 共用任務表與限流計數）
+    shared_state_path: str = ""  # SQLite 檔案所在目錄（留空表示各程序獨立的記憶體狀態）
+
     # Task settings
-    task_timeout_seconds: int = 300  # 5 minutes
-    max_concurrent_tasks: int = 5
+    task_timeout_seconds: int = 300  # 5 minutes，單一任務（含所有備援策略）的總時限
+    max_concurrent_tasks: int = 5  # 同時執行的下載任務上限（0 表示不限制）
+    # 自適應步驟逾時：依最近成功耗時的百分位數 × 倍數，限制在 [最小值, 預設逾時]
+    adaptive_timeout_enabled: bool = True
+    adaptive_timeout_percentile: float = 0.95
+    adaptive_timeout_multiplier: float = 2.0
+    adaptive_timeout_min_seconds: float = 10.0
+    adaptive_timeout_min_samples: int = 10
+    # 開始處理後超過此秒數無人查詢狀態即自動取消（0 表示不啟用；API/n8n 呼叫端可能很久才回來查詢，
+    # 啟用時請設得遠大於 task_timeout_seconds）
+    task_abandon_seconds: int = 0
+    task_watchdog_interval: float = 10.0  # 檢查無人查詢任務的間隔
+    task_retention_seconds: int = 86400  # 任務紀錄與本地檔案保留秒數，之後由定期清理刪除
+    cleanup_interval_seconds: float = 3600.0  # 定期清理的間隔
+
+    # Fair scheduling settings（依客戶端 IP 或 API key 分組，加權輪流分配 max_concurrent_tasks 個執行名額）
+    max_tasks_per_client: int = 2  # 單一客戶端同時執行的任務上限（0 表示不限制）
+    client_weights: str = ""  # 客戶端權重，例如 "key:partner=4,ip:10.0.0.5=2"（預設 1）
+    # 可用的 API key，例如 "partner=s3cr3t,n8n=abc"，以名稱分組（key:partner）；未列出的 key 視同沒有
+    api_keys: str = ""
+    # 直接連線的對端為內部位址時，X-Forwarded-For 右側有幾個可信代理附加的位址（0 表示不採用）；
+    # 預設 1 對應 Next.js 前端代理，讓經由前端的使用者各自分組與限流
+    forwarded_trusted_hops: int = 1
+
+    # Retry settings（僅重試暫時性錯誤與限流，指數退避 + 抖動）
+    retry_max_attempts: int = 3  # 單一步驟最多嘗試次數
+    retry_base_delay: float = 1.0  # 第一次重試前的最長等待秒數
+    retry_max_delay: float = 30.0  # 單次等待上限（含 Retry-After）
+    retry_budget_per_task: int = 4  # 每個任務所有步驟共用的重試次數
+
+    # Executor settings（各類阻塞工作使用獨立執行緒池）
+    storage_executor_workers: int = 8  # GCS/R2 SDK 呼叫與 URL 簽章
+    cpu_executor_workers: int = 2  # 檔案讀取、編碼等 CPU 工作
+
+    # Subprocess settings
+    max_ytdlp_processes: int = 4  # 同時執行的 yt-dlp 上限
+    max_curl_processes: int = 8
+    max_ffmpeg_processes: int = 2
+    subprocess_memory_limit_mb: int = 0  # 單一子程序記憶體上限（0 表示不限制）
+    subprocess_cpu_limit_seconds: int = 0  # 單一子程序 CPU 秒數上限（0 表示不限制）
+
+    # Admission control settings（依容器記憶體用量延後或拒絕新工作）
+    memory_high_watermark: float = 0.8  # 超過此比例延後瀏覽器啟動與下載
+    memory_critical_watermark: float = 0.92  # 超過此比例拒絕新任務（503）
+    memory_limit_mb: int = 0  # 沒有 cgroup 上限時，本程序與子程序 RSS 的記憶體預算（0 表示整機記憶體）
+    max_backlog_tasks: int = 50  # 等待中 + 處理中任務上限，超過回傳 429（0 表示不限制）
+    admission_wait_seconds: float = 30.0  # 延後等待的最長秒數
+    admission_retry_after_seconds: int = 10  # Retry-After 標頭秒數
+
+    # Strategy planner settings
+    strategy_window_size: int = 50  # 每個策略保留最近 N 次結果
+    strategy_min_samples: int = 5  # 判定失效前所需的最少樣本數
+    strategy_broken_threshold: float = 0.1  # 成功率低於此值視為失效
+    strategy_explore_ratio: float = 0.05  # 失效策略仍接收的探測流量比例
+
+    # Hedged strategy settings（錯開啟動多個策略，取最先成功者並取消其餘）
+    hedge_enabled: bool = False
+    hedge_delay_seconds: float = 10.0  # 啟動下一個策略前的等待秒數（0 表示同時啟動）
+
+    # Deployment profile settings
+    # full：含 Chromium，可執行瀏覽器策略；lite：不匯入 Selenium、不啟動瀏覽器，只用 yt-dlp 與 HTTP 擷取
+    deployment_profile: str = "full"
+    # lite 部署時，需要瀏覽器的任務轉交給此 full 部署（例如 http://browser-worker:8080，留空則直接回報失敗）
+    browser_worker_url: str = ""
+    browser_worker_poll_interval: float = 1.0  # 查詢轉交任務狀態的間隔
+    # lite 與 full 部署共用的密鑰：轉交請求以 X-Worker-Token 驗證，瀏覽器 worker 依原客戶端分組與限流
+    # （未設定時轉交請求全部來自 lite worker 的 IP，共用同一組限流與排程分組）
+    browser_worker_token: str = ""
+    # 瀏覽器渲染服務（python -m app.render_service），設定後瀏覽器策略改由該程序渲染，本程序不啟動 Chrome
+    # 例如 http://127.0.0.1:8090 或 unix:/tmp/video-downloader/render.sock；lite 部署也可使用
+    render_service_url: str = ""
+    render_service_concurrency: int = 2  # 渲染服務同時渲染數（超過 browser_executor_workers 時以後者為上限）
+    render_service_queue_size: int = 8  # 渲染服務等待中的請求上限，超過時回傳 503
+
+    # Browser settings
+    browser_capture_timeout: float = 15.0  # 等待媒體網路回應的硬性截止秒數
+    browser_executor_workers: int = 4  # WebDriver 呼叫專用執行緒數（browser 執行緒池）
+    browser_pool_size: int = 0  # 保留的閒置瀏覽器數量（0 表示每次新建）
+    chromedriver_path: str = ""  # 指定 chromedriver 路徑（留空則自動解析）
+    chromedriver_cache_file: str = "/tmp/video-downloader/chromedriver.json"  # 解析結果快取
+
+    # Session reuse settings（瀏覽器渲染取得的 cookie 供 HTTP 擷取與 yt-dlp 重用）
+    session_reuse_enabled: bool = True
+    session_dir: str = "/tmp/video-downloader/sessions"  # 各平台 cookie 的持久化目錄（留空表示只存在記憶體）
+    session_max_age_seconds: float = 21600.0  # 擷取後多久輪替（cookie 本身較早到期者先失效）
+
+    # Warm-up settings（伺服器啟動後於背景預熱）
+    warmup_enabled: bool = False
+    warmup_ytdlp: bool = True  # 預先執行一次 yt-dlp，讓後續呼叫命中檔案快取
+
+    # Admin settings（/admin/* 診斷端點，需帶 X-Admin-Token 標頭）
+    admin_token: str = ""  # 留空表示停用所有管理端點
+    profile_max_seconds: float = 60.0  # 單次 CPU 剖析的最長秒數
+
+    # Event loop monitor settings
+    loop_lag_interval: float = 0.5  # 取樣間隔（秒）
+    loop_lag_threshold_ms: float = 100.0  # 超過此延遲視為事件迴圈被阻塞
+
+    # Circuit breaker settings
+    circuit_failure_threshold: int = 5  # 連續失敗幾次後開啟斷路器
+    circuit_recovery_seconds: float = 60.0  # 開啟後多久進入半開狀態
+    circuit_half_open_probes: int = 1  # 半開狀態同時允許的探測請求數
+
+    @property
+    def browser_enabled(self) -> bool:
+        return self.deployment_profile.lower() != "lite"
+
+    @property
+    def browser_available(self) -> bool:
+        """可執行瀏覽器策略（本機 Chrome 或渲染服務）"""
+        return self.browser_enabled or bool(self.render_service_url)
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,84 @@
+"""
+任務成本統計
+記錄每個任務消耗的資源，依平台與策略彙總，找出成本最高的下載路徑：
+- cpu_seconds：子程序（yt-dlp、curl、ffmpeg）的 CPU 時間
+- browser_seconds：持有瀏覽器的時間
+- bytes_in：自上游接收的位元組（curl/yt-dlp 輸出檔、curl 回應、HTTP 頁面）
+- bytes_out：提供給客戶端下載的位元組
+- storage_bytes：寫入存儲的成品檔案大小
+"""
+
+from dataclasses import asdict, dataclass
+from typing import Dict, Tuple
+
+try:
+    import resource
+except ImportError:  # 非 Unix 平台
+    resource = None
+
+# 不屬於任何策略的成本（例如直接下載模式、提供檔案下載）
+TASK_LEVEL = "task"
+
+
+@dataclass
+class Cost:
+    cpu_seconds: float = 0.0
+    browser_seconds: float = 0.0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    storage_bytes: int = 0
+
+    def add(self, other: "Cost"):
+        self.cpu_seconds += other.cpu_seconds
+        self.browser_seconds += other.browser_seconds
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+        self.storage_bytes += other.storage_bytes
+
+    def __bool__(self) -> bool:
+        return any(asdict(self).values())
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["cpu_seconds"] = round(self.cpu_seconds, 3)
+        data["browser_seconds"] = round(self.browser_seconds, 3)
+        return data
+
+
+class CostLedger:
+    """依 (平台, 策略) 累計成本"""
+
+    def __init__(self):
+        self._totals: Dict[Tuple[str, str], Cost] = {}
+        self._counts: Dict[Tuple[str, str], int] = {}
+
+    def record(self, platform: str, strategy: str, cost: Cost, count: bool = True):
+        """
+        Args:
+            count: 是否計入該策略的執行次數（事後追加的成本，例如客戶端下載，不重複計數）
+        """
+        key = (platform, strategy or TASK_LEVEL)
+        self._totals.setdefault(key, Cost()).add(cost)
+        if count:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def totals(self, platform: str, strategy: str) -> Cost:
+        return self._totals.get((platform, strategy or TASK_LEVEL), Cost())
+
+    def snapshot(self) -> dict:
+        by_platform: Dict[str, dict] = {}
+        for (platform, strategy), cost in sorted(self._totals.items()):
+            by_platform.setdefault(platform, {})[strategy] = {
+                **cost.as_dict(),
+                "runs": self._counts.get((platform, strategy), 0),
+            }
+        result = {"by_platform": by_platform}
+        # 已回收子程序的 CPU 時間總計（各任務的 cpu_seconds 為取樣值，可用來估計誤差）
+        if resource is not None:
+            usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            result["children_cpu_seconds"] = round(usage.ru_utime + usage.ru_stime, 3)
+        return result
+
+
+# 全局成本帳
+cost_ledger = CostLedger()
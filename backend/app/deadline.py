@@ -0,0 +1,153 @@
+"""
+任務截止時間與自適應步驟逾時
+- 每個任務有一個端到端截止時間（task_timeout_seconds），透過 contextvars 傳遞到下載器鏈，
+  每個步驟只能使用剩餘的時間預算
+- 各平台各步驟的逾時依實際成功延遲的百分位數調整，不再一律使用寫死的 60/120/300 秒
+  （僅限耗時固定的步驟；檔案傳輸的耗時取決於檔案大小，維持預設逾時）
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, Iterator, Optional, Tuple
+
+from .config import get_settings
+
+
+class Deadline:
+    """任務截止時間"""
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.seconds = seconds
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def clamp(self, timeout: float) -> float:
+        """步驟逾時不超過剩餘預算"""
+        return min(timeout, self.remaining())
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("task_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[Deadline]:
+    """
+    設定目前任務的截止時間（在此區塊內建立的 asyncio 任務會繼承）
+
+    若外層已有更早的截止時間則沿用外層
+    """
+    deadline = Deadline(seconds)
+    outer = _current.get()
+    if outer is not None and outer.expires_at <= deadline.expires_at:
+        deadline = outer
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def budget(timeout: float) -> float:
+    """步驟可用的逾時秒數（有截止時間時取兩者較小值）"""
+    deadline = _current.get()
+    return timeout if deadline is None else deadline.clamp(timeout)
+
+
+# 傳輸檔案的步驟：耗時與檔案大小成正比，一串短片的經驗值會在大檔案傳到一半時誤殺，不做自適應
+TRANSFER_STEPS = frozenset({"cdn_download", "ytdlp_download"})
+
+
+class StepTimeouts:
+    """
+    自適應步驟逾時
+
+    記錄各 (平台, 步驟) 最近成功的耗時；樣本足夠時，逾時 = 百分位數 × 倍數，
+    並限制在 [min_timeout, 預設逾時] 之間（TRANSFER_STEPS 一律使用預設逾時）
+    """
+
+    def __init__(
+        self,
+        window_size: int = 100,
+        min_samples: int = 10,
+        percentile: float = 0.95,
+        multiplier: float = 2.0,
+        min_timeout: float = 10.0,
+        enabled: bool = True,
+    ):
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_timeout = min_timeout
+        self.enabled = enabled
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, platform: str, step: str, elapsed: float):
+        if step in TRANSFER_STEPS:
+            return
+        with self._lock:
+            samples = self._samples.setdefault(
+                (platform, step), deque(maxlen=self.window_size)
+            )
+            samples.append(elapsed)
+
+    def _percentile(self, samples: Deque[float]) -> float:
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(self.percentile * len(ordered)) - 1))
+        return ordered[index]
+
+    def timeout_for(self, platform: str, step: str, default: float) -> float:
+        """取得步驟逾時；傳輸步驟、樣本不足或未啟用時使用預設值"""
+        if not self.enabled or step in TRANSFER_STEPS:
+            return default
+        with self._lock:
+            samples = self._samples.get((platform, step))
+            if not samples or len(samples) < self.min_samples:
+                return default
+            observed = self._percentile(samples)
+        return min(default, max(self.min_timeout, observed * self.multiplier))
+
+    def snapshot(self) -> Dict[str, Dict[str, dict]]:
+        with self._lock:
+            result: Dict[str, Dict[str, dict]] = {}
+            for (platform, step), samples in self._samples.items():
+                result.setdefault(platform, {})[step] = {
+                    "samples": len(samples),
+                    f"p{round(self.percentile * 100)}": round(self._percentile(samples), 3),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+def _create_step_timeouts(settings=None) -> StepTimeouts:
+    settings = settings or get_settings()
+    return StepTimeouts(
+        min_samples=settings.adaptive_timeout_min_samples,
+        percentile=settings.adaptive_timeout_percentile,
+        multiplier=settings.adaptive_timeout_multiplier,
+        min_timeout=settings.adaptive_timeout_min_seconds,
+        enabled=settings.adaptive_timeout_enabled,
+    )
+
+
+# 全局步驟逾時統計
+step_timeouts = _create_step_timeouts()
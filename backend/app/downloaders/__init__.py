@@ -1,31 +1,44 @@
 from .base import BaseDownloader
-from .threads import ThreadsDownloader
-from .xiaohongshu import XiaohongshuDownloader
-from .douyin import DouyinDownloader
 from typing import Optional
+import importlib
+
+# 下載器類別 → 模組；首次使用時才載入，縮短冷啟動時間
+_DOWNLOADER_MODULES = {
+    "ThreadsDownloader": ".threads",
+    "XiaohongshuDownloader": ".xiaohongshu",
+    "DouyinDownloader": ".douyin",
+}
+
+_PLATFORM_DOWNLOADERS = {
+    "threads": "ThreadsDownloader",
+    "xiaohongshu": "XiaohongshuDownloader",
+    "douyin": "DouyinDownloader",
+}
+
+
+def __getattr__(name):
+    module_name = _DOWNLOADER_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module_name, __name__), name)
 
 
 def get_downloader(url: str) -> Optional[BaseDownloader]:
     """根據 URL 自動選擇對應的下載器"""
     # 支援 threads.net 和 threads.com
     if "threads.net" in url or "threads.com" in url:
-        return ThreadsDownloader()
+        return get_downloader_by_platform("threads")
     elif "xiaohongshu.com" in url or "xhslink.com" in url:
-        return XiaohongshuDownloader()
+        return get_downloader_by_platform("xiaohongshu")
     elif "douyin.com" in url or "tiktok.com" in url:
-        return DouyinDownloader()
+        return get_downloader_by_platform("douyin")
     return None
 
 
 def get_downloader_by_platform(platform: str) -> Optional[BaseDownloader]:
     """根據平台名稱選擇下載器"""
-    downloaders = {
-        "threads": ThreadsDownloader,
-        "xiaohongshu": XiaohongshuDownloader,
-        "douyin": DouyinDownloader,
-    }
-    downloader_class = downloaders.get(platform)
-    return downloader_class() if downloader_class else None
+    class_name = _PLATFORM_DOWNLOADERS.get(platform)
+    return __getattr__(class_name)() if class_name else None
 
 
 __all__ = [
@@ -3,9 +3,28 @@
 所有平台下載器都繼承此類
 """
 
+import asyncio
+import os
+import time
 from abc import ABC, abstractmethod
-from typing import Callable, Optional, Tuple, List
-from dataclasses import dataclass, field
+from functools import partial
+from typing import Awaitable, Callable, Dict, Optional, Tuple, List
+from dataclasses import dataclass, field, replace
+
+from ..activity import add_cost, mark_succeeded, set_step, strategy_cost, strategy_scope
+from ..circuit import CircuitOpenError, circuit_breakers
+from ..config import get_settings
+from ..deadline import budget, current_deadline, step_timeouts
+from ..retry import ERROR_PERMANENT, AttemptFailed, record_attempt
+from ..supervisor import supervisor
+from . import cdn
+from .planner import strategy_planner
+
+# 錯誤類型：斷路器開啟，呼叫未執行即失敗
+ERROR_CIRCUIT_OPEN = "circuit_open"
+ERROR_DEADLINE = "deadline"
+# lite 部署略過了瀏覽器策略，其他策略都無法取得
+ERROR_NEEDS_BROWSER = "needs_browser"
 
 
 @dataclass
@@ -13,6 +32,7 @@ class DownloadResult:
     success: bool
     file_path: Optional[str] = None
     error: Optional[str] = None
+    error_kind: Optional[str] = None
 
 
 @dataclass
@@ -32,6 +52,7 @@ class ParseResult:
     success: bool
     media: List[MediaItem] = field(default_factory=list)
     error: Optional[str] = None
+    error_kind: Optional[str] = None
 
 
 class BaseDownloader(ABC):
@@ -39,6 +60,15 @@ class BaseDownloader(ABC):
 
     platform_name: str = "unknown"
 
+    # 下載策略鏈（預設順序），名稱 xxx 對應方法 _try_xxx
+    download_strategies: Tuple[str, ...] = ()
+
+    # 解析策略鏈（預設順序），名稱 xxx 對應方法 _parse_with_xxx
+    parse_strategies: Tuple[str, ...] = ()
+
+    # 需要瀏覽器的策略（lite 部署時略過）
+    browser_strategies: Tuple[str, ...] = ()
+
     @abstractmethod
     async def download(
         self,
@@ -88,3 +118,336 @@ class BaseDownloader(ABC):
         """安全地更新進度"""
         if progress_callback:
             progress_callback(min(100, max(0, value)))
+
+    async def _run_process(
+        self,
+        command: List[str],
+        timeout: float,
+        step: Optional[str] = None,
+    ) -> Tuple[int, bytes, bytes]:
+        """
+        執行子程序並等待結束（經由子程序監管器）
+
+        逾時或任務被取消時會終止整個程序群組，避免殘留的 yt-dlp/curl 繼續佔用資源
+
+        Args:
+            timeout: 步驟的預設（最大）逾時；實際值依該步驟的歷史耗時調整，且不超過任務剩餘時間
+            step: 步驟名稱（用於自適應逾時統計），預設為執行檔名稱
+
+        Returns:
+            (returncode, stdout, stderr)
+        """
+        step = step or supervisor.classify(command)
+        timeout = budget(step_timeouts.timeout_for(self.platform_name, step, timeout))
+        set_step(step)
+        started = time.monotonic()
+        returncode, stdout, stderr = await supervisor.run(command, timeout=timeout)
+        if returncode == 0:
+            step_timeouts.record(self.platform_name, step, time.monotonic() - started)
+        return returncode, stdout, stderr
+
+    async def _download_media(
+        self,
+        media_url: str,
+        output_path: str,
+        progress_callback: Optional[Callable[[int], None]],
+        user_agent: str = cdn.DESKTOP_USER_AGENT,
+        referer: Optional[str] = None,
+    ) -> DownloadResult:
+        """從 CDN 下載媒體檔案（暫時性錯誤與限流依重試策略退避後重試）"""
+        run = partial(self._run_process, step="cdn_download")
+        try:
+            await cdn.fetch_to_file(
+                media_url, output_path, run, user_agent=user_agent, referer=referer
+            )
+        except AttemptFailed as e:
+            # 單一 CDN 網址失效（ERROR_MEDIA）不代表貼文不存在，不中止策略鏈
+            return DownloadResult(success=False, error=str(e), error_kind=e.kind)
+        except CircuitOpenError as e:
+            return DownloadResult(success=False, error=str(e), error_kind=ERROR_CIRCUIT_OPEN)
+
+        self._update_progress(progress_callback, 100)
+        return DownloadResult(success=True, file_path=output_path)
+
+    async def _run_download_strategies(
+        self,
+        url: str,
+        output_path: str,
+        progress_callback: Optional[Callable[[int], None]],
+    ) -> DownloadResult:
+        """依策略規劃器排定的順序嘗試下載策略，並回報每次結果"""
+        result = DownloadResult(success=False)
+        strategies = self._available_strategies(self.download_strategies)
+        skipped = len(strategies) < len(self.download_strategies)
+        plan = strategy_planner.plan(self.platform_name, strategies)
+
+        settings = get_settings()
+        if settings.hedge_enabled and len(plan) > 1:
+            result = await self._run_hedged_download(
+                plan, url, output_path, progress_callback, settings.hedge_delay_seconds
+            )
+            return self._needs_browser(result, skipped)
+
+        results = []
+        for name in plan:
+            result = await self._attempt_download(name, url, output_path, progress_callback)
+            if result.success:
+                return result
+            results.append(result)
+            # 貼文不存在或為私人貼文，其他策略也不會成功
+            if result.error_kind == ERROR_PERMANENT:
+                break
+
+        return self._needs_browser(self._merge_failures(results, result), skipped)
+
+    async def _run_hedged_download(
+        self,
+        plan: List[str],
+        url: str,
+        output_path: str,
+        progress_callback: Optional[Callable[[int], None]],
+        delay: float,
+    ) -> DownloadResult:
+        """
+        對沖模式：各策略寫入各自的暫存檔並錯開啟動，
+        先成功者的檔案移到 output_path，其餘策略取消並清除暫存檔
+        """
+        part_paths = [self._strategy_output_path(output_path, name) for name in plan]
+        progress = _MonotonicProgress(progress_callback)
+
+        attempts = [
+            partial(self._attempt_download, name, url, part_path, progress)
+            for name, part_path in zip(plan, part_paths)
+        ]
+        winner, result = await self._hedge(attempts, delay)
+
+        for index, part_path in enumerate(part_paths):
+            if index != winner and os.path.exists(part_path):
+                os.remove(part_path)
+
+        if winner is None:
+            return result
+
+        os.replace(part_paths[winner], output_path)
+        return DownloadResult(success=True, file_path=output_path)
+
+    async def _run_parse_strategies(self, url: str) -> ParseResult:
+        """依策略規劃器排定的順序嘗試解析策略"""
+        result = ParseResult(success=False, error="找不到媒體")
+        strategies = self._available_strategies(self.parse_strategies)
+        skipped = len(strategies) < len(self.parse_strategies)
+        plan = strategy_planner.plan(self.platform_name, [f"parse_{name}" for name in strategies])
+
+        settings = get_settings()
+        if settings.hedge_enabled and len(plan) > 1:
+            attempts = [partial(self._attempt_parse, key, url) for key in plan]
+            _, result = await self._hedge(attempts, settings.hedge_delay_seconds)
+            return self._needs_browser(result, skipped)
+
+        results = []
+        for key in plan:
+            result = await self._attempt_parse(key, url)
+            if result.success:
+                return result
+            results.append(result)
+            if result.error_kind == ERROR_PERMANENT:
+                break
+
+        return self._needs_browser(self._merge_failures(results, result), skipped)
+
+    def _available_strategies(self, strategies: Tuple[str, ...]) -> Tuple[str, ...]:
+        """目前部署可用的策略（lite 部署且未設定渲染服務時不含瀏覽器策略）"""
+        if get_settings().browser_available:
+            return strategies
+        return tuple(name for name in strategies if name not in self.browser_strategies)
+
+    @staticmethod
+    def _needs_browser(result, skipped: bool):
+        """
+        略過了瀏覽器策略且其餘策略都失敗時，改為明確回報需要瀏覽器層
+        （貼文不存在、時限用盡等瀏覽器也無法解決的失敗維持原結果）
+        """
+        if result.success or not skipped or result.error_kind in (ERROR_PERMANENT, ERROR_DEADLINE):
+            return result
+        return replace(
+            result,
+            error=f"此貼文需要瀏覽器渲染，目前的 lite 部署未啟用瀏覽器（{result.error or '其他方式皆失敗'}）",
+            error_kind=ERROR_NEEDS_BROWSER,
+        )
+
+    async def _attempt_download(
+        self,
+        name: str,
+        url: str,
+        output_path: str,
+        progress_callback: Optional[Callable[[int], None]],
+    ) -> DownloadResult:
+        """
+        執行單一下載策略並回報給策略規劃器（被取消時不記錄）
+
+        每個策略受 "<平台>:<策略>" 斷路器保護，開啟時直接失敗
+        """
+        method = getattr(self, f"_try_{name}")
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            return DownloadResult(success=False, error="已超過任務時限", error_kind=ERROR_DEADLINE)
+        try:
+            with self._strategy_breaker(name).guard() as call, strategy_scope(name):
+                started = time.monotonic()
+                try:
+                    result = await self._within_deadline(
+                        method(url, output_path, progress_callback)
+                    )
+                except Exception as e:
+                    result = DownloadResult(success=False, error=str(e))
+                elapsed = time.monotonic() - started
+                if result.success:
+                    mark_succeeded()
+                    if os.path.exists(output_path):
+                        add_cost(storage_bytes=os.path.getsize(output_path))
+                # 時間預算用盡不代表策略失效，不計入統計
+                if not result.success and deadline is not None and deadline.expired:
+                    record_attempt(name, False, elapsed, ERROR_DEADLINE, cost=strategy_cost(name))
+                    return DownloadResult(success=False, error="已超過任務時限", error_kind=ERROR_DEADLINE)
+                record_attempt(name, result.success, elapsed, result.error_kind, cost=strategy_cost(name))
+                # 貼文本身無法取得、上游主機的斷路器開啟（快速失敗）都不代表策略失效
+                if result.error_kind not in (ERROR_PERMANENT, ERROR_CIRCUIT_OPEN):
+                    strategy_planner.record(self.platform_name, name, result.success, elapsed)
+                    if result.success:
+                        call.success()
+                    else:
+                        call.failure()
+                return result
+        except CircuitOpenError as e:
+            return DownloadResult(success=False, error=str(e), error_kind=ERROR_CIRCUIT_OPEN)
+
+    async def _attempt_parse(self, key: str, url: str) -> ParseResult:
+        """執行單一解析策略並回報給策略規劃器（被取消時不記錄）"""
+        name = key[len("parse_"):]
+        method = getattr(self, f"_parse_with_{name}")
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            return ParseResult(success=False, error="已超過任務時限", error_kind=ERROR_DEADLINE)
+        try:
+            # 解析與下載共用同一上游依賴的斷路器
+            with self._strategy_breaker(name).guard() as call, strategy_scope(key):
+                started = time.monotonic()
+                try:
+                    result = await self._within_deadline(method(url))
+                except Exception as e:
+                    result = ParseResult(success=False, error=str(e))
+                elapsed = time.monotonic() - started
+                if result.success:
+                    mark_succeeded()
+                if not result.success and deadline is not None and deadline.expired:
+                    record_attempt(key, False, elapsed, ERROR_DEADLINE, cost=strategy_cost(key))
+                    return ParseResult(success=False, error="已超過任務時限", error_kind=ERROR_DEADLINE)
+                record_attempt(key, result.success, elapsed, result.error_kind, cost=strategy_cost(key))
+                if result.error_kind not in (ERROR_PERMANENT, ERROR_CIRCUIT_OPEN):
+                    strategy_planner.record(self.platform_name, key, result.success, elapsed)
+                    if result.success:
+                        call.success()
+                    else:
+                        call.failure()
+                return result
+        except CircuitOpenError as e:
+            return ParseResult(success=False, error=str(e), error_kind=ERROR_CIRCUIT_OPEN)
+
+    @staticmethod
+    async def _within_deadline(coro: Awaitable):
+        """在任務剩餘時間內執行，逾時拋出 asyncio.TimeoutError"""
+        deadline = current_deadline()
+        if deadline is None:
+            return await coro
+        return await asyncio.wait_for(coro, timeout=deadline.remaining())
+
+    def _strategy_breaker(self, strategy: str):
+        """取得策略對應的斷路器，例如 threads:ytdlp"""
+        return circuit_breakers.get(f"{self.platform_name}:{strategy}")
+
+    async def _hedge(
+        self,
+        attempts: List[Callable[[], Awaitable]],
+        delay: float,
+    ) -> Tuple[Optional[int], object]:
+        """
+        錯開啟動多個嘗試，取第一個成功的結果並取消其餘嘗試
+
+        每經過 delay 秒仍無結果就啟動下一個嘗試；某個嘗試失敗時立即啟動下一個。
+
+        Returns:
+            (成功嘗試的索引, 結果)；全部失敗時索引為 None，結果為最後一個失敗結果
+        """
+        pending: Dict[asyncio.Future, int] = {}
+        next_index = 0
+        last_result = None
+
+        def launch():
+            nonlocal next_index
+            task = asyncio.ensure_future(attempts[next_index]())
+            pending[task] = next_index
+            next_index += 1
+
+        launch()
+        try:
+            while pending:
+                has_more = next_index < len(attempts)
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=max(0.0, delay) if has_more else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    launch()
+                    continue
+
+                for task in done:
+                    index = pending.pop(task)
+                    result = task.result()
+                    if result.success:
+                        return index, result
+                    last_result = result
+                    if next_index < len(attempts):
+                        launch()
+
+            return None, last_result
+        finally:
+            # 取消落敗的嘗試，並等待其清理子程序與瀏覽器
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    @staticmethod
+    def _merge_failures(results: list, default):
+        """
+        合併策略鏈的失敗結果
+
+        若有策略實際執行完畢，回傳最後一個執行完畢的失敗結果；
+        若因時限中止則回傳時限錯誤；若全部被斷路器擋下，回傳斷路器錯誤讓呼叫端快速、明確地失敗
+        """
+        for skipped in ((ERROR_CIRCUIT_OPEN, ERROR_DEADLINE), (ERROR_CIRCUIT_OPEN,)):
+            executed = [r for r in results if r.error_kind not in skipped]
+            if executed:
+                return executed[-1]
+        return results[-1] if results else default
+
+    @staticmethod
+    def _strategy_output_path(output_path: str, strategy: str) -> str:
+        """對沖模式下各策略的暫存輸出路徑，例如 abc.mp4 → abc.ytdlp.mp4"""
+        root, ext = os.path.splitext(output_path)
+        return f"{root}.{strategy}{ext}"
+
+
+class _MonotonicProgress:
+    """確保進度只增不減（對沖模式下多個策略會同時回報進度）"""
+
+    def __init__(self, progress_callback: Optional[Callable[[int], None]]):
+        self._callback = progress_callback
+        self._value = 0
+
+    def __call__(self, value: int):
+        if value > self._value:
+            self._value = value
+            if self._callback:
+                self._callback(value)
@@ -0,0 +1,378 @@
+"""
+瀏覽器工具
+建立 headless Chrome，並透過 DevTools 協定監聽網路事件，
+在觀察到媒體回應（fbcdn / cdninstagram 的 mp4 或 DASH 片段）時立即返回
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, TypeVar
+from urllib.parse import urlparse
+
+from .. import executors
+from ..config import get_settings
+from ..media_scan import strip_range_params
+
+T = TypeVar("T")
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+# 不需要的資源類型，直接在網路層封鎖以節省頻寬與渲染時間
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.css",
+]
+
+MEDIA_HOSTS = ("fbcdn.net", "cdninstagram.com")
+
+_MEDIA_PATH_RE = re.compile(r"\.(mp4|m4v|mov|webm)(\?|$)", re.IGNORECASE)
+
+
+# 一次執行取回頁面上所有媒體屬性，避免逐一呼叫 get_attribute 造成多次 chromedriver 往返
+COLLECT_MEDIA_SCRIPT = """
+const media = {videos: [], images: [], sources: []};
+document.querySelectorAll('video').forEach(v => media.videos.push({
+    src: v.currentSrc || v.getAttribute('src') || '',
+    poster: v.getAttribute('poster') || '',
+}));
+document.querySelectorAll("img[src*='cdninstagram'], img[src*='fbcdn']").forEach(img => media.images.push({
+    src: img.getAttribute('src') || '',
+    width: parseInt(img.getAttribute('width') || img.naturalWidth || 0, 10),
+}));
+document.querySelectorAll('source').forEach(s => media.sources.push(s.getAttribute('src') || ''));
+return media;
+"""
+
+
+@dataclass
+class CaptureResult:
+    """網路監聽結果"""
+    media_urls: List[str] = field(default_factory=list)
+    timed_out: bool = False
+    elapsed: float = 0.0
+    page_media: Optional[dict] = None  # 因 DOM 已有媒體而提早返回時，當下收集到的 DOM 媒體
+
+
+@dataclass
+class RenderResult:
+    """一次瀏覽器渲染取得的所有資訊"""
+    media_urls: List[str] = field(default_factory=list)  # 網路層捕捉到的影片
+    videos: List[dict] = field(default_factory=list)  # <video> 的 src/poster
+    images: List[dict] = field(default_factory=list)  # CDN 圖片的 src/width
+    sources: List[str] = field(default_factory=list)  # <source> 的 src
+    page_source: Optional[str] = None  # 其他方式都找不到時才取得
+    timed_out: bool = False
+    cookies: List[dict] = field(default_factory=list)  # 渲染後瀏覽器中的 cookie（供 HTTP 擷取重用）
+
+
+def get_executor() -> executors.InstrumentedExecutor:
+    """瀏覽器專用執行緒池：所有 WebDriver 呼叫都在這裡執行，不佔用事件迴圈"""
+    return executors.get_executor(executors.BROWSER)
+
+
+async def run_in_browser_executor(func: Callable[..., T], *args) -> T:
+    """在瀏覽器執行緒池中執行阻塞的 WebDriver 呼叫"""
+    return await get_executor().run(func, *args)
+
+
+_driver_path: Optional[str] = None
+_driver_path_lock = threading.Lock()
+
+
+def _install_chromedriver(chromium: bool) -> str:
+    """以 webdriver-manager 下載/查找 chromedriver（需連網，耗時數秒）"""
+    from webdriver_manager.chrome import ChromeDriverManager
+    from webdriver_manager.core.os_manager import ChromeType
+
+    if chromium:
+        return ChromeDriverManager(chrome_type=ChromeType.CHROMIUM).install()
+    return ChromeDriverManager().install()
+
+
+def resolve_chromedriver_path(
+    cache_file: Optional[str] = None,
+    install: Callable[[bool], str] = _install_chromedriver,
+) -> str:
+    """
+    取得 chromedriver 路徑，只解析一次
+
+    順序：設定的 chromedriver_path → 行程內快取 → 磁碟快取檔 → webdriver-manager 安裝（並寫入快取檔）
+    """
+    global _driver_path
+    settings = get_settings()
+    if settings.chromedriver_path:
+        return settings.chromedriver_path
+
+    with _driver_path_lock:
+        if _driver_path and os.access(_driver_path, os.X_OK):
+            return _driver_path
+
+        chrome_bin = os.environ.get("CHROME_BIN") or ""
+        chromium = "chromium" in chrome_bin
+        cache_file = cache_file or settings.chromedriver_cache_file
+
+        try:
+            with open(cache_file, encoding="utf-8") as f:
+                cached = json.load(f)
+            if (
+                cached.get("chromium") == chromium
+                and os.access(cached.get("path", ""), os.X_OK)
+            ):
+                _driver_path = cached["path"]
+                return _driver_path
+        except (OSError, ValueError, AttributeError):
+            pass
+
+        _driver_path = install(chromium)
+        try:
+            os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+            with open(cache_file, "w", encoding="utf-8") as f:
+                json.dump({"path": _driver_path, "chromium": chromium}, f)
+        except OSError:
+            pass
+        return _driver_path
+
+
+def create_chrome_driver():
+    """建立 Chrome driver（開啟效能日誌以讀取 DevTools 網路事件）"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument(f"--user-agent={USER_AGENT}")
+    # DOMContentLoaded 後即返回，後續由網路事件決定何時完成
+    chrome_options.page_load_strategy = "eager"
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    chrome_options.add_experimental_option(
+        "prefs",
+        {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.fonts": 2,
+        },
+    )
+
+    # 檢查是否在 Docker/Linux 環境中使用 Chromium
+    chrome_bin = os.environ.get("CHROME_BIN")
+    if chrome_bin and "chromium" in chrome_bin:
+        chrome_options.binary_location = chrome_bin
+
+    service = Service(resolve_chromedriver_path())
+    return webdriver.Chrome(service=service, options=chrome_options)
+
+
+class DriverPool:
+    """
+    預熱的 driver 池
+    保留少量閒置瀏覽器，省去每次請求啟動 Chrome 的時間；size 為 0 時等同每次新建、用完即關閉
+    （acquire/release/fill/close 皆為阻塞呼叫，需在瀏覽器執行緒池中執行）
+    """
+
+    def __init__(self, size: int = 0, factory: Callable = create_chrome_driver):
+        self.size = size
+        self._factory = factory
+        self._idle: List = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.leased = 0
+
+    @property
+    def idle_count(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+    def acquire(self):
+        with self._lock:
+            self.leased += 1
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return self._factory()
+        except BaseException:
+            with self._lock:
+                self.leased -= 1
+            raise
+
+    def release(self, driver, reusable: bool = True):
+        """歸還 driver；池已滿、已關閉或 driver 狀態不明時直接關閉"""
+        with self._lock:
+            self.leased = max(0, self.leased - 1)
+            if reusable and not self._closed and len(self._idle) < self.size:
+                self._idle.append(driver)
+                return
+        driver.quit()
+
+    def fill(self) -> int:
+        """預先啟動 driver 直到池滿，回傳新建數量"""
+        created = 0
+        while not self._closed and self.idle_count < self.size:
+            driver = self._factory()
+            with self._lock:
+                if not self._closed and len(self._idle) < self.size:
+                    self._idle.append(driver)
+                    driver = None
+            if driver is not None:
+                driver.quit()
+            created += 1
+        return created
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "idle": len(self._idle), "leased": self.leased}
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+
+driver_pool = DriverPool(size=get_settings().browser_pool_size)
+
+
+def is_media_response(url: str, mime_type: Optional[str] = None) -> bool:
+    """判斷網路回應是否為 Threads/Instagram CDN 上的影片"""
+    host = urlparse(url).hostname or ""
+    if not any(host.endswith(media_host) for media_host in MEDIA_HOSTS):
+        return False
+    if mime_type and mime_type.startswith("video/"):
+        return True
+    return bool(_MEDIA_PATH_RE.search(urlparse(url).path + "?"))
+
+
+def media_urls_from_log(entries: List[dict]) -> List[str]:
+    """從 performance 日誌中取出媒體回應的 URL（依出現順序、去重）"""
+    urls: List[str] = []
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        if message.get("method") != "Network.responseReceived":
+            continue
+        response = message.get("params", {}).get("response", {})
+        url = response.get("url", "")
+        if is_media_response(url, response.get("mimeType")):
+            url = strip_range_params(url)
+            if url not in urls:
+                urls.append(url)
+    return urls
+
+
+def capture_media(
+    driver,
+    url: str,
+    timeout: float = 15.0,
+    poll_interval: float = 0.1,
+    dom_check_every: int = 5,
+) -> CaptureResult:
+    """
+    載入頁面並監聽網路事件，一觀察到媒體回應就返回（阻塞呼叫，需在執行緒中執行）
+
+    圖片貼文不會產生影片回應，因此每 dom_check_every 次輪詢檢查一次 DOM：
+    已有 CDN 影片網址，或只有 CDN 圖片而沒有 <video> 元素時也提早返回
+
+    Args:
+        driver: create_chrome_driver() 建立的 driver
+        url: 貼文網址
+        timeout: 硬性截止時間（秒），逾時仍返回已觀察到的結果
+        poll_interval: 讀取 DevTools 事件的間隔
+        dom_check_every: 每幾次輪詢檢查一次 DOM 媒體
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    # 清掉先前頁面遺留的事件
+    driver.get_log("performance")
+
+    driver.get(url)
+
+    result = CaptureResult()
+    polls = 0
+    while True:
+        for media_url in media_urls_from_log(driver.get_log("performance")):
+            if media_url not in result.media_urls:
+                result.media_urls.append(media_url)
+        if result.media_urls:
+            break
+        polls += 1
+        if polls % dom_check_every == 0:
+            media = collect_page_media(driver)
+            if _has_dom_media(media):
+                result.page_media = media
+                break
+        if time.monotonic() >= deadline:
+            result.timed_out = True
+            break
+        time.sleep(poll_interval)
+
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+def _has_dom_media(media: dict) -> bool:
+    """DOM 中已有可用的媒體：CDN 影片網址，或只有 CDN 圖片（影片貼文的 <video> 可能還沒拿到網址，需繼續等）"""
+    if any((item.get("src") or "").startswith("http") for item in media["videos"]):
+        return True
+    if any(src.startswith("http") for src in media["sources"]):
+        return True
+    return not media["videos"] and any((item.get("src") or "").startswith("http") for item in media["images"])
+
+
+def collect_page_media(driver) -> dict:
+    """以單次腳本執行取回所有 <video>、CDN <img> 與 <source> 的屬性"""
+    media = driver.execute_script(COLLECT_MEDIA_SCRIPT) or {}
+    return {
+        "videos": media.get("videos") or [],
+        "images": media.get("images") or [],
+        "sources": media.get("sources") or [],
+    }
+
+
+def render(driver, url: str, timeout: float = 15.0) -> RenderResult:
+    """
+    渲染貼文並取得媒體資訊（阻塞呼叫，需在瀏覽器執行緒池中執行）
+
+    依序：網路監聽 → 單次腳本收集 DOM 媒體 → 前兩者皆無結果時才取頁面源碼；
+    啟用工作階段重用時一併取回 cookie
+    """
+    capture = capture_media(driver, url, timeout=timeout)
+    media = capture.page_media or collect_page_media(driver)
+
+    result = RenderResult(
+        media_urls=capture.media_urls,
+        videos=media["videos"],
+        images=media["images"],
+        sources=media["sources"],
+        timed_out=capture.timed_out,
+    )
+
+    has_dom_media = any(
+        (item.get("src") or "").startswith("http") for item in result.videos
+    ) or any(src.startswith("http") for src in result.sources)
+    if not result.media_urls and not has_dom_media:
+        result.page_source = driver.page_source
+
+    if get_settings().session_reuse_enabled:
+        result.cookies = driver.get_cookies() or []
+
+    return result
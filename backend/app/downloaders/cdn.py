@@ -0,0 +1,128 @@
+"""
+CDN 檔案下載
+三個平台下載器與直接下載模式共用：以 curl 下載影片/圖片檔案，
+依結束碼與 HTTP 狀態碼分類失敗，暫時性錯誤與限流依重試策略退避後重試
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from ..circuit import circuit_breakers
+from ..retry import (
+    ERROR_MEDIA,
+    ERROR_PERMANENT,
+    ERROR_TRANSIENT,
+    AttemptFailed,
+    RetryPolicy,
+    classify_curl_exit,
+    classify_http_status,
+    parse_retry_after,
+    run_with_retry,
+)
+
+# 行動版 UA 用於抖音、小紅書；桌面版用於 Threads
+MOBILE_USER_AGENT = "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X)"
+DESKTOP_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+# 小於此大小的檔案通常是錯誤頁面
+MIN_FILE_SIZE = 1000
+
+Runner = Callable[[List[str], float], Awaitable[Tuple[int, bytes, bytes]]]
+
+
+def _media_kind(kind: str) -> str:
+    return ERROR_MEDIA if kind == ERROR_PERMANENT else kind
+
+
+def build_command(url: str, output_path: str, user_agent: str, referer: Optional[str]) -> List[str]:
+    """curl 指令：回應標頭與狀態碼輸出到 stdout，內容寫入檔案"""
+    command = [
+        "curl",
+        "-sS",
+        "-L",
+        "-o", output_path,
+        "-D", "-",
+        "-w", "\n%{http_code}",
+        "-A", user_agent,
+    ]
+    if referer:
+        command += ["-H", f"Referer: {referer}"]
+    command.append(url)
+    return command
+
+
+def parse_response(stdout: bytes) -> Tuple[int, Optional[float]]:
+    """
+    解析 curl 輸出的 HTTP 狀態碼與最後一個回應的 Retry-After
+
+    Returns:
+        (狀態碼, Retry-After 秒數)；無法解析時狀態碼為 0
+    """
+    lines = stdout.decode(errors="replace").splitlines()
+    try:
+        status = int(lines[-1].strip()) if lines else 0
+    except ValueError:
+        status = 0
+    retry_after = None
+    for line in lines[:-1]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "retry-after":
+            retry_after = parse_retry_after(value.strip())
+        elif line.startswith("HTTP/"):
+            # 跟隨重新導向時只採用最後一個回應的標頭
+            retry_after = None
+    return status, retry_after
+
+
+async def fetch_to_file(
+    url: str,
+    output_path: str,
+    run: Runner,
+    user_agent: str = DESKTOP_USER_AGENT,
+    referer: Optional[str] = None,
+    timeout: float = 300,
+    policy: Optional[RetryPolicy] = None,
+):
+    """
+    下載 URL 到 output_path，失敗時依分類重試
+
+    每次嘗試受 CDN 主機的斷路器保護；主機有回應的網址失效（404 等）不計入斷路器失敗。
+    不可重試的失敗一律歸類為 ERROR_MEDIA：媒體網址失效不代表貼文不存在，呼叫端的策略鏈應繼續
+
+    Args:
+        run: 執行子程序的函式 (command, timeout) -> (returncode, stdout, stderr)
+
+    Raises:
+        AttemptFailed: 重試後仍失敗
+        CircuitOpenError: CDN 主機的斷路器開啟中
+    """
+    command = build_command(url, output_path, user_agent, referer)
+
+    async def attempt():
+        with circuit_breakers.for_cdn(url).guard() as call:
+            try:
+                returncode, stdout, _ = await run(command, timeout)
+            except asyncio.TimeoutError:
+                raise AttemptFailed("下載超時", ERROR_TRANSIENT)
+
+            status, retry_after = parse_response(stdout)
+            if returncode != 0:
+                error = AttemptFailed(
+                    f"下載失敗（curl 結束碼 {returncode}）", _media_kind(classify_curl_exit(returncode))
+                )
+            elif status >= 400:
+                error = AttemptFailed(
+                    f"下載失敗（HTTP {status}）", _media_kind(classify_http_status(status)), retry_after
+                )
+            elif os.path.exists(output_path) and os.path.getsize(output_path) > MIN_FILE_SIZE:
+                call.success()
+                return
+            else:
+                error = AttemptFailed("下載的檔案無效", ERROR_MEDIA)
+
+            if error.kind == ERROR_MEDIA:
+                call.success()
+            raise error
+
+    await run_with_retry("cdn_download", attempt, policy)
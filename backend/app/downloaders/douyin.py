@@ -4,15 +4,21 @@
 """
 
 import asyncio
+import json
 import os
 import re
 from typing import Callable, Optional
 
-from .base import BaseDownloader, DownloadResult
+from ..circuit import circuit_breakers
+from ..media_scan import best_video_url
+from ..retry import classify_message
+from .base import ERROR_CIRCUIT_OPEN, ERROR_DEADLINE, BaseDownloader, DownloadResult
+from .cdn import MOBILE_USER_AGENT
 
 
 class DouyinDownloader(BaseDownloader):
     platform_name = "douyin"
+    download_strategies = ("ytdlp", "parse_page")
 
     def is_valid_url(self, url: str) -> bool:
         return "douyin.com" in url or "tiktok.com" in url
@@ -35,16 +41,14 @@ class DouyinDownloader(BaseDownloader):
 
         self._update_progress(progress_callback, 20)
 
-        # 優先使用 yt-dlp（對 TikTok 和抖音支援較好）
-        result = await self._try_ytdlp(url, output_path, progress_callback)
+        # 依策略規劃器排定的順序嘗試（預設 yt-dlp → 頁面解析）
+        # yt-dlp 對 TikTok 和抖音支援較好，故預設優先
+        result = await self._run_download_strategies(url, output_path, progress_callback)
         if result.success:
             return result
 
-        self._update_progress(progress_callback, 40)
-
-        # 備用方案：解析頁面
-        result = await self._try_parse_page(url, output_path, progress_callback)
-        if result.success:
+        # 所有策略都被斷路器擋下時，回傳明確的上游異常訊息
+        if result.error_kind in (ERROR_CIRCUIT_OPEN, ERROR_DEADLINE):
             return result
 
         return DownloadResult(
@@ -65,13 +69,7 @@ class DouyinDownloader(BaseDownloader):
                 url,
             ]
 
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=30)
+            _, stdout, _ = await self._run_process(command, timeout=30, step="resolve_url")
             resolved = stdout.decode().strip()
 
             if "douyin.com" in resolved or "tiktok.com" in resolved:
@@ -103,16 +101,7 @@ class DouyinDownloader(BaseDownloader):
                 url,
             ]
 
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            stdout, stderr = await asyncio.wait_for(
-                process.communicate(),
-                timeout=120,
-            )
+            _, stdout, stderr = await self._run_process(command, timeout=120, step="ytdlp_download")
 
             if os.path.exists(output_path) and os.path.getsize(output_path) > 1000:
                 self._update_progress(progress_callback, 100)
@@ -120,13 +109,11 @@ class DouyinDownloader(BaseDownloader):
 
             # 檢查錯誤訊息
             error_msg = stderr.decode() if stderr else ""
+            # 需要登入只代表 yt-dlp 取不到，頁面解析仍可能成功，不中止策略鏈
             if "login" in error_msg.lower() or "cookie" in error_msg.lower():
-                return DownloadResult(
-                    success=False,
-                    error="此影片需要登入才能下載",
-                )
+                return DownloadResult(success=False, error="此影片需要登入才能下載")
 
-            return DownloadResult(success=False)
+            return DownloadResult(success=False, error_kind=classify_message(error_msg))
 
         except asyncio.TimeoutError:
             return DownloadResult(success=False, error="下載超時")
@@ -179,31 +166,34 @@ class DouyinDownloader(BaseDownloader):
         return None
 
     async def _get_video_url(self, video_id: str, original_url: str) -> Optional[str]:
-        """獲取無浮水印影片 URL"""
-        try:
-            # 使用抖音 API 獲取影片資訊
-            api_url = f"https://www.iesdouyin.com/web/api/v2/aweme/iteminfo/?item_ids={video_id}"
-
-            command = [
-                "curl",
-                "-s",
-                "-A", "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X)",
-                api_url,
-            ]
-
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=30)
-            response = stdout.decode()
-
-            # 解析 JSON 獲取影片 URL
-            import json
-            data = json.loads(response)
+        """
+        獲取無浮水印影片 URL
+
+        iteminfo API 受 douyin:api 斷路器保護，開啟時拋出 CircuitOpenError
+        """
+        # 使用抖音 API 獲取影片資訊
+        api_url = f"https://www.iesdouyin.com/web/api/v2/aweme/iteminfo/?item_ids={video_id}"
+
+        command = [
+            "curl",
+            "-s",
+            "-A", "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X)",
+            api_url,
+        ]
 
+        with circuit_breakers.get("douyin:api").guard() as call:
+            try:
+                _, stdout, _ = await self._run_process(command, timeout=30, step="api")
+                # 解析 JSON 獲取影片 URL
+                data = json.loads(stdout.decode())
+            except Exception:
+                # 逾時、空回應或非 JSON（API 結構改變）都視為上游失敗
+                call.failure()
+                return None
+            call.success()
+
+        video_url = None
+        try:
             if data.get("item_list"):
                 item = data["item_list"][0]
                 # 獲取無浮水印地址
@@ -214,15 +204,16 @@ class DouyinDownloader(BaseDownloader):
                 url_list = play_addr.get("url_list", [])
 
                 if url_list:
-                    # 替換為無浮水印地址
                     video_url = url_list[0]
-                    video_url = video_url.replace("playwm", "play")
-                    return video_url
+        except Exception:
+            pass
 
-            return None
+        # 回應結構改變時，直接掃描回應內容中的播放網址
+        if not video_url:
+            video_url = best_video_url(stdout.decode(errors="replace"), "douyin")
 
-        except Exception:
-            return None
+        # 替換為無浮水印地址
+        return video_url.replace("playwm", "play") if video_url else None
 
     async def _download_video(
         self,
@@ -231,29 +222,10 @@ class DouyinDownloader(BaseDownloader):
         progress_callback: Optional[Callable[[int], None]],
     ) -> DownloadResult:
         """下載影片"""
-        try:
-            command = [
-                "curl",
-                "-L",
-                "-o", output_path,
-                "-A", "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X)",
-                "-H", "Referer: https://www.douyin.com/",
-                video_url,
-            ]
-
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            await asyncio.wait_for(process.communicate(), timeout=300)
-
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 1000:
-                self._update_progress(progress_callback, 100)
-                return DownloadResult(success=True, file_path=output_path)
-
-            return DownloadResult(success=False, error="下載失敗")
-
-        except Exception as e:
-            return DownloadResult(success=False, error=str(e))
+        return await self._download_media(
+            video_url,
+            output_path,
+            progress_callback,
+            user_agent=MOBILE_USER_AGENT,
+            referer="https://www.douyin.com/",
+        )
\ No newline at end of file
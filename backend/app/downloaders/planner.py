@@ -0,0 +1,152 @@
+"""
+策略規劃器
+依據各平台、各策略的滾動成功率與延遲，動態決定策略嘗試順序
+"""
+
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from ..config import get_settings
+
+
+@dataclass
+class StrategyStats:
+    """單一策略的滾動統計（最近 N 次嘗試）"""
+    window_size: int = 50
+    samples: Deque[Tuple[bool, float]] = field(default_factory=deque)
+
+    def record(self, success: bool, latency: float):
+        self.samples.append((success, max(0.0, latency)))
+        while len(self.samples) > self.window_size:
+            self.samples.popleft()
+
+    @property
+    def count(self) -> int:
+        return len(self.samples)
+
+    @property
+    def success_rate(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        return sum(1 for ok, _ in self.samples if ok) / len(self.samples)
+
+    @property
+    def mean_latency(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        return sum(latency for _, latency in self.samples) / len(self.samples)
+
+
+class StrategyPlanner:
+    """
+    策略規劃器
+
+    以「預期成功所需時間」（平均耗時 / 成功率）排序策略鏈，
+    並跳過明顯失效的策略，但仍保留少量流量探測其是否恢復。
+    """
+
+    def __init__(
+        self,
+        window_size: int = 50,
+        min_samples: int = 5,
+        broken_threshold: float = 0.1,
+        explore_ratio: float = 0.05,
+        default_latency: float = 30.0,
+        rng: Optional[random.Random] = None,
+    ):
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.broken_threshold = broken_threshold
+        self.explore_ratio = explore_ratio
+        self.default_latency = default_latency
+        self._rng = rng or random.Random()
+        self._stats: Dict[Tuple[str, str], StrategyStats] = {}
+        self._lock = threading.Lock()
+
+    def _get_stats(self, platform: str, strategy: str) -> StrategyStats:
+        key = (platform, strategy)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = StrategyStats(window_size=self.window_size)
+            self._stats[key] = stats
+        return stats
+
+    def record(self, platform: str, strategy: str, success: bool, latency: float):
+        """記錄一次策略嘗試的結果與耗時（秒）"""
+        with self._lock:
+            self._get_stats(platform, strategy).record(success, latency)
+
+    def expected_cost(self, platform: str, strategy: str) -> float:
+        """預期成功所需時間（秒），使用 Laplace 平滑避免樣本過少時失真"""
+        with self._lock:
+            stats = self._stats.get((platform, strategy))
+            if stats is None or stats.count == 0:
+                return self.default_latency / 0.5
+            successes = sum(1 for ok, _ in stats.samples if ok)
+            probability = (successes + 1) / (stats.count + 2)
+            return (stats.mean_latency or self.default_latency) / probability
+
+    def is_broken(self, platform: str, strategy: str) -> bool:
+        """樣本足夠且成功率低於門檻時視為失效"""
+        with self._lock:
+            stats = self._stats.get((platform, strategy))
+            if stats is None or stats.count < self.min_samples:
+                return False
+            return (stats.success_rate or 0.0) <= self.broken_threshold
+
+    def plan(self, platform: str, strategies: Sequence[str]) -> List[str]:
+        """
+        規劃策略嘗試順序
+
+        Args:
+            platform: 平台名稱
+            strategies: 預設順序的策略名稱（無統計資料時保持此順序）
+
+        Returns:
+            排序後的策略名稱列表；失效策略僅在探測時排在最後
+        """
+        # sorted 為穩定排序，統計相同時保留預設順序
+        ordered = sorted(strategies, key=lambda s: self.expected_cost(platform, s))
+
+        healthy = [s for s in ordered if not self.is_broken(platform, s)]
+        broken = [s for s in ordered if s not in healthy]
+
+        # 全部失效時仍依預期成本逐一嘗試，不讓請求無路可走
+        if not healthy:
+            return ordered
+
+        probes = [s for s in broken if self._rng.random() < self.explore_ratio]
+        return healthy + probes
+
+    def snapshot(self) -> Dict[str, Dict[str, dict]]:
+        """匯出目前統計（供監控使用）"""
+        with self._lock:
+            result: Dict[str, Dict[str, dict]] = {}
+            for (platform, strategy), stats in self._stats.items():
+                result.setdefault(platform, {})[strategy] = {
+                    "samples": stats.count,
+                    "success_rate": stats.success_rate,
+                    "mean_latency": stats.mean_latency,
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def _create_planner() -> StrategyPlanner:
+    settings = get_settings()
+    return StrategyPlanner(
+        window_size=settings.strategy_window_size,
+        min_samples=settings.strategy_min_samples,
+        broken_threshold=settings.strategy_broken_threshold,
+        explore_ratio=settings.strategy_explore_ratio,
+    )
+
+
+# 全局策略規劃器實例
+strategy_planner = _create_planner()
@@ -1,21 +1,32 @@
 """
 Threads 影片下載器
-使用 Selenium 模擬瀏覽器繞過反爬蟲機制
+優先以 HTTP 解析頁面內嵌 JSON，失敗時才使用 Selenium 模擬瀏覽器繞過反爬蟲機制
 """
 
 import asyncio
 import os
-import re
 import subprocess
 import tempfile
 from typing import Callable, Optional
 
-from .base import BaseDownloader, DownloadResult, ParseResult, MediaItem
+from .. import activity
+from ..admission import admission
+from .base import ERROR_CIRCUIT_OPEN, ERROR_DEADLINE, ERROR_NEEDS_BROWSER, BaseDownloader, DownloadResult, ParseResult, MediaItem
+from ..config import get_settings
+from ..deadline import budget
+from ..media_scan import best_video_url
+from ..retry import ERROR_THROTTLED, classify_message
+from ..sessions import looks_challenged, session_store
+from . import browser, threads_page
 import json
 
 
 class ThreadsDownloader(BaseDownloader):
     platform_name = "threads"
+    # html：直接解析頁面內嵌 JSON，成本遠低於啟動瀏覽器，故排在 Selenium 之前
+    download_strategies = ("html", "ytdlp", "selenium")
+    parse_strategies = ("html", "ytdlp", "selenium")
+    browser_strategies = ("selenium",)
 
     def is_valid_url(self, url: str) -> bool:
         return "threads.net" in url or "threads.com" in url
@@ -23,7 +34,13 @@ class ThreadsDownloader(BaseDownloader):
     async def parse(self, url: str) -> ParseResult:
         """解析 Threads 貼文中的所有媒體"""
         try:
-            # 使用 yt-dlp 獲取媒體資訊
+            return await self._run_parse_strategies(url)
+        except Exception as e:
+            return ParseResult(success=False, error=str(e))
+
+    async def _parse_with_ytdlp(self, url: str) -> ParseResult:
+        """使用 yt-dlp 獲取媒體資訊"""
+        try:
             command = [
                 "yt-dlp",
                 "--dump-json",
@@ -32,20 +49,14 @@ class ThreadsDownloader(BaseDownloader):
                 url,
             ]
 
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
+            returncode, stdout, stderr = await self._run_ytdlp(command, timeout=60, step="ytdlp_info")
 
-            stdout, stderr = await asyncio.wait_for(
-                process.communicate(),
-                timeout=60,
-            )
-
-            if process.returncode != 0:
-                # yt-dlp 失敗，嘗試使用 Selenium 解析
-                return await self._parse_with_selenium(url)
+            if returncode != 0:
+                return ParseResult(
+                    success=False,
+                    error="yt-dlp 解析失敗",
+                    error_kind=classify_message(stderr.decode(errors="replace")),
+                )
 
             media_items = []
             # yt-dlp 可能輸出多行 JSON（playlist 的情況）
@@ -63,14 +74,27 @@ class ThreadsDownloader(BaseDownloader):
             if media_items:
                 return ParseResult(success=True, media=media_items)
 
-            # 如果沒找到，嘗試 Selenium
-            return await self._parse_with_selenium(url)
+            return ParseResult(success=False, error="找不到媒體")
 
         except asyncio.TimeoutError:
             return ParseResult(success=False, error="解析超時")
         except Exception as e:
             return ParseResult(success=False, error=str(e))
 
+    async def _parse_with_html(self, url: str) -> ParseResult:
+        """以 HTTP 抓取貼文頁（或 /embed）並解析內嵌 JSON，不啟動瀏覽器"""
+        try:
+            media_items = await threads_page.fetch_media_items(url)
+        except asyncio.TimeoutError:
+            return ParseResult(success=False, error="頁面抓取超時")
+        except Exception as e:
+            return ParseResult(success=False, error=f"頁面解析錯誤: {str(e)}")
+
+        if media_items:
+            return ParseResult(success=True, media=media_items)
+
+        return ParseResult(success=False, error="找不到媒體")
+
     def _extract_media_item(self, data: dict) -> Optional[MediaItem]:
         """從 yt-dlp JSON 中提取媒體項目"""
         # 獲取最佳格式的 URL
@@ -107,111 +131,147 @@ class ThreadsDownloader(BaseDownloader):
             height=data.get("height"),
         )
 
-    def _create_chrome_driver(self):
-        """建立 Chrome driver 並自動管理版本"""
-        from selenium import webdriver
-        from selenium.webdriver.chrome.options import Options
-        from selenium.webdriver.chrome.service import Service
-        from webdriver_manager.chrome import ChromeDriverManager
-        from webdriver_manager.core.os_manager import ChromeType
-        import os
-
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument(
-            "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    async def _run_ytdlp(self, command, timeout: float, step: str):
+        """執行 yt-dlp；有可用的工作階段時帶上 --cookies，帶 cookie 仍被擋下時捨棄該工作階段"""
+        async with session_store.cookie_file(self.platform_name) as cookie_file:
+            if cookie_file:
+                command = [command[0], "--cookies", cookie_file, *command[1:]]
+            returncode, stdout, stderr = await self._run_process(command, timeout=timeout, step=step)
+
+        if returncode != 0 and cookie_file:
+            message = stderr.decode(errors="replace")
+            if classify_message(message) == ERROR_THROTTLED or looks_challenged(message):
+                await session_store.invalidate(self.platform_name, "yt-dlp 帶 cookie 仍被擋下")
+        return returncode, stdout, stderr
+
+    async def _remember_session(self, rendered: browser.RenderResult):
+        """渲染成功（擷取到媒體或頁面在時限內載入）時保存 cookie，供 HTTP 與 yt-dlp 策略重用"""
+        if rendered.cookies and (rendered.media_urls or not rendered.timed_out):
+            await session_store.capture(self.platform_name, rendered.cookies)
+
+    async def _launch_driver(self):
+        """
+        在瀏覽器執行緒池中取得 driver（優先使用預熱池中的閒置瀏覽器）
+
+        記憶體超過高水位時先等待回落（逾時拋出 AdmissionRejected）；
+        若等待期間任務被取消，driver 取得後立即歸還，避免殘留瀏覽器程序
+        """
+        await admission.wait_for_memory("瀏覽器啟動")
+
+        future = asyncio.ensure_future(
+            browser.run_in_browser_executor(browser.driver_pool.acquire)
         )
-
-        # 檢查是否在 Docker/Linux 環境中使用 Chromium
-        chrome_bin = os.environ.get("CHROME_BIN")
-        if chrome_bin and "chromium" in chrome_bin:
-            chrome_options.binary_location = chrome_bin
-            # 使用 Chromium 對應的 driver
-            service = Service(ChromeDriverManager(chrome_type=ChromeType.CHROMIUM).install())
-        else:
-            # 本地開發環境使用標準 Chrome
-            service = Service(ChromeDriverManager().install())
-
-        return webdriver.Chrome(service=service, options=chrome_options)
-
-    async def _parse_with_selenium(self, url: str) -> ParseResult:
-        """使用 Selenium 解析頁面中的媒體"""
         try:
-            from selenium.webdriver.common.by import By
-
-            loop = asyncio.get_event_loop()
-            driver = await loop.run_in_executor(
-                None,
-                self._create_chrome_driver,
-            )
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            def _release_when_ready(f):
+                if not f.cancelled() and f.exception() is None:
+                    browser.get_executor().submit(browser.driver_pool.release, f.result())
+
+            future.add_done_callback(_release_when_ready)
+            raise
+
+    async def _quit_driver(self, driver, reusable: bool = False):
+        """在瀏覽器執行緒池中歸還或關閉 driver（即使任務已被取消也確保執行完畢）"""
+        await asyncio.shield(
+            browser.run_in_browser_executor(browser.driver_pool.release, driver, reusable)
+        )
 
-            try:
-                await loop.run_in_executor(None, lambda: driver.get(url))
-                await asyncio.sleep(5)
+    async def _render(self, url: str) -> browser.RenderResult:
+        """
+        以單一瀏覽器工作階段渲染貼文
 
-                media_items = []
+        所有 WebDriver 呼叫都在瀏覽器執行緒池中批次完成：取得 driver、渲染並收集媒體、歸還 driver；
+        設定 render_service_url 時改由獨立的渲染服務程序渲染
+        """
+        settings = get_settings()
+        if settings.render_service_url:
+            from .. import render_service
 
-                # 找所有影片
-                video_elements = await loop.run_in_executor(
-                    None,
-                    lambda: driver.find_elements(By.TAG_NAME, "video"),
-                )
+            activity.set_step("render_service")
+            result, browser_seconds = await render_service.request_render(
+                url, budget(settings.browser_capture_timeout)
+            )
+            activity.add_cost(browser_seconds=browser_seconds)
+            await self._remember_session(result)
+            return result
 
-                for video in video_elements:
-                    src = video.get_attribute("src")
-                    poster = video.get_attribute("poster")
-                    if src and src.startswith("http"):
-                        media_items.append(MediaItem(
-                            type="video",
-                            url=src,
-                            thumbnail=poster,
-                        ))
-
-                # 找所有圖片（輪播貼文中的圖片）
-                # Threads 的圖片通常在特定的容器中
-                img_elements = await loop.run_in_executor(
-                    None,
-                    lambda: driver.find_elements(By.CSS_SELECTOR, "img[src*='cdninstagram'], img[src*='fbcdn']"),
-                )
+        activity.set_step("browser_launch")
+        driver = await self._launch_driver()
+        activity.set_step("render")
+        activity.attach_browser(getattr(driver, "session_id", None))
+        timeout = budget(get_settings().browser_capture_timeout)
+        future = asyncio.ensure_future(
+            browser.run_in_browser_executor(browser.render, driver, url, timeout)
+        )
+        try:
+            result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # 渲染有硬性截止時間；等它結束再歸還 driver，避免關閉仍在使用中的瀏覽器
+            def _release_when_done(f):
+                reusable = not f.cancelled() and f.exception() is None
+                browser.get_executor().submit(browser.driver_pool.release, driver, reusable)
+
+            future.add_done_callback(_release_when_done)
+            raise
+        except Exception:
+            await self._quit_driver(driver)
+            raise
+        finally:
+            activity.detach_browser()
 
-                for img in img_elements:
-                    src = img.get_attribute("src")
-                    if src and src.startswith("http") and "profile" not in src.lower():
-                        # 過濾掉頭像等小圖
-                        width = img.get_attribute("width")
-                        if width and int(width) > 100:
-                            media_items.append(MediaItem(
-                                type="image",
-                                url=src,
-                                thumbnail=src,
-                            ))
-
-                # 從頁面源碼中尋找影片 URL
-                if not media_items:
-                    page_source = driver.page_source
-                    video_url = self._extract_video_url_from_source(page_source)
-                    if video_url:
-                        media_items.append(MediaItem(
-                            type="video",
-                            url=video_url,
-                        ))
-
-                if media_items:
-                    return ParseResult(success=True, media=media_items)
-
-                return ParseResult(success=False, error="找不到媒體")
-
-            finally:
-                driver.quit()
+        await self._quit_driver(driver, reusable=True)
+        await self._remember_session(result)
+        return result
 
+    async def _parse_with_selenium(self, url: str) -> ParseResult:
+        """使用 Selenium 解析頁面中的媒體"""
+        try:
+            rendered = await self._render(url)
         except Exception as e:
             return ParseResult(success=False, error=f"Selenium 解析錯誤: {str(e)}")
 
+        # 網路層捕捉到的影片
+        media_items = [MediaItem(type="video", url=media_url) for media_url in rendered.media_urls]
+        seen = set(rendered.media_urls)
+
+        # 頁面上的影片
+        for video in rendered.videos:
+            src = video.get("src")
+            if src and src.startswith("http") and src not in seen:
+                seen.add(src)
+                media_items.append(MediaItem(
+                    type="video",
+                    url=src,
+                    thumbnail=video.get("poster") or None,
+                ))
+
+        # 找所有圖片（輪播貼文中的圖片），過濾掉頭像等小圖
+        for img in rendered.images:
+            src = img.get("src")
+            if src and src.startswith("http") and "profile" not in src.lower():
+                if (img.get("width") or 0) > 100 and src not in seen:
+                    seen.add(src)
+                    media_items.append(MediaItem(
+                        type="image",
+                        url=src,
+                        thumbnail=src,
+                    ))
+
+        # 從頁面源碼中尋找影片 URL
+        if not media_items and rendered.page_source:
+            video_url = self._extract_video_url_from_source(rendered.page_source)
+            if video_url:
+                media_items.append(MediaItem(
+                    type="video",
+                    url=video_url,
+                ))
+
+        if media_items:
+            return ParseResult(success=True, media=media_items)
+
+        return ParseResult(success=False, error="找不到媒體")
+
     async def download(
         self,
         url: str,
@@ -222,16 +282,13 @@ class ThreadsDownloader(BaseDownloader):
 
         self._update_progress(progress_callback, 10)
 
-        # 嘗試使用 yt-dlp 直接下載（最簡單的方式）
-        result = await self._try_ytdlp(url, output_path, progress_callback)
+        # 依策略規劃器排定的順序嘗試（預設頁面 JSON → yt-dlp → Selenium）
+        result = await self._run_download_strategies(url, output_path, progress_callback)
         if result.success:
             return result
 
-        self._update_progress(progress_callback, 30)
-
-        # 如果 yt-dlp 失敗，嘗試使用 Selenium
-        result = await self._try_selenium(url, output_path, progress_callback)
-        if result.success:
+        # 所有策略都被斷路器擋下或需要瀏覽器層時，回傳明確的訊息
+        if result.error_kind in (ERROR_CIRCUIT_OPEN, ERROR_DEADLINE, ERROR_NEEDS_BROWSER):
             return result
 
         return DownloadResult(
@@ -256,140 +313,96 @@ class ThreadsDownloader(BaseDownloader):
                 url,
             ]
 
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            stdout, stderr = await asyncio.wait_for(
-                process.communicate(),
-                timeout=120,
-            )
+            returncode, stdout, stderr = await self._run_ytdlp(command, timeout=120, step="ytdlp_download")
 
-            if process.returncode == 0 and os.path.exists(output_path):
+            if returncode == 0 and os.path.exists(output_path):
                 file_size = os.path.getsize(output_path)
                 if file_size > 1000:  # 檔案大於 1KB
                     self._update_progress(progress_callback, 100)
                     return DownloadResult(success=True, file_path=output_path)
 
-            return DownloadResult(success=False)
+            return DownloadResult(
+                success=False, error_kind=classify_message(stderr.decode(errors="replace"))
+            )
 
         except asyncio.TimeoutError:
             return DownloadResult(success=False, error="下載超時")
         except Exception as e:
             return DownloadResult(success=False, error=str(e))
 
-    async def _try_selenium(
+    async def _try_html(
         self,
         url: str,
         output_path: str,
         progress_callback: Optional[Callable[[int], None]],
     ) -> DownloadResult:
-        """使用 Selenium 抓取影片 URL 後下載"""
-        try:
-            from selenium.webdriver.common.by import By
+        """解析頁面內嵌 JSON 取得影片 URL 後下載"""
+        result = await self._parse_with_html(url)
+        if not result.success:
+            return DownloadResult(success=False, error=result.error)
 
-            self._update_progress(progress_callback, 40)
-
-            # 創建 driver（使用 webdriver-manager 自動管理版本）
-            loop = asyncio.get_event_loop()
-            driver = await loop.run_in_executor(
-                None,
-                self._create_chrome_driver,
-            )
-
-            self._update_progress(progress_callback, 50)
-
-            try:
-                # 載入頁面
-                await loop.run_in_executor(None, lambda: driver.get(url))
-                await asyncio.sleep(5)
-
-                self._update_progress(progress_callback, 60)
+        self._update_progress(progress_callback, 50)
 
-                # 尋找影片元素
-                video_url = await self._find_video_url(driver, loop)
+        videos = [item for item in result.media if item.type == "video"]
+        if not videos:
+            return DownloadResult(success=False, error="找不到影片連結")
 
-                self._update_progress(progress_callback, 70)
+        return await self._download_video_url(videos[0].url, output_path, progress_callback)
 
-                if video_url:
-                    # 下載影片
-                    result = await self._download_video_url(
-                        video_url, output_path, progress_callback
-                    )
-                    return result
+    async def _try_selenium(
+        self,
+        url: str,
+        output_path: str,
+        progress_callback: Optional[Callable[[int], None]],
+    ) -> DownloadResult:
+        """使用 Selenium 抓取影片 URL 後下載"""
+        try:
+            self._update_progress(progress_callback, 40)
 
-                # 如果找不到影片，嘗試從頁面源碼中提取
-                page_source = driver.page_source
-                video_url = self._extract_video_url_from_source(page_source)
+            # 建立 driver（使用 webdriver-manager 自動管理版本）並渲染頁面
+            rendered = await self._render(url)
 
-                if video_url:
-                    result = await self._download_video_url(
-                        video_url, output_path, progress_callback
-                    )
-                    return result
+            self._update_progress(progress_callback, 70)
 
-                return DownloadResult(
-                    success=False,
-                    error="找不到影片連結",
-                )
+            video_url = self._pick_rendered_video_url(rendered)
+            if video_url:
+                return await self._download_video_url(video_url, output_path, progress_callback)
 
-            finally:
-                driver.quit()
+            return DownloadResult(
+                success=False,
+                error="找不到影片連結",
+            )
 
         except Exception as e:
             return DownloadResult(success=False, error=f"Selenium 錯誤: {str(e)}")
 
-    async def _find_video_url(self, driver, loop) -> Optional[str]:
-        """從頁面中尋找影片 URL"""
-        try:
-            # 等待影片元素
-            video_elements = await loop.run_in_executor(
-                None,
-                lambda: driver.find_elements(By.TAG_NAME, "video"),
-            )
+    def _pick_rendered_video_url(self, rendered: browser.RenderResult) -> Optional[str]:
+        """
+        從渲染結果選擇影片 URL
 
-            for video in video_elements:
-                src = video.get_attribute("src")
-                if src and src.startswith("http"):
-                    return src
+        優先順序：網路層捕捉 → <video> → <source> → 頁面源碼
+        """
+        if rendered.media_urls:
+            return rendered.media_urls[0]
 
-            # 檢查 source 元素
-            source_elements = await loop.run_in_executor(
-                None,
-                lambda: driver.find_elements(By.TAG_NAME, "source"),
-            )
+        for video in rendered.videos:
+            src = video.get("src")
+            if src and src.startswith("http"):
+                return src
 
-            for source in source_elements:
-                src = source.get_attribute("src")
-                if src and src.startswith("http"):
-                    return src
+        for src in rendered.sources:
+            if src and src.startswith("http"):
+                return src
 
-            return None
-        except Exception:
-            return None
-
-    def _extract_video_url_from_source(self, page_source: str) -> Optional[str]:
-        """從頁面源碼中提取影片 URL"""
-        patterns = [
-            r'https?://[^"\s]+\.mp4[^"\s]*',
-            r'https?://[^"\s]+\.mov[^"\s]*',
-            r'https?://[^"\s]+\.webm[^"\s]*',
-            r'https?://[^"\s]+instagram[^"\s]*\.fbcdn[^"\s]*',
-            r'https?://[^"\s]+cdninstagram[^"\s]*',
-        ]
-
-        for pattern in patterns:
-            matches = re.findall(pattern, page_source)
-            for match in matches:
-                # 清理 URL
-                match = match.split('"')[0].split("'")[0]
-                if "video" in match.lower() or match.endswith((".mp4", ".mov", ".webm")):
-                    return match
+        if rendered.page_source:
+            return self._extract_video_url_from_source(rendered.page_source)
 
         return None
 
+    def _extract_video_url_from_source(self, page_source: str) -> Optional[str]:
+        """從頁面源碼中提取畫質最高的影片 URL"""
+        return best_video_url(page_source, "threads")
+
     async def _download_video_url(
         self,
         video_url: str,
@@ -398,33 +411,6 @@ class ThreadsDownloader(BaseDownloader):
     ) -> DownloadResult:
         """下載指定的影片 URL"""
         self._update_progress(progress_callback, 80)
-
-        try:
-            # 使用 curl 下載
-            command = [
-                "curl",
-                "-L",
-                "-o", output_path,
-                "-A", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                "-H", "Referer: https://www.threads.com/",
-                video_url,
-            ]
-
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            await asyncio.wait_for(process.communicate(), timeout=300)
-
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 1000:
-                self._update_progress(progress_callback, 100)
-                return DownloadResult(success=True, file_path=output_path)
-
-            return DownloadResult(success=False, error="下載的檔案無效")
-
-        except asyncio.TimeoutError:
-            return DownloadResult(success=False, error="下載超時")
-        except Exception as e:
-            return DownloadResult(success=False, error=str(e))
+        return await self._download_media(
+            video_url, output_path, progress_callback, referer="https://www.threads.com/"
+        )
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""
+Threads 頁面解析（不使用瀏覽器）
+直接抓取貼文 HTML（或 /embed 版本），從內嵌的 JSON 資料中結構化解析媒體
+"""
+
+import html as html_lib
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional
+
+import aiohttp
+
+from ..activity import add_cost
+from ..sessions import CHALLENGE_STATUSES, looks_challenged, session_store
+from .base import MediaItem
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+_JSON_SCRIPT_RE = re.compile(
+    r'<script[^>]+type="application/json"[^>]*>(.*?)</script>',
+    re.DOTALL | re.IGNORECASE,
+)
+_VIDEO_TAG_RE = re.compile(
+    r'<video[^>]*?\ssrc="(https?://[^"]+)"[^>]*>',
+    re.IGNORECASE,
+)
+_POSTER_RE = re.compile(r'\sposter="(https?://[^"]+)"', re.IGNORECASE)
+_SHORTCODE_RE = re.compile(r"/(?:post|t)/([A-Za-z0-9_-]+)")
+
+# 工作階段（cookie）所屬平台
+PLATFORM = "threads"
+
+# 貼文節點的判斷欄位
+_MEDIA_KEYS = ("video_versions", "image_versions2", "carousel_media")
+
+
+def get_shortcode(url: str) -> Optional[str]:
+    """從貼文網址取得 shortcode，例如 /@user/post/ABC123 → ABC123"""
+    match = _SHORTCODE_RE.search(url)
+    return match.group(1) if match else None
+
+
+def get_embed_url(url: str) -> str:
+    """貼文網址對應的 /embed 版本"""
+    base = url.split("?")[0].split("#")[0].rstrip("/")
+    if base.endswith("/embed"):
+        return base
+    return f"{base}/embed"
+
+
+def iter_json_blobs(page_source: str) -> Iterator[Any]:
+    """逐一解碼頁面中 <script type="application/json"> 的內容，略過無法解析者"""
+    for match in _JSON_SCRIPT_RE.finditer(page_source):
+        raw = match.group(1).strip()
+        if not raw:
+            continue
+        try:
+            yield json.loads(raw)
+        except json.JSONDecodeError:
+            try:
+                yield json.loads(html_lib.unescape(raw))
+            except json.JSONDecodeError:
+                continue
+
+
+def iter_posts(data: Any) -> Iterator[Dict[str, Any]]:
+    """遞迴尋找帶有媒體欄位的貼文節點（輪播子項目由貼文本身處理，不重複列出）"""
+    # 以堆疊深度優先走訪，反向推入以維持文件順序
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if any(node.get(key) for key in _MEDIA_KEYS):
+                yield node
+                # 仍繼續往下找（例如引用貼文），但略過輪播子項目
+                children = [v for k, v in node.items() if k != "carousel_media"]
+            else:
+                children = list(node.values())
+            stack.extend(reversed(children))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def _best_version(versions: List[dict]) -> Optional[dict]:
+    """選擇解析度最高的版本"""
+    candidates = [v for v in versions or [] if isinstance(v, dict) and v.get("url")]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda v: (v.get("width") or 0) * (v.get("height") or 0))
+
+
+def _format_duration(seconds: Optional[float]) -> Optional[str]:
+    if not seconds:
+        return None
+    mins, secs = divmod(int(seconds), 60)
+    return f"{mins}:{secs:02d}"
+
+
+def _media_item_from_node(node: Dict[str, Any]) -> Optional[MediaItem]:
+    """將單一媒體節點（單張貼文或輪播子項目）轉為 MediaItem"""
+    image = _best_version((node.get("image_versions2") or {}).get("candidates", []))
+    video = _best_version(node.get("video_versions") or [])
+
+    if video:
+        return MediaItem(
+            type="video",
+            url=video["url"],
+            thumbnail=image["url"] if image else None,
+            duration=_format_duration(node.get("video_duration")),
+            width=node.get("original_width") or video.get("width"),
+            height=node.get("original_height") or video.get("height"),
+        )
+
+    if image:
+        return MediaItem(
+            type="image",
+            url=image["url"],
+            thumbnail=image["url"],
+            width=node.get("original_width") or image.get("width"),
+            height=node.get("original_height") or image.get("height"),
+        )
+
+    return None
+
+
+def media_items_from_post(post: Dict[str, Any]) -> List[MediaItem]:
+    """將貼文節點展開為媒體列表（輪播貼文依序列出每個項目）"""
+    nodes = post.get("carousel_media") or [post]
+    items = []
+    for node in nodes:
+        if isinstance(node, dict):
+            item = _media_item_from_node(node)
+            if item:
+                items.append(item)
+    return items
+
+
+def extract_media_items(page_source: str, shortcode: Optional[str] = None) -> List[MediaItem]:
+    """
+    從頁面 HTML 中解析媒體
+
+    Args:
+        page_source: 貼文頁或 /embed 頁的 HTML
+        shortcode: 目標貼文 shortcode；頁面中有對應貼文時只回傳該貼文的媒體
+
+    Returns:
+        去重後的媒體列表；JSON 中找不到時退而解析 <video> 標籤
+    """
+    posts = [post for blob in iter_json_blobs(page_source) for post in iter_posts(blob)]
+
+    # 頁面中可能同時有回覆或推薦貼文，只取目標貼文（找不到時取第一篇）
+    matched = [post for post in posts if shortcode and post.get("code") == shortcode]
+    posts = matched[:1] or posts[:1]
+
+    items: List[MediaItem] = []
+    seen = set()
+    for post in posts:
+        for item in media_items_from_post(post):
+            if item.url not in seen:
+                seen.add(item.url)
+                items.append(item)
+
+    if items:
+        return items
+
+    # embed 頁面有時直接輸出 <video> 標籤
+    for match in _VIDEO_TAG_RE.finditer(page_source):
+        url = html_lib.unescape(match.group(1))
+        if url in seen:
+            continue
+        seen.add(url)
+        poster = _POSTER_RE.search(match.group(0))
+        items.append(MediaItem(
+            type="video",
+            url=url,
+            thumbnail=html_lib.unescape(poster.group(1)) if poster else None,
+        ))
+
+    return items
+
+
+async def fetch_page(url: str, timeout: float = 15) -> Optional[str]:
+    """
+    以 HTTP 抓取頁面 HTML，失敗時回傳 None
+
+    有瀏覽器渲染留下的工作階段時帶上 Cookie；帶了仍被導向登入/驗證頁或 403/429 時捨棄該工作階段
+    """
+    headers = {
+        "User-Agent": USER_AGENT,
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "zh-TW,zh;q=0.9,en;q=0.8",
+    }
+    cookie = session_store.cookie_header(PLATFORM, url)
+    if cookie:
+        headers["Cookie"] = cookie
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async with session.get(url, headers=headers, allow_redirects=True) as resp:
+            body = await resp.read()
+            add_cost(bytes_in=len(body))
+            if cookie and (resp.status in CHALLENGE_STATUSES or looks_challenged(resp.url.path)):
+                await session_store.invalidate(PLATFORM, f"HTTP {resp.status} {resp.url.path}")
+            if resp.status != 200:
+                return None
+            return await resp.text()
+
+
+async def fetch_media_items(url: str, timeout: float = 15) -> List[MediaItem]:
+    """
+    抓取貼文頁並解析媒體；主頁面解析不到時改抓 /embed 版本
+
+    Raises:
+        aiohttp.ClientError / asyncio.TimeoutError: 網路錯誤
+    """
+    shortcode = get_shortcode(url)
+
+    for page_url in (url, get_embed_url(url)):
+        page_source = await fetch_page(page_url, timeout=timeout)
+        if not page_source:
+            continue
+        items = extract_media_items(page_source, shortcode)
+        if items:
+            return items
+
+    return []
@@ -2,16 +2,19 @@
 小紅書影片下載器
 """
 
-import asyncio
 import os
-import re
 from typing import Callable, Optional
 
-from .base import BaseDownloader, DownloadResult
+from ..circuit import CircuitOpenError, circuit_breakers
+from ..media_scan import best_video_url
+from ..retry import classify_message
+from .base import ERROR_CIRCUIT_OPEN, ERROR_DEADLINE, BaseDownloader, DownloadResult
+from .cdn import MOBILE_USER_AGENT
 
 
 class XiaohongshuDownloader(BaseDownloader):
     platform_name = "xiaohongshu"
+    download_strategies = ("ytdlp", "parse_page")
 
     def is_valid_url(self, url: str) -> bool:
         return "xiaohongshu.com" in url or "xhslink.com" in url
@@ -34,16 +37,13 @@ class XiaohongshuDownloader(BaseDownloader):
 
         self._update_progress(progress_callback, 20)
 
-        # 嘗試使用 yt-dlp 下載
-        result = await self._try_ytdlp(url, output_path, progress_callback)
+        # 依策略規劃器排定的順序嘗試（預設 yt-dlp → 頁面解析）
+        result = await self._run_download_strategies(url, output_path, progress_callback)
         if result.success:
             return result
 
-        self._update_progress(progress_callback, 40)
-
-        # 嘗試解析頁面獲取影片 URL
-        result = await self._try_parse_page(url, output_path, progress_callback)
-        if result.success:
+        # 所有策略都被斷路器擋下時，回傳明確的上游異常訊息
+        if result.error_kind in (ERROR_CIRCUIT_OPEN, ERROR_DEADLINE):
             return result
 
         return DownloadResult(
@@ -63,13 +63,7 @@ class XiaohongshuDownloader(BaseDownloader):
                 url,
             ]
 
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=30)
+            _, stdout, _ = await self._run_process(command, timeout=30, step="resolve_url")
             resolved = stdout.decode().strip()
 
             if "xiaohongshu.com" in resolved:
@@ -97,19 +91,15 @@ class XiaohongshuDownloader(BaseDownloader):
                 url,
             ]
 
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            await asyncio.wait_for(process.communicate(), timeout=120)
+            _, _, stderr = await self._run_process(command, timeout=120, step="ytdlp_download")
 
             if os.path.exists(output_path) and os.path.getsize(output_path) > 1000:
                 self._update_progress(progress_callback, 100)
                 return DownloadResult(success=True, file_path=output_path)
 
-            return DownloadResult(success=False)
+            return DownloadResult(
+                success=False, error_kind=classify_message(stderr.decode(errors="replace"))
+            )
 
         except Exception as e:
             return DownloadResult(success=False, error=str(e))
@@ -132,14 +122,13 @@ class XiaohongshuDownloader(BaseDownloader):
                 url,
             ]
 
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=30)
-            page_content = stdout.decode()
+            with circuit_breakers.get("xiaohongshu:page").guard() as call:
+                _, stdout, _ = await self._run_process(command, timeout=30, step="fetch_page")
+                page_content = stdout.decode()
+                if page_content.strip():
+                    call.success()
+                else:
+                    call.failure()
 
             self._update_progress(progress_callback, 60)
 
@@ -152,27 +141,15 @@ class XiaohongshuDownloader(BaseDownloader):
 
             return DownloadResult(success=False, error="找不到影片連結")
 
+        except CircuitOpenError as e:
+            # 主機斷路器開啟只是快速失敗，不算頁面解析策略失效
+            return DownloadResult(success=False, error=str(e), error_kind=ERROR_CIRCUIT_OPEN)
         except Exception as e:
             return DownloadResult(success=False, error=str(e))
 
     def _extract_video_url(self, page_content: str) -> Optional[str]:
-        """從頁面內容提取影片 URL"""
-        patterns = [
-            r'"url"\s*:\s*"(https?://[^"]+\.mp4[^"]*)"',
-            r'"videoUrl"\s*:\s*"(https?://[^"]+)"',
-            r'<video[^>]+src="(https?://[^"]+)"',
-            r'"originVideoKey"\s*:\s*"([^"]+)"',
-        ]
-
-        for pattern in patterns:
-            matches = re.findall(pattern, page_content)
-            for match in matches:
-                # 處理轉義字符
-                url = match.replace("\\u002F", "/")
-                if url.startswith("http"):
-                    return url
-
-        return None
+        """從頁面內容提取畫質最高的影片 URL（含 __INITIAL_STATE__ 中跳脫的串流網址）"""
+        return best_video_url(page_content, "xiaohongshu")
 
     async def _download_video(
         self,
@@ -181,29 +158,10 @@ class XiaohongshuDownloader(BaseDownloader):
         progress_callback: Optional[Callable[[int], None]],
     ) -> DownloadResult:
         """下載影片"""
-        try:
-            command = [
-                "curl",
-                "-L",
-                "-o", output_path,
-                "-A", "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X)",
-                "-H", "Referer: https://www.xiaohongshu.com/",
-                video_url,
-            ]
-
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            await asyncio.wait_for(process.communicate(), timeout=300)
-
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 1000:
-                self._update_progress(progress_callback, 100)
-                return DownloadResult(success=True, file_path=output_path)
-
-            return DownloadResult(success=False, error="下載失敗")
-
-        except Exception as e:
-            return DownloadResult(success=False, error=str(e))
+        return await self._download_media(
+            video_url,
+            output_path,
+            progress_callback,
+            user_agent=MOBILE_USER_AGENT,
+            referer="https://www.xiaohongshu.com/",
+        )
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+具名執行緒池
+依工作類型分開阻塞呼叫（瀏覽器、存儲 SDK、CPU/檔案），各自有獨立的執行緒上限，
+避免卡住的瀏覽器呼叫耗盡預設執行緒池而拖慢存儲上傳；並記錄佇列深度與等待時間
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, TypeVar
+
+from .config import get_settings
+
+T = TypeVar("T")
+
+BROWSER = "browser"
+STORAGE = "storage"
+CPU = "cpu"
+
+
+class InstrumentedExecutor:
+    """
+    帶統計的執行緒池
+
+    queued：已提交但尚未開始執行的工作數（佇列深度）
+    cancelled：開始執行前就被取消的工作數（呼叫端被取消或關閉時丟棄），不計入等待時間
+    wait：提交到開始執行的等待時間
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.queued = 0
+        self.running = 0
+        self.cancelled = 0
+        self.max_queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, func: Callable[..., T], *args, **kwargs) -> "Future[T]":
+        submitted_at = time.monotonic()
+        with self._lock:
+            self.submitted += 1
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+        def _run():
+            wait = time.monotonic() - submitted_at
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        future = self._pool.submit(_run)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future):
+        # 開始執行前被取消的工作不會進入 _run，由此移出佇列
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+                self.cancelled += 1
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """在此執行緒池中執行阻塞呼叫並等待結果"""
+        return await asyncio.wrap_future(self.submit(partial(func, *args, **kwargs)))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            started = self.submitted - self.queued - self.cancelled
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "max_queued": self.max_queued,
+                "mean_wait_ms": round(self.total_wait / started * 1000, 1) if started else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_executors: Dict[str, InstrumentedExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _max_workers(name: str) -> int:
+    settings = get_settings()
+    return {
+        BROWSER: settings.browser_executor_workers,
+        STORAGE: settings.storage_executor_workers,
+        CPU: settings.cpu_executor_workers,
+    }[name]
+
+
+def get_executor(name: str) -> InstrumentedExecutor:
+    """取得具名執行緒池（browser / storage / cpu），首次使用時依設定建立"""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = InstrumentedExecutor(name, _max_workers(name))
+            _executors[name] = executor
+        return executor
+
+
+async def run_in_executor(name: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """在具名執行緒池中執行阻塞呼叫"""
+    return await get_executor(name).run(func, *args, **kwargs)
+
+
+def snapshot() -> Dict[str, dict]:
+    with _executors_lock:
+        executors = list(_executors.values())
+    return {executor.name: executor.snapshot() for executor in executors}
+
+
+def shutdown():
+    """關閉所有執行緒池（應用關閉時呼叫）"""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown()
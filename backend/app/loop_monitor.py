@@ -0,0 +1,92 @@
+"""
+事件迴圈延遲監測
+定期排程一個短暫睡眠，量測實際喚醒時間與預期的差距；
+差距超過門檻代表有同步呼叫（例如 WebDriver、檔案 I/O）阻塞了事件迴圈
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+from .config import get_settings
+
+
+class LoopLagMonitor:
+    """
+    事件迴圈延遲監測器
+
+    Args:
+        interval: 取樣間隔（秒）
+        threshold: 視為阻塞的延遲門檻（秒）
+    """
+
+    def __init__(self, interval: float = 0.5, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.samples = 0
+        self.blocked_count = 0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """在目前的事件迴圈啟動監測（重複呼叫無作用）"""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """停止監測"""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def record(self, lag: float):
+        """記錄一次取樣"""
+        self.samples += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.threshold:
+            self.blocked_count += 1
+            print(f"⚠️ 事件迴圈阻塞 {lag * 1000:.0f} ms")
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, time.monotonic() - started - self.interval))
+
+    def snapshot(self) -> dict:
+        return {
+            "running": self.running,
+            "samples": self.samples,
+            "blocked_count": self.blocked_count,
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "last_lag_ms": round(self.last_lag * 1000, 1),
+        }
+
+    def reset(self):
+        self.samples = 0
+        self.blocked_count = 0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+
+
+def _create_monitor(settings=None) -> LoopLagMonitor:
+    settings = settings or get_settings()
+    return LoopLagMonitor(
+        interval=settings.loop_lag_interval,
+        threshold=settings.loop_lag_threshold_ms / 1000,
+    )
+
+
+# 全局事件迴圈監測器
+loop_monitor = _create_monitor()
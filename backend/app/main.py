@@ -4,6 +4,8 @@ FastAPI 主入口
 """
 
 import os
+import sys
+import time
 import asyncio
 import base64
 import aiohttp
@@ -16,29 +18,50 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
 from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
+from . import admin, browser_tier
+from .clients import client_id, rate_limit_key
+from .activity import activity_registry, add_cost, mark_succeeded, set_step
+from .admission import AdmissionRejected, admission
+from .circuit import CircuitOpenError, circuit_breakers
 from .config import get_settings
+from .costs import Cost, cost_ledger
+from .deadline import budget, deadline_scope, step_timeouts
+from . import executors
+from .executors import CPU, STORAGE, run_in_executor
+from .loop_monitor import loop_monitor
+from . import ratelimit
+from .retry import AttemptFailed, record_attempt, retry_scope
+from .scheduler import scheduler
+from .sessions import session_store
+from .supervisor import supervisor
 from .queue import task_queue, TaskStatus
-from .downloaders import get_downloader, get_downloader_by_platform
+from .downloaders import cdn, get_downloader, get_downloader_by_platform
+from .downloaders.base import ERROR_NEEDS_BROWSER
+from .downloaders.planner import strategy_planner
 from .storage.local import LocalStorage
-from .storage.gcs import GCSStorage
-from .storage.r2 import R2Storage
-
-# Rate Limiter 設定
-limiter = Limiter(key_func=get_remote_address)
-
+from .warmup import warmup_state
 
 # 應用設定
 settings = get_settings()
 
+# Rate Limiter 設定（設定 shared_state_path 時各 worker 共用計數）
+# 依使用者 IP 計數（經由前端代理時取 X-Forwarded-For 中的使用者位址；瀏覽器層轉交的請求以原客戶端計數）
+limiter = Limiter(
+    key_func=rate_limit_key,
+    storage_uri=ratelimit.storage_uri(settings),
+    enabled=settings.rate_limit_enabled,
+)
 
-def get_storage():
-    """根據設定選擇存儲後端"""
+
+def create_storage():
+    """根據設定選擇存儲後端（GCS/R2 的 SDK 僅在選用時才匯入）"""
     provider = settings.storage_provider.lower()
 
     if provider == "gcs" and settings.gcs_bucket_name:
+        from .storage.gcs import GCSStorage
+
         print(f"📦 使用 GCS 存儲: {settings.gcs_bucket_name}")
         return GCSStorage(
             bucket_name=settings.gcs_bucket_name,
@@ -46,6 +69,8 @@ def get_storage():
         )
     elif provider == "r2" or settings.use_r2_storage:
         if settings.r2_account_id and settings.r2_access_key_id:
+            from .storage.r2 import R2Storage
+
             print("📦 使用 R2 存儲")
             return R2Storage(
                 account_id=settings.r2_account_id,
@@ -60,8 +85,16 @@ def get_storage():
     return LocalStorage(settings.local_storage_path)
 
 
-# 初始化存儲
-storage = get_storage()
+# 存儲於 lifespan 啟動時建立，不在匯入時建立雲端客戶端
+_storage = None
+
+
+def get_storage():
+    """取得存儲後端（尚未建立時立即建立）"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
 
 
 @asynccontextmanager
@@ -69,12 +102,31 @@ async def lifespan(app: FastAPI):
     """應用生命週期管理"""
     # 啟動時
     Path(settings.local_storage_path).mkdir(parents=True, exist_ok=True)
+    get_storage()
     print(f"🚀 {settings.app_name} 啟動")
     print(f"📁 存儲路徑: {settings.local_storage_path}")
+    loop_monitor.start()
+    warmup_state.start()
+    scheduler.start()
+    cleanup = asyncio.create_task(cleanup_task())
 
     yield
 
     # 關閉時
+    cleanup.cancel()
+    try:
+        await cleanup
+    except asyncio.CancelledError:
+        pass
+    await scheduler.stop()
+    await warmup_state.stop()
+    await loop_monitor.stop()
+    supervisor.kill_all()
+    if "app.downloaders.browser" in sys.modules:
+        from .downloaders import browser
+
+        await browser.run_in_browser_executor(browser.driver_pool.close)
+    executors.shutdown()
     print("👋 應用關閉")
 
 
@@ -88,6 +140,9 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# 管理端點（需設定 ADMIN_TOKEN）
+app.include_router(admin.router)
+
 # CORS 設定
 app.add_middleware(
     CORSMiddleware,
@@ -115,6 +170,7 @@ class StatusResponse(BaseModel):
     progress: int
     downloadUrl: Optional[str] = None
     error: Optional[str] = None
+    attempts: List[dict] = []  # 各步驟的嘗試紀錄（策略、重試與失敗分類）
 
 
 class ParseRequest(BaseModel):
@@ -151,6 +207,11 @@ def is_direct_media_url(url: str) -> bool:
     return any(pattern in url.lower() for pattern in cdn_patterns)
 
 
+def get_client_id(request: Request) -> str:
+    """公平排程用的客戶端識別：有效的 API key 以名稱分組，否則以 IP 分組"""
+    return client_id(request, settings)
+
+
 @app.post("/api/download", response_model=DownloadResponse)
 @limiter.limit("10/minute")  # 每個 IP 每分鐘最多 10 次下載
 async def create_download(request: Request, req: DownloadRequest, background_tasks: BackgroundTasks):
@@ -181,9 +242,23 @@ async def create_download(request: Request, req: DownloadRequest, background_tas
                 detail="不支援的網址格式，請輸入 Threads、小紅書或抖音的影片網址",
             )
 
+    # 積壓過多或記憶體吃緊時拒絕新任務，讓客戶端稍後重試
+    try:
+        await admission.check_new_task(task_queue.count_active())
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.reason,
+            headers={"Retry-After": str(int(e.retry_after))},
+        )
+
     # 建立任務（包含媒體類型資訊）
-    task = task_queue.create_task(url, platform)
-    task.media_type = req.mediaType  # 儲存媒體類型
+    task = task_queue.create_task(
+        url,
+        platform,
+        media_type=req.mediaType,  # 儲存媒體類型
+        client=get_client_id(request),
+    )
 
     # 背景執行下載
     background_tasks.add_task(process_download, task.id)
@@ -221,8 +296,17 @@ async def parse_post(request: Request, req: ParseRequest):
     if not downloader:
         raise HTTPException(status_code=400, detail=f"不支援的平台: {platform}")
 
-    # 解析媒體
-    result = await downloader.parse(url)
+    # 解析媒體（與下載任務相同的總時限）
+    with deadline_scope(settings.task_timeout_seconds), activity_registry.track(None, platform, kind="parse"):
+        result = await downloader.parse(url)
+
+        # lite 部署：只有瀏覽器能解析的貼文交給瀏覽器 worker
+        if result.error_kind == ERROR_NEEDS_BROWSER and browser_tier.enabled():
+            set_step("browser_worker")
+            try:
+                return ParseResponse(**await browser_tier.forward_parse(url, platform, get_client_id(request)))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                return ParseResponse(success=False, error=f"瀏覽器 worker 解析失敗: {str(e) or type(e).__name__}")
 
     if not result.success:
         return ParseResponse(
@@ -279,20 +363,26 @@ async def fetch_thumbnail_as_base64(session: aiohttp.ClientSession, url: str) ->
             if resp.status == 200:
                 content = await resp.read()
                 content_type = resp.headers.get('content-type', 'image/jpeg')
-                b64 = base64.b64encode(content).decode('utf-8')
-                return f"data:{content_type};base64,{b64}"
+                b64 = await run_in_executor(CPU, base64.b64encode, content)
+                return f"data:{content_type};base64,{b64.decode('utf-8')}"
     except Exception:
         pass
     return None
 
 
+def _read_base64(path: str) -> str:
+    """讀取檔案並編碼為 base64（阻塞呼叫，於 cpu 執行緒池執行）"""
+    with open(path, 'rb') as f:
+        return base64.b64encode(f.read()).decode('utf-8')
+
+
 async def extract_video_thumbnail(video_url: str) -> Optional[str]:
     """使用 ffmpeg 從影片提取第一幀作為縮圖"""
     import tempfile
-    try:
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-            tmp_path = tmp.name
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
+        tmp_path = tmp.name
 
+    try:
         # 使用 ffmpeg 提取第一幀
         command = [
             'ffmpeg',
@@ -305,32 +395,26 @@ async def extract_video_thumbnail(video_url: str) -> Optional[str]:
             tmp_path,
         ]
 
-        process = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-
-        await asyncio.wait_for(process.communicate(), timeout=15)
+        await supervisor.run(command, timeout=15)
 
-        if os.path.exists(tmp_path) and os.path.getsize(tmp_path) > 100:
-            with open(tmp_path, 'rb') as f:
-                content = f.read()
-            os.unlink(tmp_path)
-            b64 = base64.b64encode(content).decode('utf-8')
+        if os.path.getsize(tmp_path) > 100:
+            b64 = await run_in_executor(CPU, _read_base64, tmp_path)
             return f"data:image/jpeg;base64,{b64}"
-
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
     except Exception:
         pass
+    finally:
+        # ffmpeg 不存在、逾時或請求被取消時也要刪除暫存檔，長時間運行才不會堆積
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
     return None
 
 
 @app.get("/api/status/{task_id}", response_model=StatusResponse)
 async def get_status(task_id: str):
     """查詢任務狀態"""
-    task = task_queue.get_task(task_id)
+    task = task_queue.touch(task_id)
 
     if not task:
         raise HTTPException(status_code=404, detail="任務不存在")
@@ -341,13 +425,34 @@ async def get_status(task_id: str):
         progress=task.progress,
         downloadUrl=task.download_url,
         error=task.error,
+        attempts=task.attempts,
+    )
+
+
+@app.delete("/api/tasks/{task_id}", response_model=StatusResponse)
+async def cancel_task(task_id: str):
+    """取消任務：中斷下載、終止子程序並刪除部分檔案"""
+    task = task_queue.get_task(task_id)
+
+    if not task:
+        raise HTTPException(status_code=404, detail="任務不存在")
+
+    if not scheduler.cancel(task_id):
+        raise HTTPException(status_code=409, detail="任務已結束，無法取消")
+    task = task_queue.get_task(task_id)
+
+    return StatusResponse(
+        taskId=task.id,
+        status=task.status.value,
+        progress=task.progress,
+        error=task.error,
     )
 
 
 @app.get("/api/files/{filename}")
 async def download_file(filename: str):
     """提供檔案下載"""
-    file_path = storage.get_file_path(filename)
+    file_path = get_storage().get_file_path(filename)
 
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="檔案不存在")
@@ -365,6 +470,7 @@ async def download_file(filename: str):
         "gif": "image/gif",
     }
     media_type = media_types.get(ext, "application/octet-stream")
+    record_bytes_out(filename.split(".", 1)[0], file_path.stat().st_size)
 
     return FileResponse(
         path=str(file_path),
@@ -373,10 +479,53 @@ async def download_file(filename: str):
     )
 
 
+def record_bytes_out(task_id: str, size: int):
+    """把提供給客戶端的檔案大小計入任務成本（嘗試紀錄的總結與成功策略的成本帳）"""
+    task = task_queue.get_task(task_id)
+    if task is None or not task.attempts or task.attempts[-1].get("step") != "task":
+        return
+    summary = task.attempts[-1]
+    summary["cost"]["bytes_out"] += size
+    task_queue.update_task(task_id, attempts=task.attempts)
+    cost_ledger.record(task.platform, summary.get("strategy") or "", Cost(bytes_out=size), count=False)
+
+
 @app.get("/health")
 async def health():
-    """健康檢查"""
-    return {"status": "ok", "app": settings.app_name}
+    """健康檢查（程序存活即回應，不等待預熱）"""
+    return {"status": "ok", "app": settings.app_name, "profile": settings.deployment_profile}
+
+
+@app.get("/ready")
+async def ready():
+    """就緒檢查：存儲已建立且背景預熱已結束才回傳 200"""
+    is_ready = _storage is not None and warmup_state.finished
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "status": "ready" if is_ready else "warming",
+            "storage": _storage is not None,
+            "warmup": warmup_state.snapshot(),
+        },
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    """運行指標：事件迴圈延遲、執行緒池、策略統計、斷路器狀態、各平台與策略的資源成本"""
+    await admission.sample()
+    return {
+        "event_loop": loop_monitor.snapshot(),
+        "executors": executors.snapshot(),
+        "subprocesses": supervisor.snapshot(),
+        "admission": admission.snapshot(),
+        "tasks": scheduler.snapshot(),
+        "strategies": strategy_planner.snapshot(),
+        "step_timeouts": step_timeouts.snapshot(),
+        "circuits": circuit_breakers.snapshot(),
+        "costs": cost_ledger.snapshot(),
+        "sessions": session_store.snapshot(),
+    }
 
 
 @app.get("/")
@@ -388,22 +537,70 @@ async def root():
         "endpoints": {
             "download": "POST /api/download",
             "status": "GET /api/status/{task_id}",
+            "cancel": "DELETE /api/tasks/{task_id}",
             "health": "GET /health",
+            "ready": "GET /ready",
+            "metrics": "GET /metrics",
         },
     }
 
 
 # Background Task
 async def process_download(task_id: str):
-    """背景處理下載任務"""
+    """背景處理下載任務（依客戶端公平排隊，可經由 scheduler 取消）"""
     task = task_queue.get_task(task_id)
-    if not task:
+    client = task.client if task else "anonymous"
+    try:
+        await scheduler.run(task_id, run_download(task_id), client=client)
+    finally:
+        # 取消或失敗時清除下載到一半的檔案（包含各策略的暫存檔）；
+        # 其他 worker 在完成前一刻取消時，完成結果不會寫入，已下載的檔案同樣刪除
+        task = task_queue.get_task(task_id)
+        if task is None or task.status != TaskStatus.COMPLETED:
+            remove_partial_files(task_id)
+
+
+def remove_partial_files(task_id: str) -> int:
+    """刪除任務留下的 {task_id}.* 檔案"""
+    removed = 0
+    for path in Path(settings.local_storage_path).glob(f"{task_id}.*"):
+        try:
+            path.unlink()
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+async def run_download(task_id: str):
+    """執行下載任務（整個任務共用 task_timeout_seconds 的時間預算）"""
+    task = task_queue.get_task(task_id)
+    # 排隊期間已被取消
+    if not task or not task.is_active:
         return
 
+    try:
+        with activity_registry.track(task_id, task.platform) as activity:
+            try:
+                with deadline_scope(settings.task_timeout_seconds), retry_scope(task.attempts):
+                    await _run_download(task_id, task)
+            finally:
+                # 成本總結附在嘗試紀錄最後
+                task.attempts.append(activity.summary())
+    finally:
+        # 共用任務表時嘗試紀錄需寫回，其他 worker 才查得到
+        task_queue.update_task(task_id, attempts=task.attempts)
+
+
+async def _run_download(task_id: str, task):
+
     # 更新狀態為處理中
     task_queue.update_task(task_id, status=TaskStatus.PROCESSING)
 
     try:
+        # 記憶體超過高水位時等待回落再開始
+        await admission.wait_for_memory("下載")
+
         # 直接下載模式（CDN URL）
         if task.platform == "direct":
             await process_direct_download(task_id, task)
@@ -422,7 +619,7 @@ async def process_download(task_id: str):
         # 準備輸出路徑（根據媒體類型決定副檔名）
         ext = "jpg" if task.media_type == "image" else "mp4"
         output_filename = f"{task_id}.{ext}"
-        output_path = str(storage.get_file_path(output_filename))
+        output_path = str(get_storage().get_file_path(output_filename))
 
         # 進度回調
         def progress_callback(progress: int):
@@ -435,9 +632,14 @@ async def process_download(task_id: str):
             progress_callback=progress_callback,
         )
 
+        # lite 部署：只有瀏覽器能取得的貼文交給瀏覽器 worker
+        if result.error_kind == ERROR_NEEDS_BROWSER and browser_tier.enabled():
+            await forward_to_browser_worker(task_id, task)
+            return
+
         if result.success:
             # 獲取下載 URL
-            download_url = storage.get_download_url(output_filename)
+            download_url = await run_in_executor(STORAGE, get_storage().get_download_url, output_filename)
 
             task_queue.update_task(
                 task_id,
@@ -452,6 +654,12 @@ async def process_download(task_id: str):
                 error=result.error or "下載失敗",
             )
 
+    except AdmissionRejected as e:
+        task_queue.update_task(
+            task_id,
+            status=TaskStatus.FAILED,
+            error=e.reason,
+        )
     except Exception as e:
         task_queue.update_task(
             task_id,
@@ -460,6 +668,23 @@ async def process_download(task_id: str):
         )
 
 
+async def forward_to_browser_worker(task_id: str, task):
+    """把任務轉交給瀏覽器 worker，完成時下載網址指向該 worker"""
+    set_step("browser_worker")
+    started = time.monotonic()
+    forwarded = await browser_tier.forward_download(task.url, task.platform, task.media_type, task.client)
+    record_attempt("browser_worker", forwarded.success, time.monotonic() - started)
+    if forwarded.success:
+        task_queue.update_task(
+            task_id,
+            status=TaskStatus.COMPLETED,
+            progress=100,
+            download_url=forwarded.download_url,
+        )
+    else:
+        task_queue.update_task(task_id, status=TaskStatus.FAILED, error=forwarded.error)
+
+
 async def process_direct_download(task_id: str, task):
     """直接下載 CDN URL"""
     try:
@@ -468,49 +693,33 @@ async def process_direct_download(task_id: str, task):
         # 根據媒體類型決定副檔名
         ext = "jpg" if task.media_type == "image" else "mp4"
         output_filename = f"{task_id}.{ext}"
-        output_path = str(storage.get_file_path(output_filename))
+        output_path = str(get_storage().get_file_path(output_filename))
 
         task_queue.update_task(task_id, progress=30)
 
-        # 使用 curl 下載
-        command = [
-            "curl",
-            "-L",
-            "-o", output_path,
-            "-A", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "-H", "Referer: https://www.threads.com/",
-            "--max-time", "300",
-            task.url,
-        ]
-
-        process = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-
-        task_queue.update_task(task_id, progress=50)
-
-        await asyncio.wait_for(process.communicate(), timeout=300)
+        # 使用 curl 下載（暫時性錯誤與限流依重試策略退避後重試）
+        set_step("cdn_download")
+        try:
+            await cdn.fetch_to_file(
+                task.url,
+                output_path,
+                lambda command, timeout: supervisor.run(command, timeout=budget(timeout)),
+                referer="https://www.threads.com/",
+            )
+        except AttemptFailed as e:
+            task_queue.update_task(task_id, status=TaskStatus.FAILED, error=str(e))
+            return
 
+        mark_succeeded()
+        add_cost(storage_bytes=os.path.getsize(output_path))
         task_queue.update_task(task_id, progress=90)
-
-        # 檢查下載結果
-        file_path = storage.get_file_path(output_filename)
-        if file_path.exists() and file_path.stat().st_size > 1000:
-            download_url = storage.get_download_url(output_filename)
-            task_queue.update_task(
-                task_id,
-                status=TaskStatus.COMPLETED,
-                progress=100,
-                download_url=download_url,
-            )
-        else:
-            task_queue.update_task(
-                task_id,
-                status=TaskStatus.FAILED,
-                error="下載的檔案無效",
-            )
+        download_url = await run_in_executor(STORAGE, get_storage().get_download_url, output_filename)
+        task_queue.update_task(
+            task_id,
+            status=TaskStatus.COMPLETED,
+            progress=100,
+            download_url=download_url,
+        )
 
     except asyncio.TimeoutError:
         task_queue.update_task(
@@ -518,6 +727,12 @@ async def process_direct_download(task_id: str, task):
             status=TaskStatus.FAILED,
             error="下載超時",
         )
+    except CircuitOpenError as e:
+        task_queue.update_task(
+            task_id,
+            status=TaskStatus.FAILED,
+            error=str(e),
+        )
     except Exception as e:
         task_queue.update_task(
             task_id,
@@ -526,11 +741,30 @@ async def process_direct_download(task_id: str, task):
         )
 
 
-# 定期清理任務（可選）
+def remove_expired_files(max_age_seconds: float) -> int:
+    """刪除本地存儲中超過保留時間的檔案（阻塞呼叫，於 cpu 執行緒池執行）"""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for path in Path(settings.local_storage_path).iterdir():
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+# 定期清理任務（lifespan 啟動）
 async def cleanup_task():
-    """定期清理過期任務和檔案"""
+    """定期清理過期任務和本地檔案，避免長時間運行後任務表與磁碟無限增長"""
     while True:
-        await asyncio.sleep(3600)  # 每小時執行一次
-        cleaned = task_queue.cleanup_old_tasks(max_age_seconds=86400)  # 清理 24 小時前的任務
-        if cleaned > 0:
-            print(f"🧹 清理了 {cleaned} 個過期任務")
+        await asyncio.sleep(settings.cleanup_interval_seconds)
+        try:
+            cleaned = task_queue.cleanup_old_tasks(max_age_seconds=settings.task_retention_seconds)
+            removed = await run_in_executor(CPU, remove_expired_files, settings.task_retention_seconds)
+        except Exception as e:
+            print(f"⚠️  定期清理失敗: {e}")
+            continue
+        if cleaned or removed:
+            print(f"🧹 清理了 {cleaned} 個過期任務、{removed} 個檔案")
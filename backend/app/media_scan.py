@@ -0,0 +1,175 @@
+"""
+頁面影片 URL 掃描
+各下載器與命令列工具共用：以預先編譯的錨點（.mp4 等副檔名與平台標記）掃描頁面源碼一次，
+只在錨點附近還原完整 URL，再解碼 JSON / HTML 跳脫、去重，並依畫質線索排序候選 URL
+
+只依賴標準函式庫，download_threads.py 可直接匯入
+"""
+
+import html
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# 斜線可能是 /、\/（JSON）或 \u002F（小紅書的 __INITIAL_STATE__）
+_SLASH = r"(?:\\?/|\\u002[fF])"
+# URL 內容：一般字元或常見的跳脫序列（\/、\u002F、\u0026、\u003D）
+_URL_CHAR = r"(?:[^\s\"'<>\\]|\\/|\\u00(?:2[6fF]|3[dD]))"
+_URL_RE = re.compile(rf"https?:{_SLASH}{_SLASH}{_URL_CHAR}+")
+_MAX_URL_LENGTH = 4096
+
+_JSON_ESCAPES = (
+    ("\\/", "/"),
+    ("\\u002F", "/"),
+    ("\\u002f", "/"),
+    ("\\u0026", "&"),
+    ("\\u003D", "="),
+    ("\\u003d", "="),
+)
+
+_VIDEO_EXTENSIONS = (".mp4", ".mov", ".webm", ".m3u8")
+
+# DASH 片段的位元組範圍參數，去除後即為完整檔案
+_RANGE_PARAMS = {"bytestart", "byteend"}
+# 副檔名不會被跳脫，可直接作為錨點（/ 出現太頻繁，不適合當錨點）
+_EXTENSION_ANCHOR = r"\.(?:mp4|mov|webm|m3u8)"
+
+# 畫質線索：URL 中的解析度（720p、_1080.、720x1280）與位元率參數
+_RESOLUTIONS = {240, 360, 480, 540, 576, 720, 1080, 1440, 2160}
+_URL_RESOLUTION_RE = re.compile(r"(?<![0-9])([0-9]{3,4})(?:p(?![a-z])|x[0-9]{3,4}|(?=[._/-]))")
+_URL_BITRATE_RE = re.compile(r"[?&](?:br|bitrate|vbr)=([0-9]+)")
+# 同一個 JSON 物件中、URL 之前的尺寸與位元率欄位
+_CONTEXT_CHARS = 300
+_CONTEXT_HEIGHT_RE = re.compile(r'"height"\s*:\s*([0-9]+)')
+_CONTEXT_WIDTH_RE = re.compile(r'"width"\s*:\s*([0-9]+)')
+_CONTEXT_BITRATE_RE = re.compile(r'"(?:video_?[bB]itrate|bitrate|bit_rate)"\s*:\s*([0-9]+)')
+
+
+@dataclass(frozen=True)
+class ScanProfile:
+    """
+    平台掃描設定
+
+    Attributes:
+        hosts: 影片所在的 CDN 網域片段（空白表示不限制）
+        markers: 沒有副檔名時代表影片的 URL 片段（需不含 / 等會被跳脫的字元）
+    """
+    hosts: Tuple[str, ...] = ()
+    markers: Tuple[str, ...] = ()
+
+
+PROFILES: Dict[str, ScanProfile] = {
+    "threads": ScanProfile(hosts=("cdninstagram.com", "fbcdn.net")),
+    "xiaohongshu": ScanProfile(hosts=("xhscdn.com",)),
+    "douyin": ScanProfile(
+        hosts=("douyinvod.com", "amemv.com", "iesdouyin.com", "snssdk.com", "zjcdn.com", "tiktokcdn"),
+        markers=("video_id=",),
+    ),
+}
+_DEFAULT_PROFILE = ScanProfile()
+
+
+@dataclass(frozen=True)
+class VideoCandidate:
+    url: str
+    position: int  # 在頁面中第一次出現的位置
+    height: int = 0  # 畫面較短邊（0 表示沒有線索）
+    bitrate: int = 0
+
+
+def strip_range_params(url: str) -> str:
+    """去除 DASH 片段的 bytestart/byteend 參數，取得完整檔案 URL"""
+    parsed = urlparse(url)
+    query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if k not in _RANGE_PARAMS]
+    return urlunparse(parsed._replace(query=urlencode(query)))
+
+
+def decode_url(raw: str) -> str:
+    """還原頁面中被跳脫的 URL（JSON 的 \\/、\\u002F、\\u0026 與 HTML 的 &amp;）"""
+    if "\\" in raw:
+        for escaped, char in _JSON_ESCAPES:
+            raw = raw.replace(escaped, char)
+    if "&" in raw:
+        raw = html.unescape(raw)
+    return raw
+
+
+def _is_video(url: str, profile: ScanProfile) -> bool:
+    path = url.split("?", 1)[0].lower()
+    if profile.hosts and not any(host in path for host in profile.hosts):
+        return False
+    return path.endswith(_VIDEO_EXTENSIONS) or any(marker in url for marker in profile.markers)
+
+
+_anchor_patterns: Dict[ScanProfile, "re.Pattern[str]"] = {}
+
+
+def _anchor_pattern(profile: ScanProfile) -> "re.Pattern[str]":
+    """副檔名與平台標記合併為單一正規表示式（依設定快取）"""
+    pattern = _anchor_patterns.get(profile)
+    if pattern is None:
+        alternatives = [_EXTENSION_ANCHOR] + [re.escape(marker) for marker in profile.markers]
+        pattern = _anchor_patterns[profile] = re.compile("|".join(alternatives))
+    return pattern
+
+
+def _quality(source: str, start: int, url: str) -> Tuple[int, int]:
+    """(解析度, 位元率)：優先採用同一 JSON 物件中的欄位，其次是 URL 本身的線索"""
+    context = source[max(0, start - _CONTEXT_CHARS):start]
+    context = context[context.rfind("{") + 1:]
+
+    height = 0
+    heights = _CONTEXT_HEIGHT_RE.findall(context)
+    widths = _CONTEXT_WIDTH_RE.findall(context)
+    if heights:
+        height = int(heights[-1])
+        if widths:
+            height = min(height, int(widths[-1]))
+    else:
+        hints = [int(value) for value in _URL_RESOLUTION_RE.findall(url) if int(value) in _RESOLUTIONS]
+        height = max(hints, default=0)
+
+    bitrates = _CONTEXT_BITRATE_RE.findall(context) or _URL_BITRATE_RE.findall(url)
+    bitrate = int(bitrates[-1]) if bitrates else 0
+    return height, bitrate
+
+
+def scan_video_urls(source: str, platform: Optional[str] = None) -> List[VideoCandidate]:
+    """
+    掃描頁面源碼中的影片 URL
+
+    Args:
+        source: 頁面 HTML、JSON 或 API 回應
+        platform: PROFILES 中的平台名稱（None 表示不限 CDN 網域）
+
+    Returns:
+        去重後的候選清單，依解析度、位元率由高到低排序，相同時保留頁面中的先後順序
+    """
+    profile = PROFILES.get(platform, _DEFAULT_PROFILE)
+    candidates: Dict[str, VideoCandidate] = {}
+    visited = set()
+    for anchor in _anchor_pattern(profile).finditer(source):
+        # 由錨點往前找 URL 開頭，確認錨點確實位於該 URL 之內
+        position = anchor.start()
+        start = source.rfind("http", max(0, position - _MAX_URL_LENGTH), position)
+        if start < 0 or start in visited:
+            continue
+        match = _URL_RE.match(source, start)
+        if not match or match.end() < anchor.end():
+            continue
+        visited.add(start)
+
+        url = decode_url(match.group(0))
+        if url in candidates or not _is_video(url, profile):
+            continue
+        height, bitrate = _quality(source, start, url)
+        candidates[url] = VideoCandidate(url, start, height, bitrate)
+
+    return sorted(candidates.values(), key=lambda c: (-c.height, -c.bitrate, c.position))
+
+
+def best_video_url(source: str, platform: Optional[str] = None) -> Optional[str]:
+    """畫質最高的影片 URL（找不到時回傳 None）"""
+    candidates = scan_video_urls(source, platform)
+    return candidates[0].url if candidates else None
@@ -0,0 +1,212 @@
+"""
+線上效能剖析
+- CPU：取樣式剖析器，定期讀取所有執行緒（事件迴圈與各執行緒池）的呼叫堆疊，
+  輸出 flamegraph.pl / speedscope 可讀的 collapsed stacks 格式
+- 記憶體：tracemalloc 快照與差異，找出持續增長的配置位置
+
+兩者都只在被要求時啟動；閒置時沒有取樣執行緒，也不追蹤配置
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import List, Optional
+
+
+class ProfilerBusy(Exception):
+    """已有一個剖析正在進行"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace(os.sep, "/")
+    short = "/".join(path.rsplit("/", 2)[-2:])
+    return f"{code.co_name} ({short}:{frame.f_lineno})"
+
+
+def _stack(frame) -> List[str]:
+    """由外而內的呼叫堆疊"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class SamplingProfiler:
+    """
+    取樣式 CPU 剖析器
+
+    於獨立執行緒中每隔 interval 秒讀取 sys._current_frames()，
+    以「thread:<名稱>;外層;...;內層 次數」的 collapsed 格式累計
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def sample(self, seconds: float, interval: float = 0.005) -> Counter:
+        """阻塞取樣 seconds 秒，回傳各堆疊的取樣次數"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("已有剖析正在進行")
+        try:
+            own = threading.get_ident()
+            stacks: Counter = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    thread = f"thread:{names.get(ident, ident)}"
+                    stacks[";".join([thread] + _stack(frame))] += 1
+                time.sleep(interval)
+            self.runs += 1
+            return stacks
+        finally:
+            self._lock.release()
+
+    async def profile(self, seconds: float, interval: float = 0.005) -> Counter:
+        """在專用執行緒中取樣（不佔用事件迴圈與共用執行緒池）"""
+        if self.busy:
+            raise ProfilerBusy("已有剖析正在進行")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def run():
+            try:
+                result = self.sample(seconds, interval)
+            except BaseException as e:
+                loop.call_soon_threadsafe(_set_exception, future, e)
+            else:
+                loop.call_soon_threadsafe(_set_result, future, result)
+
+        threading.Thread(target=run, name="profiler", daemon=True).start()
+        return await future
+
+
+def _set_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exc: BaseException):
+    if not future.done():
+        future.set_exception(exc)
+
+
+def collapsed(stacks: Counter) -> str:
+    """collapsed stacks 文字（每行「堆疊 次數」，次數多者在前）"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class MemoryTracker:
+    """
+    tracemalloc 快照管理
+
+    start() 開始追蹤並記錄基準快照；之後每次 snapshot() 都與基準比較，
+    列出增長最多的配置位置。stop() 停止追蹤並釋放快照
+    """
+
+    def __init__(self):
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._started_here = False
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def start(self, frames: int = 1) -> dict:
+        """開始追蹤（已在追蹤時只重設基準快照）"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._started_here = True
+        self._baseline = self._take()
+        return self.status()
+
+    def stop(self) -> dict:
+        self._baseline = None
+        if self._started_here and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_here = False
+        return self.status()
+
+    def snapshot(self, limit: int = 25, key_type: str = "lineno", reset: bool = False) -> dict:
+        """
+        目前配置與基準快照的差異（阻塞呼叫，於 cpu 執行緒池執行）
+
+        Args:
+            limit: 回傳的位置數
+            key_type: "lineno"、"filename" 或 "traceback"
+            reset: 以本次快照作為新的基準
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("尚未開始追蹤記憶體配置")
+
+        current = self._take()
+        if self._baseline is not None:
+            stats = current.compare_to(self._baseline, key_type)
+            top = [
+                {
+                    "location": _trace_label(stat.traceback, key_type),
+                    "size_kb": round(stat.size / 1024, 1),
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "count": stat.count,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:limit]
+            ]
+        else:
+            top = [
+                {
+                    "location": _trace_label(stat.traceback, key_type),
+                    "size_kb": round(stat.size / 1024, 1),
+                    "count": stat.count,
+                }
+                for stat in current.statistics(key_type)[:limit]
+            ]
+        if reset:
+            self._baseline = current
+        return {**self.status(), "key_type": key_type, "top": top}
+
+    def status(self) -> dict:
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else 0,
+            "traced_kb": round(traced / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            "has_baseline": self._baseline is not None,
+        }
+
+
+def _trace_label(traceback: tracemalloc.Traceback, key_type: str) -> str:
+    if key_type == "filename":
+        return traceback[0].filename
+    # 由最內層往外（呼叫者）列出
+    return " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in reversed(traceback))
+
+
+# 全局實例
+cpu_profiler = SamplingProfiler()
+memory_tracker = MemoryTracker()
@@ -1,20 +1,29 @@
 """
 簡單的內存任務隊列
 生產環境建議使用 Redis 或 Celery
+
+單機多 worker（uvicorn --workers N）時改用 SQLite 任務表，讓任一 worker 都能查詢與取消任務
 """
 
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
+import json
+import os
+import sqlite3
+import threading
 import uuid
 
+from .config import get_settings
+
 
 class TaskStatus(Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 
 @dataclass
@@ -27,20 +36,38 @@ class Task:
     download_url: Optional[str] = None
     error: Optional[str] = None
     media_type: Optional[str] = None  # 'video' or 'image'
+    client: str = "anonymous"  # 提交任務的客戶端（公平排程分組用）
     created_at: datetime = field(default_factory=datetime.now)
     updated_at: datetime = field(default_factory=datetime.now)
+    last_polled_at: datetime = field(default_factory=datetime.now)  # 客戶端最後一次查詢狀態
+    attempts: List[dict] = field(default_factory=list)  # 各步驟的嘗試紀錄（含失敗分類）
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (TaskStatus.PENDING, TaskStatus.PROCESSING)
 
 
 class TaskQueue:
+    # 任務狀態是否由多個 worker 程序共用
+    shared = False
+
     def __init__(self):
         self._tasks: Dict[str, Task] = {}
 
-    def create_task(self, url: str, platform: str) -> Task:
+    def create_task(
+        self,
+        url: str,
+        platform: str,
+        media_type: Optional[str] = None,
+        client: str = "anonymous",
+    ) -> Task:
         task_id = str(uuid.uuid4())[:8]  # 短 ID
         task = Task(
             id=task_id,
             url=url,
             platform=platform,
+            media_type=media_type,
+            client=client,
         )
         self._tasks[task_id] = task
         return task
@@ -55,12 +82,19 @@ class TaskQueue:
         progress: Optional[int] = None,
         download_url: Optional[str] = None,
         error: Optional[str] = None,
+        attempts: Optional[List[dict]] = None,
     ) -> Optional[Task]:
         task = self._tasks.get(task_id)
         if not task:
             return None
+        # 已結束（完成、失敗、取消）的任務不再變更狀態，避免執行端的結果蓋掉取消
+        if status is not None and not task.is_active:
+            return task
 
         if status is not None:
+            # 開始處理時重新計算閒置時間：排隊等待期間不算被放棄
+            if status == TaskStatus.PROCESSING and task.status != TaskStatus.PROCESSING:
+                task.last_polled_at = datetime.now()
             task.status = status
         if progress is not None:
             task.progress = progress
@@ -68,10 +102,36 @@ class TaskQueue:
             task.download_url = download_url
         if error is not None:
             task.error = error
+        if attempts is not None:
+            task.attempts = attempts
 
         task.updated_at = datetime.now()
         return task
 
+    def count_active(self) -> int:
+        """等待中與處理中的任務數（准入控制用）"""
+        return sum(1 for task in self._tasks.values() if task.is_active)
+
+    def count(self) -> int:
+        """任務表中的任務數（含已結束、尚未被清理者）"""
+        return len(self._tasks)
+
+    def touch(self, task_id: str) -> Optional[Task]:
+        """記錄客戶端查詢（用於判斷任務是否已被放棄）"""
+        task = self._tasks.get(task_id)
+        if task:
+            task.last_polled_at = datetime.now()
+        return task
+
+    def find_abandoned(self, max_idle_seconds: float) -> List[Task]:
+        """開始處理後超過指定秒數沒有客戶端查詢的任務（仍在排隊者不算）"""
+        now = datetime.now()
+        return [
+            task for task in self._tasks.values()
+            if task.status == TaskStatus.PROCESSING
+            and (now - task.last_polled_at).total_seconds() > max_idle_seconds
+        ]
+
     def delete_task(self, task_id: str) -> bool:
         if task_id in self._tasks:
             del self._tasks[task_id]
@@ -93,5 +153,174 @@ class TaskQueue:
         return len(to_delete)
 
 
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    download_url TEXT,
+    error TEXT,
+    media_type TEXT,
+    client TEXT NOT NULL,
+    attempts TEXT NOT NULL DEFAULT '[]',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_polled_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status);
+"""
+
+_ACTIVE_STATUSES = (TaskStatus.PENDING.value, TaskStatus.PROCESSING.value)
+
+
+class SqliteTaskQueue:
+    """
+    SQLite 任務表（單機多 worker 共用）
+
+    每個 worker 程序開啟同一個資料庫檔案；WAL 模式下讀取不會被寫入阻塞。
+    get_task 回傳的是當下的快照，修改需透過 update_task
+    """
+
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        """執行寫入，回傳影響的列數"""
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """執行查詢並在持有鎖時取回所有列（共用連線的游標不能在鎖外讀取）"""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _row_to_task(row) -> Task:
+        return Task(
+            id=row[0],
+            url=row[1],
+            platform=row[2],
+            status=TaskStatus(row[3]),
+            progress=row[4],
+            download_url=row[5],
+            error=row[6],
+            media_type=row[7],
+            client=row[8],
+            attempts=json.loads(row[9]),
+            created_at=datetime.fromtimestamp(row[10]),
+            updated_at=datetime.fromtimestamp(row[11]),
+            last_polled_at=datetime.fromtimestamp(row[12]),
+        )
+
+    def create_task(
+        self,
+        url: str,
+        platform: str,
+        media_type: Optional[str] = None,
+        client: str = "anonymous",
+    ) -> Task:
+        task = Task(
+            id=str(uuid.uuid4())[:8],
+            url=url,
+            platform=platform,
+            media_type=media_type,
+            client=client,
+        )
+        now = task.created_at.timestamp()
+        self._execute(
+            "INSERT INTO tasks (id, url, platform, status, media_type, client, created_at, updated_at, last_polled_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (task.id, url, platform, task.status.value, media_type, client, now, now, now),
+        )
+        return task
+
+    def get_task(self, task_id: str) -> Optional[Task]:
+        rows = self._query("SELECT * FROM tasks WHERE id = ?", (task_id,))
+        return self._row_to_task(rows[0]) if rows else None
+
+    def update_task(
+        self,
+        task_id: str,
+        status: Optional[TaskStatus] = None,
+        progress: Optional[int] = None,
+        download_url: Optional[str] = None,
+        error: Optional[str] = None,
+        attempts: Optional[List[dict]] = None,
+    ) -> Optional[Task]:
+        columns = {
+            "status": status.value if status is not None else None,
+            "progress": progress,
+            "download_url": download_url,
+            "error": error,
+            "attempts": json.dumps(attempts, ensure_ascii=False) if attempts is not None else None,
+        }
+        assignments = [(name, value) for name, value in columns.items() if value is not None]
+        now = datetime.now().timestamp()
+        assignments.append(("updated_at", now))
+        if status == TaskStatus.PROCESSING:
+            # 開始處理時重新計算閒置時間：排隊等待期間不算被放棄
+            assignments.append(("last_polled_at", now))
+        sql = ", ".join(f"{name} = ?" for name, _ in assignments)
+        params = tuple(value for _, value in assignments) + (task_id,)
+        if status is not None:
+            # 條件式更新：其他 worker 已取消（或任務已結束）時不覆寫
+            self._execute(f"UPDATE tasks SET {sql} WHERE id = ? AND status IN (?, ?)", params + _ACTIVE_STATUSES)
+        else:
+            self._execute(f"UPDATE tasks SET {sql} WHERE id = ?", params)
+        return self.get_task(task_id)
+
+    def count_active(self) -> int:
+        """等待中與處理中的任務數（准入控制用，涵蓋所有 worker）"""
+        rows = self._query("SELECT COUNT(*) FROM tasks WHERE status IN (?, ?)", _ACTIVE_STATUSES)
+        return rows[0][0]
+
+    def count(self) -> int:
+        return self._query("SELECT COUNT(*) FROM tasks")[0][0]
+
+    def touch(self, task_id: str) -> Optional[Task]:
+        self._execute(
+            "UPDATE tasks SET last_polled_at = ? WHERE id = ?", (datetime.now().timestamp(), task_id)
+        )
+        return self.get_task(task_id)
+
+    def find_abandoned(self, max_idle_seconds: float) -> List[Task]:
+        cutoff = datetime.now().timestamp() - max_idle_seconds
+        rows = self._query(
+            "SELECT * FROM tasks WHERE status = ? AND last_polled_at < ?",
+            (TaskStatus.PROCESSING.value, cutoff),
+        )
+        return [self._row_to_task(row) for row in rows]
+
+    def delete_task(self, task_id: str) -> bool:
+        return self._execute("DELETE FROM tasks WHERE id = ?", (task_id,)) > 0
+
+    def cleanup_old_tasks(self, max_age_seconds: int = 3600):
+        cutoff = datetime.now().timestamp() - max_age_seconds
+        return self._execute("DELETE FROM tasks WHERE created_at < ?", (cutoff,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _create_task_queue(settings=None):
+    settings = settings or get_settings()
+    if settings.shared_state_path:
+        return SqliteTaskQueue(os.path.join(settings.shared_state_path, "tasks.db"))
+    return TaskQueue()
+
+
 # 全局任務隊列實例
-task_queue = TaskQueue()
+task_queue = _create_task_queue()
@@ -0,0 +1,112 @@
+"""
+限流計數儲存
+slowapi（limits）預設的計數存在各程序記憶體中，uvicorn --workers N 時每個 worker 各自計數，
+實際上限變成 N 倍。設定 shared_state_path 後改用同一個 SQLite 檔案，讓所有 worker 共用計數
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from limits.storage import Storage
+
+from .config import get_settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+class SQLiteStorage(Storage):
+    """
+    limits 的 SQLite 儲存後端（固定視窗策略）
+
+    以 sqlite://<絕對路徑> 指定，例如 sqlite:///tmp/video-downloader/ratelimit.db
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len("sqlite://"):]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            self.path, timeout=5.0, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        self._lock = threading.Lock()
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        """遞增計數；視窗已過期時重新開始（BEGIN IMMEDIATE 確保跨程序的原子性）"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "DELETE FROM rate_limits WHERE key = ? AND expires_at <= ?", (key, now)
+                )
+                self._conn.execute(
+                    "INSERT INTO rate_limits (key, count, expires_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET count = count + excluded.count",
+                    (key, amount, now + expiry),
+                )
+                row = self._conn.execute(
+                    "SELECT count FROM rate_limits WHERE key = ?", (key,)
+                ).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[0]
+
+    def _row(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT count, expires_at FROM rate_limits WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+
+    def get(self, key: str) -> int:
+        row = self._row(key)
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._row(key)
+        return row[1] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            with self._lock:
+                self._conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        with self._lock:
+            return self._conn.execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+
+def storage_uri(settings=None) -> str:
+    """slowapi Limiter 使用的儲存位置（未設定共用狀態時使用各程序記憶體）"""
+    settings = settings or get_settings()
+    if settings.shared_state_path:
+        return f"sqlite://{os.path.abspath(os.path.join(settings.shared_state_path, 'ratelimit.db'))}"
+    return "memory://"
@@ -0,0 +1,266 @@
+"""
+瀏覽器渲染服務（獨立程序）
+Chromium 只在此程序中執行：卡住或記憶體暴增時不會拖垮 API 程序，也能與 API 分開擴充
+
+服務自有瀏覽器池、並行上限與等待佇列（佇列滿時回傳 503），
+以本機 HTTP 或 Unix socket 提供 RPC：
+- POST /render  {"url": ..., "timeout": 秒數} → 網路層捕捉到的影片、DOM 媒體與（必要時）頁面源碼
+- GET /health、GET /metrics
+
+API 程序設定 RENDER_SERVICE_URL 後，ThreadsDownloader 改為呼叫此服務，不再自行建立 driver
+
+用法（於 backend/ 目錄）：
+    python -m app.render_service --port 8090
+    python -m app.render_service --unix /tmp/video-downloader/render.sock
+"""
+
+import argparse
+import asyncio
+import time
+from dataclasses import asdict, fields
+from typing import Callable, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from . import executors
+from .config import get_settings
+from .deadline import budget
+from .downloaders import browser
+
+# Unix socket 連線時 URL 的主機名稱只作為占位
+_UNIX_PREFIX = "unix:"
+_UNIX_BASE = "http://render-service"
+
+
+class RenderServiceError(Exception):
+    """渲染服務回傳錯誤（佇列已滿、渲染失敗）或無法連線"""
+
+    def __init__(self, message: str, status: int = 502):
+        super().__init__(message)
+        self.status = status
+
+
+class RenderService:
+    """
+    渲染服務本體
+
+    Args:
+        concurrency: 同時渲染數上限（_create_service 會限制在瀏覽器執行緒池的執行緒數以內）
+        queue_limit: 等待中的請求上限，超過時直接拒絕（0 表示不限制）
+        max_timeout: 單次渲染的最長秒數（請求指定的時限不得超過此值）
+        pool: 瀏覽器池（預設為 browser.driver_pool）
+        render: 渲染函式（driver, url, timeout）→ RenderResult
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 2,
+        queue_limit: int = 8,
+        max_timeout: float = 60.0,
+        pool: Optional[browser.DriverPool] = None,
+        render: Callable[..., browser.RenderResult] = browser.render,
+    ):
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.max_timeout = max_timeout
+        self.pool = pool or browser.driver_pool
+        self._render = render
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.rendered = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _render_blocking(self, url: str, timeout: float) -> Tuple[browser.RenderResult, float]:
+        """取得 driver、渲染並歸還（阻塞呼叫，於瀏覽器執行緒池執行）；渲染失敗的 driver 直接關閉"""
+        driver = self.pool.acquire()
+        leased = time.monotonic()
+        reusable = False
+        try:
+            result = self._render(driver, url, timeout)
+            reusable = True
+            return result, time.monotonic() - leased
+        finally:
+            self.pool.release(driver, reusable)
+
+    def _finished(self, future: asyncio.Future):
+        self.running -= 1
+        self._slots.release()
+        # 請求已被取消時仍需取出例外，避免未處理例外警告
+        if not future.cancelled():
+            future.exception()
+
+    async def render(self, url: str, timeout: float) -> dict:
+        """
+        排隊取得渲染名額後渲染
+
+        請求端中途斷線時渲染仍會完成（driver 才能正確歸還），名額在渲染結束後才釋放
+
+        Raises:
+            RenderServiceError: 佇列已滿（503）或渲染失敗（502）
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        if self.queue_limit and self.waiting >= self.queue_limit:
+            self.rejected += 1
+            raise RenderServiceError("渲染佇列已滿", status=503)
+
+        queued = time.monotonic()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        timeout = min(timeout, self.max_timeout)
+        future = asyncio.ensure_future(browser.run_in_browser_executor(self._render_blocking, url, timeout))
+        future.add_done_callback(self._finished)
+        started = time.monotonic()
+        try:
+            result, leased = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            raise RenderServiceError(f"渲染失敗: {e}", status=502)
+
+        self.rendered += 1
+        return {
+            **asdict(result),
+            "browser_seconds": round(leased, 3),
+            "queued_ms": round((started - queued) * 1000, 1),
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "queue_limit": self.queue_limit,
+            "waiting": self.waiting,
+            "running": self.running,
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "pool": self.pool.snapshot(),
+            "executors": executors.snapshot(),
+        }
+
+
+def create_app(service: RenderService, warm: bool = True) -> web.Application:
+    """建立 aiohttp 應用；warm 時於背景填滿瀏覽器池"""
+
+    async def handle_render(request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+            url = body["url"]
+            timeout = float(body.get("timeout") or service.max_timeout)
+        except (ValueError, KeyError, TypeError):
+            return web.json_response({"error": "需要 url 欄位"}, status=400)
+        try:
+            return web.json_response(await service.render(url, timeout))
+        except RenderServiceError as e:
+            headers = {"Retry-After": "1"} if e.status == 503 else None
+            return web.json_response({"error": str(e)}, status=e.status, headers=headers)
+
+    async def handle_health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.json_response(service.snapshot())
+
+    async def on_startup(app: web.Application):
+        if warm and service.pool.size:
+            app["warmup"] = asyncio.ensure_future(browser.run_in_browser_executor(service.pool.fill))
+
+    async def on_cleanup(app: web.Application):
+        warmup = app.get("warmup")
+        if warmup is not None:
+            await asyncio.gather(warmup, return_exceptions=True)
+        await browser.run_in_browser_executor(service.pool.close)
+        executors.shutdown()
+
+    app = web.Application()
+    app.router.add_post("/render", handle_render)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def _create_service(settings=None) -> RenderService:
+    settings = settings or get_settings()
+    concurrency = settings.render_service_concurrency
+    # 超過瀏覽器執行緒數時，已接受的請求只會在執行緒池中排隊，並行上限與佇列上限都失去作用
+    if concurrency > settings.browser_executor_workers:
+        print(
+            f"⚠️ RENDER_SERVICE_CONCURRENCY={concurrency} 超過 BROWSER_EXECUTOR_WORKERS="
+            f"{settings.browser_executor_workers}，改為 {settings.browser_executor_workers}"
+        )
+        concurrency = settings.browser_executor_workers
+    return RenderService(
+        concurrency=concurrency,
+        queue_limit=settings.render_service_queue_size,
+        max_timeout=max(settings.browser_capture_timeout, 1.0) * 4,
+    )
+
+
+async def request_render(
+    url: str,
+    timeout: float,
+    service_url: Optional[str] = None,
+) -> Tuple[browser.RenderResult, float]:
+    """
+    呼叫渲染服務（API 程序端），等待時間受任務剩餘時間限制
+
+    Returns:
+        (渲染結果, 持有瀏覽器的秒數)
+
+    Raises:
+        RenderServiceError: 服務回傳錯誤或無法連線
+        asyncio.TimeoutError: 逾時
+    """
+    service_url = service_url or get_settings().render_service_url
+    if service_url.startswith(_UNIX_PREFIX):
+        connector = aiohttp.UnixConnector(path=service_url[len(_UNIX_PREFIX):])
+        base = _UNIX_BASE
+    else:
+        connector = None
+        base = service_url.rstrip("/")
+
+    # 服務端的排隊時間也要計入，總時限以任務剩餘時間為準
+    total = aiohttp.ClientTimeout(total=budget(get_settings().task_timeout_seconds))
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=total) as session:
+            async with session.post(f"{base}/render", json={"url": url, "timeout": timeout}) as resp:
+                data = await resp.json(content_type=None)
+                if resp.status != 200:
+                    raise RenderServiceError(data.get("error") or f"HTTP {resp.status}", status=resp.status)
+    except aiohttp.ClientError as e:
+        raise RenderServiceError(f"無法連線到渲染服務: {e}")
+
+    names = {field.name for field in fields(browser.RenderResult)}
+    result = browser.RenderResult(**{name: value for name, value in data.items() if name in names})
+    return result, float(data.get("browser_seconds") or 0.0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="瀏覽器渲染服務")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--unix", help="改為監聽 Unix socket 路徑")
+    args = parser.parse_args(argv)
+
+    service = _create_service()
+    where = args.unix or f"{args.host}:{args.port}"
+    print(f"🖥️  渲染服務啟動於 {where}（並行 {service.concurrency}，佇列 {service.queue_limit}）")
+    if args.unix:
+        web.run_app(create_app(service), path=args.unix, print=None)
+    else:
+        web.run_app(create_app(service), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
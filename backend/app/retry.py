@@ -0,0 +1,220 @@
+"""
+重試策略
+將失敗分類為暫時性網路錯誤、限流（403/429）、永久性錯誤（不存在/私人）與擷取器失效，
+只對可恢復的錯誤以指數退避 + 抖動重試；每個任務有重試預算，並遵守 Retry-After。
+每次嘗試都記錄在任務的 attempts 中，方便排查
+"""
+
+import asyncio
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Iterator, List, Optional, TypeVar
+
+from .config import get_settings
+from .deadline import current_deadline
+
+T = TypeVar("T")
+
+# 錯誤分類
+ERROR_TRANSIENT = "transient"  # 連線中斷、逾時、5xx
+ERROR_THROTTLED = "throttled"  # 403/429，上游限流或簽章過期
+ERROR_PERMANENT = "permanent"  # 貼文本身不存在或為私人貼文（頁面或擷取器回報 404/private），會中止策略鏈
+ERROR_EXTRACTOR = "extractor"  # 擷取器無法解析頁面（通常是上游改版）
+ERROR_MEDIA = "media"  # 單一媒體網址失效（簽章過期、4xx、錯誤頁面），只影響該策略，換策略可能取得新網址
+
+RETRYABLE = frozenset({ERROR_TRANSIENT, ERROR_THROTTLED})
+
+# 依序比對，先命中者為準
+_MESSAGE_PATTERNS = [
+    (ERROR_THROTTLED, re.compile(r"\b(429|403)\b|too many requests|rate.?limit|forbidden", re.I)),
+    # 不含 login/cookie：yt-dlp 的「use --cookies」提示很常見，不代表貼文不存在
+    (ERROR_PERMANENT, re.compile(
+        r"\b(404|410)\b|not found|private|unavailable|removed|deleted|找不到", re.I
+    )),
+    (ERROR_TRANSIENT, re.compile(
+        r"\b5\d\d\b|timed? ?out|timeout|connection (reset|refused|aborted)|temporary failure|"
+        r"network is unreachable|remote end closed|逾時|超時", re.I
+    )),
+    (ERROR_EXTRACTOR, re.compile(r"unable to extract|unsupported url|no video formats|解析失敗", re.I)),
+]
+
+# curl 結束碼：無法解析主機、無法連線、逾時、SSL 連線錯誤、空回應、傳送/接收失敗
+_CURL_TRANSIENT_EXIT_CODES = {5, 6, 7, 18, 28, 35, 52, 55, 56}
+
+
+def classify_message(message: Optional[str]) -> Optional[str]:
+    """依錯誤訊息（例如 yt-dlp stderr）分類；無法判斷時回傳 None"""
+    if not message:
+        return None
+    for kind, pattern in _MESSAGE_PATTERNS:
+        if pattern.search(message):
+            return kind
+    return None
+
+
+def classify_http_status(status: int) -> Optional[str]:
+    if status in (403, 429):
+        return ERROR_THROTTLED
+    if status in (404, 410):
+        return ERROR_PERMANENT
+    if status >= 500 or status == 408:
+        return ERROR_TRANSIENT
+    if status >= 400:
+        return ERROR_PERMANENT
+    return None
+
+
+def classify_curl_exit(returncode: int) -> str:
+    return ERROR_TRANSIENT if returncode in _CURL_TRANSIENT_EXIT_CODES else ERROR_PERMANENT
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 標頭（秒數或 HTTP 日期），無法解析時回傳 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class AttemptFailed(Exception):
+    """單次嘗試失敗（附分類與上游建議的重試時間）"""
+
+    def __init__(self, message: str, kind: Optional[str], retry_after: Optional[float] = None):
+        self.kind = kind
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class RetryBudget:
+    """每個任務可使用的重試次數（所有步驟共用）"""
+
+    def __init__(self, retries: int):
+        self.remaining = retries
+
+    def take(self) -> bool:
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+
+@dataclass
+class RetryPolicy:
+    """
+    指數退避 + 完全抖動（full jitter）
+
+    第 n 次重試前等待 uniform(0, min(max_delay, base_delay × multiplier^(n-1)))；
+    上游提供 Retry-After 時至少等待該秒數
+    """
+    max_attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    multiplier: float = 2.0
+    rng: random.Random = field(default_factory=random.Random, repr=False)
+
+    def should_retry(self, kind: Optional[str], attempt: int) -> bool:
+        return kind in RETRYABLE and attempt < self.max_attempts
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        delay = self.rng.uniform(0, ceiling)
+        if retry_after:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+@dataclass
+class RetryContext:
+    """目前任務的重試狀態：預算與嘗試紀錄"""
+    budget: RetryBudget
+    attempts: List[dict]
+
+
+_context: ContextVar[Optional[RetryContext]] = ContextVar("retry_context", default=None)
+
+
+@contextmanager
+def retry_scope(attempts: List[dict], retries: Optional[int] = None) -> Iterator[RetryContext]:
+    """設定任務的重試預算與嘗試紀錄（記錄直接寫入傳入的列表，例如 Task.attempts）"""
+    if retries is None:
+        retries = get_settings().retry_budget_per_task
+    context = RetryContext(RetryBudget(retries), attempts)
+    token = _context.set(context)
+    try:
+        yield context
+    finally:
+        _context.reset(token)
+
+
+def record_attempt(step: str, success: bool, elapsed: float, error_kind: Optional[str] = None, **extra):
+    """記錄一次嘗試到目前任務（沒有任務上下文時忽略；值為 None 的附加欄位省略）"""
+    context = _context.get()
+    if context is None:
+        return
+    entry = {"step": step, "success": success, "elapsed": round(elapsed, 3)}
+    if error_kind:
+        entry["error_kind"] = error_kind
+    entry.update((key, value) for key, value in extra.items() if value is not None)
+    context.attempts.append(entry)
+
+
+def default_policy(settings=None) -> RetryPolicy:
+    settings = settings or get_settings()
+    return RetryPolicy(
+        max_attempts=settings.retry_max_attempts,
+        base_delay=settings.retry_base_delay,
+        max_delay=settings.retry_max_delay,
+    )
+
+
+async def run_with_retry(
+    step: str,
+    operation: Callable[[], Awaitable[T]],
+    policy: Optional[RetryPolicy] = None,
+) -> T:
+    """
+    執行操作，遇到可重試的 AttemptFailed 時退避後重試
+
+    停止重試的條件：錯誤不可重試、達到 max_attempts、任務重試預算用盡、
+    或退避時間超過任務剩餘時間
+
+    Raises:
+        AttemptFailed: 最後一次嘗試的錯誤
+    """
+    policy = policy or default_policy()
+    context = _context.get()
+    attempt = 0
+    while True:
+        attempt += 1
+        started = time.monotonic()
+        try:
+            result = await operation()
+        except AttemptFailed as e:
+            record_attempt(step, False, time.monotonic() - started, e.kind, attempt=attempt, error=str(e))
+            if not policy.should_retry(e.kind, attempt):
+                raise
+            delay = policy.backoff(attempt, e.retry_after)
+            deadline = current_deadline()
+            if deadline is not None and deadline.remaining() <= delay:
+                raise
+            if context is not None and not context.budget.take():
+                raise
+            await asyncio.sleep(delay)
+            continue
+
+        record_attempt(step, True, time.monotonic() - started, attempt=attempt)
+        return result
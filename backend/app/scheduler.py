@@ -0,0 +1,337 @@
+"""
+任務執行與取消
+每個下載任務在獨立的 asyncio.Task 中執行，可透過 API 或閒置偵測取消；
+取消會沿著下載器鏈傳遞：子程序被終止、瀏覽器歸還、部分檔案由呼叫端清除
+
+任務依客戶端（IP 或 API key）分組排隊，以加權 Deficit Round Robin 分配執行名額，
+避免單一整合方大量送出的任務餓死互動使用者
+"""
+
+import asyncio
+from collections import deque
+from typing import Coroutine, Deque, Dict, List, Optional
+
+from .config import get_settings
+from .queue import TaskQueue, TaskStatus, task_queue
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """解析客戶端權重設定，例如 "key:partner=4,ip:10.0.0.5=2" """
+    weights: Dict[str, float] = {}
+    for item in value.split(","):
+        client, sep, weight = item.strip().rpartition("=")
+        if not sep or not client:
+            continue
+        try:
+            weights[client] = float(weight)
+        except ValueError:
+            continue
+    return weights
+
+
+class FairQueue:
+    """
+    加權公平佇列（Deficit Round Robin）
+
+    每個客戶端有自己的等待佇列；輪到某客戶端時其赤字加上權重，
+    赤字足夠（每個任務成本為 1）就放行一個任務。權重 2 的客戶端每輪可執行 2 個任務，
+    權重 0.5 的客戶端每兩輪執行 1 個。達到單一客戶端並行上限時跳過該客戶端
+
+    Args:
+        max_concurrent: 同時執行的任務上限（0 表示不限制）
+        per_client_limit: 單一客戶端同時執行的任務上限（0 表示不限制）
+        weights: 客戶端權重（未列出者為 default_weight）
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 0,
+        per_client_limit: int = 0,
+        weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0,
+    ):
+        self.max_concurrent = max_concurrent
+        self.per_client_limit = per_client_limit
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self._waiting: Dict[str, Deque[asyncio.Future]] = {}
+        self._ring: Deque[str] = deque()  # 有任務等待中的客戶端（輪詢順序）
+        self._deficit: Dict[str, float] = {}
+        self._running: Dict[str, int] = {}
+        self.dispatched = 0
+
+    def weight(self, client: str) -> float:
+        return max(0.01, self.weights.get(client, self.default_weight))
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(waiters) for waiters in self._waiting.values())
+
+    def _capped(self, client: str) -> bool:
+        return bool(self.per_client_limit) and self._running.get(client, 0) >= self.per_client_limit
+
+    def _has_slot(self) -> bool:
+        return not self.max_concurrent or self.running < self.max_concurrent
+
+    def _dispatch(self):
+        """在有空位時依 DRR 順序放行等待中的任務"""
+        skipped = 0
+        while self._ring and self._has_slot() and skipped < len(self._ring):
+            client = self._ring[0]
+            waiters = self._waiting[client]
+            # 已被取消但尚未清除的等待者
+            while waiters and waiters[0].done():
+                waiters.popleft()
+            if not waiters:
+                self._ring.popleft()
+                del self._waiting[client]
+                self._deficit.pop(client, None)
+                continue
+            if self._capped(client):
+                self._ring.rotate(-1)
+                skipped += 1
+                continue
+            skipped = 0
+            if self._deficit.get(client, 0.0) < 1:
+                self._deficit[client] = self._deficit.get(client, 0.0) + self.weight(client)
+                if self._deficit[client] < 1:
+                    self._ring.rotate(-1)
+                    continue
+
+            waiter = waiters.popleft()
+            self._deficit[client] -= 1
+            self._running[client] = self._running.get(client, 0) + 1
+            self.dispatched += 1
+            waiter.set_result(None)
+
+            if not waiters:
+                # 佇列清空的客戶端離開輪詢並歸零赤字（閒置不累積額度）
+                self._ring.popleft()
+                del self._waiting[client]
+                self._deficit.pop(client, None)
+            elif self._deficit[client] < 1:
+                self._ring.rotate(-1)
+
+    async def acquire(self, client: str):
+        """等待輪到此客戶端的執行名額"""
+        waiter = asyncio.get_running_loop().create_future()
+        if client not in self._waiting:
+            self._waiting[client] = deque()
+            self._ring.append(client)
+        self._waiting[client].append(waiter)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 已取得名額才被取消，歸還名額
+                self.release(client)
+            else:
+                self._discard(client, waiter)
+            raise
+
+    def _discard(self, client: str, waiter: asyncio.Future):
+        waiters = self._waiting.get(client)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            return
+        if not waiters:
+            del self._waiting[client]
+            self._ring.remove(client)
+            self._deficit.pop(client, None)
+
+    def release(self, client: str):
+        count = self._running.get(client, 0) - 1
+        if count > 0:
+            self._running[client] = count
+        else:
+            self._running.pop(client, None)
+        self._dispatch()
+
+    def lanes(self) -> Dict[str, dict]:
+        """各客戶端的等待數、執行數與權重"""
+        clients = set(self._waiting) | set(self._running)
+        return {
+            client: {
+                "waiting": sum(1 for waiter in self._waiting.get(client, ()) if not waiter.done()),
+                "running": self._running.get(client, 0),
+                "weight": self.weight(client),
+            }
+            for client in sorted(clients)
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "clients": len(set(self._waiting) | set(self._running)),
+            "max_concurrent": self.max_concurrent,
+            "per_client_limit": self.per_client_limit,
+            "dispatched": self.dispatched,
+        }
+
+
+class TaskScheduler:
+    """
+    任務執行器
+
+    Args:
+        queue: 任務隊列
+        abandon_seconds: 開始處理後超過此秒數沒有客戶端查詢即自動取消（0 表示不啟用）
+        watchdog_interval: 閒置偵測間隔（共用任務表時也用於同步其他 worker 的取消）
+        fair_queue: 執行名額的公平佇列（預設不限制並行數）
+    """
+
+    def __init__(
+        self,
+        queue: TaskQueue,
+        abandon_seconds: float = 0.0,
+        watchdog_interval: float = 10.0,
+        fair_queue: Optional[FairQueue] = None,
+    ):
+        self.queue = queue
+        self.fair_queue = fair_queue or FairQueue()
+        self.abandon_seconds = abandon_seconds
+        self.watchdog_interval = watchdog_interval
+        self._running: Dict[str, asyncio.Task] = {}
+        self._watchdog: Optional[asyncio.Task] = None
+        self.cancelled = 0
+        self.abandoned = 0
+
+    async def run(self, task_id: str, coro: Coroutine, client: str = "anonymous"):
+        """
+        在獨立的 asyncio.Task 中執行任務並等待結束
+
+        任務先在客戶端的佇列中等待執行名額；排隊或執行中被取消時
+        不會把 CancelledError 拋給呼叫端（背景任務本身不應被中斷）
+        """
+        job = asyncio.ensure_future(self._run_admitted(client, coro))
+        self._running[task_id] = job
+        try:
+            await asyncio.wait({job})
+        finally:
+            self._running.pop(task_id, None)
+        if not job.cancelled() and job.exception() is not None:
+            raise job.exception()
+
+    async def _run_admitted(self, client: str, coro: Coroutine):
+        try:
+            await self.fair_queue.acquire(client)
+        except asyncio.CancelledError:
+            # 排隊中被取消，協程不會被執行
+            coro.close()
+            raise
+        try:
+            await coro
+        finally:
+            self.fair_queue.release(client)
+
+    def is_running(self, task_id: str) -> bool:
+        return task_id in self._running
+
+    def task_ids(self) -> List[str]:
+        """本 worker 負責的任務（含仍在排隊者）"""
+        return list(self._running)
+
+    def cancel(self, task_id: str, reason: str = "任務已取消") -> bool:
+        """
+        取消任務：標記為已取消並中斷執行中的協程
+
+        Returns:
+            任務原本是否仍在進行中
+        """
+        task = self.queue.get_task(task_id)
+        if not task or not task.is_active:
+            return False
+
+        self.queue.update_task(task_id, status=TaskStatus.CANCELLED, error=reason)
+        job = self._running.get(task_id)
+        if job is not None:
+            job.cancel()
+        self.cancelled += 1
+        return True
+
+    def cancel_abandoned(self) -> int:
+        """取消長時間沒有客戶端查詢的任務"""
+        if not self.abandon_seconds:
+            return 0
+        count = 0
+        for task in self.queue.find_abandoned(self.abandon_seconds):
+            if self.cancel(task.id, reason="長時間未查詢，任務已自動取消"):
+                count += 1
+        if count:
+            self.abandoned += count
+            print(f"🛑 自動取消 {count} 個無人查詢的任務")
+        return count
+
+    def cancel_revoked(self) -> int:
+        """
+        中斷已在任務表中被標記為取消的本地任務
+
+        共用任務表時，取消請求可能由其他 worker 處理，只更新了任務狀態
+        """
+        count = 0
+        for task_id, job in list(self._running.items()):
+            task = self.queue.get_task(task_id)
+            if task is not None and task.status == TaskStatus.CANCELLED and not job.done():
+                job.cancel()
+                count += 1
+        return count
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watchdog_interval)
+            self.cancel_abandoned()
+            if self.queue.shared:
+                self.cancel_revoked()
+
+    def start(self):
+        """啟動閒置偵測（重複呼叫無作用）"""
+        needed = self.abandon_seconds or self.queue.shared
+        if needed and (self._watchdog is None or self._watchdog.done()):
+            self._watchdog = asyncio.get_running_loop().create_task(self._watch())
+
+    async def stop(self):
+        """停止閒置偵測並取消所有執行中的任務"""
+        watchdog, self._watchdog = self._watchdog, None
+        jobs = list(self._running.values())
+        if watchdog is not None:
+            jobs.append(watchdog)
+        for job in jobs:
+            job.cancel()
+        if jobs:
+            await asyncio.gather(*jobs, return_exceptions=True)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.fair_queue.snapshot(),
+            "stored": self.queue.count(),
+            "cancelled": self.cancelled,
+            "abandoned": self.abandoned,
+            "abandon_seconds": self.abandon_seconds,
+        }
+
+
+def _create_scheduler(settings=None) -> TaskScheduler:
+    settings = settings or get_settings()
+    return TaskScheduler(
+        task_queue,
+        abandon_seconds=settings.task_abandon_seconds,
+        watchdog_interval=settings.task_watchdog_interval,
+        fair_queue=FairQueue(
+            max_concurrent=settings.max_concurrent_tasks,
+            per_client_limit=settings.max_tasks_per_client,
+            weights=parse_weights(settings.client_weights),
+        ),
+    )
+
+
+# 全局任務執行器
+scheduler = _create_scheduler()
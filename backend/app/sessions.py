@@ -0,0 +1,253 @@
+"""
+工作階段重用
+瀏覽器渲染成功後擷取該平台的 cookie，在到期前供 HTTP 擷取（Cookie 標頭）與 yt-dlp（--cookies）重用，
+減少無 cookie 請求觸發的反機器人驗證頁，也就減少退回到昂貴的瀏覽器策略
+
+- 每個平台保留一組 cookie，存成 {session_dir}/{platform}.json，重新啟動後仍可使用
+- 單一 cookie 過了自身到期時間即不再送出；整組在擷取後 session_max_age_seconds 輪替
+- 帶 cookie 的請求遇到驗證頁、登入導向或 403/429 時立即捨棄，下次瀏覽器渲染重新擷取
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import urlparse
+
+from . import executors
+from .config import get_settings
+
+# 遭到驗證或要求登入的跡象（回應網址或錯誤訊息）
+_CHALLENGE_RE = re.compile(r"login|challenge|checkpoint|captcha", re.I)
+
+# 帶 cookie 仍收到這些狀態碼時視為工作階段失效
+CHALLENGE_STATUSES = frozenset({401, 403, 429})
+
+# 只保留 Netscape cookie 檔與 Cookie 標頭需要的欄位（Selenium get_cookies() 的格式）
+_COOKIE_FIELDS = ("name", "value", "domain", "path", "expiry", "secure", "httpOnly")
+
+
+def looks_challenged(text: Optional[str]) -> bool:
+    """回應網址或錯誤訊息是否像驗證頁 / 登入導向"""
+    return bool(text and _CHALLENGE_RE.search(text))
+
+
+def _domain_matches(host: str, domain: str) -> bool:
+    domain = domain.lstrip(".").lower()
+    return host == domain or host.endswith(f".{domain}")
+
+
+@dataclass
+class Session:
+    """單一平台的工作階段"""
+    platform: str
+    cookies: List[dict] = field(default_factory=list)
+    captured_at: float = 0.0  # time.time()，跨程序重啟仍有效
+    uses: int = 0
+
+    def drop_expired(self, now: float):
+        self.cookies = [c for c in self.cookies if not c.get("expiry") or c["expiry"] > now]
+
+
+class SessionStore:
+    """
+    各平台的 cookie 存放處
+
+    Args:
+        directory: 持久化目錄（留空表示只存在記憶體）
+        max_age: 擷取後多久輪替（秒）
+        enabled: 是否重用工作階段
+    """
+
+    def __init__(self, directory: str = "", max_age: float = 21600.0, enabled: bool = True):
+        self.directory = directory
+        self.max_age = max_age
+        self.enabled = enabled
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.rotated = 0
+        self.invalidated = 0
+        self._load()
+
+    def _path(self, platform: str) -> str:
+        return os.path.join(self.directory, f"{platform}.json")
+
+    def _load(self):
+        """啟動時讀回已持久化的工作階段（建立全局實例時執行一次）"""
+        if not self.enabled or not self.directory or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    session = Session(**json.load(f))
+            except (OSError, ValueError, TypeError):
+                continue
+            self._sessions[session.platform] = session
+
+    def _save(self, session: Session):
+        """寫入暫存檔後改名，避免讀到寫一半的檔案（阻塞呼叫，於 storage 執行緒池執行）"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(asdict(session), f)
+            os.replace(tmp_path, self._path(session.platform))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _remove(self, platform: str):
+        try:
+            os.remove(self._path(platform))
+        except FileNotFoundError:
+            pass
+
+    def get(self, platform: str) -> Optional[Session]:
+        """取得仍有效的工作階段；整組到期時輪替（捨棄）"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(platform)
+            if session is None:
+                return None
+            session.drop_expired(now)
+            if session.cookies and now - session.captured_at < self.max_age:
+                return session
+            del self._sessions[platform]
+            self.rotated += 1
+        print(f"🍪 {platform} 工作階段已過期，等待下次瀏覽器渲染重新擷取")
+        return None
+
+    async def capture(self, platform: str, cookies: List[dict]):
+        """以瀏覽器渲染取得的 cookie 取代該平台目前的工作階段"""
+        if not self.enabled:
+            return
+        cookies = [
+            {key: cookie[key] for key in _COOKIE_FIELDS if key in cookie}
+            for cookie in cookies
+            if cookie.get("name") and cookie.get("domain")
+        ]
+        if not cookies:
+            return
+        session = Session(platform=platform, cookies=cookies, captured_at=time.time())
+        with self._lock:
+            self._sessions[platform] = session
+            self.captured += 1
+        if self.directory:
+            await executors.run_in_executor(executors.STORAGE, self._save, session)
+
+    async def invalidate(self, platform: str, reason: str = ""):
+        """帶 cookie 的請求仍被擋下時捨棄工作階段"""
+        with self._lock:
+            if self._sessions.pop(platform, None) is None:
+                return
+            self.invalidated += 1
+        print(f"🍪 捨棄 {platform} 工作階段：{reason or '請求被擋下'}")
+        if self.directory:
+            await executors.run_in_executor(executors.STORAGE, self._remove, platform)
+
+    def cookie_header(self, platform: str, url: str) -> Optional[str]:
+        """組成該網址適用的 Cookie 標頭（沒有可用的 cookie 時為 None）"""
+        session = self.get(platform)
+        if session is None:
+            return None
+        parsed = urlparse(url)
+        host = (parsed.hostname or "").lower()
+        path = parsed.path or "/"
+        pairs = [
+            f"{cookie['name']}={cookie.get('value', '')}"
+            for cookie in session.cookies
+            if _domain_matches(host, cookie["domain"])
+            and path.startswith(cookie.get("path") or "/")
+            and (parsed.scheme == "https" or not cookie.get("secure"))
+        ]
+        if not pairs:
+            return None
+        session.uses += 1
+        return "; ".join(pairs)
+
+    @asynccontextmanager
+    async def cookie_file(self, platform: str) -> AsyncIterator[Optional[str]]:
+        """
+        為單次 yt-dlp 呼叫寫出 Netscape 格式 cookie 檔，結束後刪除（沒有可用的 cookie 時為 None）
+
+        每次呼叫各用一個檔案：yt-dlp 結束時會寫回 cookie 檔，共用同一檔案會互相覆寫
+        """
+        session = self.get(platform)
+        if session is None:
+            yield None
+            return
+        session.uses += 1
+        path = await executors.run_in_executor(executors.STORAGE, _write_cookie_file, session.cookies)
+        try:
+            yield path
+        finally:
+            await executors.run_in_executor(executors.STORAGE, os.remove, path)
+
+    def snapshot(self) -> dict:
+        """各平台工作階段的狀態（不含 cookie 內容）"""
+        now = time.time()
+        with self._lock:
+            sessions = {
+                platform: {
+                    "cookies": len(session.cookies),
+                    "age_seconds": round(now - session.captured_at, 1),
+                    "uses": session.uses,
+                }
+                for platform, session in self._sessions.items()
+            }
+        return {
+            "enabled": self.enabled,
+            "sessions": sessions,
+            "captured": self.captured,
+            "rotated": self.rotated,
+            "invalidated": self.invalidated,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._sessions.clear()
+
+
+def _write_cookie_file(cookies: List[dict]) -> str:
+    """寫出 Netscape 格式 cookie 檔（yt-dlp / curl 皆可讀取），回傳暫存檔路徑"""
+    lines = ["# Netscape HTTP Cookie File"]
+    for cookie in cookies:
+        domain = cookie["domain"]
+        if cookie.get("httpOnly"):
+            domain = f"#HttpOnly_{domain}"
+        lines.append("\t".join([
+            domain,
+            "TRUE" if cookie["domain"].startswith(".") else "FALSE",
+            cookie.get("path") or "/",
+            "TRUE" if cookie.get("secure") else "FALSE",
+            str(int(cookie.get("expiry") or 0)),
+            cookie["name"],
+            cookie.get("value", ""),
+        ]))
+    fd, path = tempfile.mkstemp(prefix="cookies-", suffix=".txt")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def _create_session_store(settings=None) -> SessionStore:
+    settings = settings or get_settings()
+    return SessionStore(
+        directory=settings.session_dir,
+        max_age=settings.session_max_age_seconds,
+        enabled=settings.session_reuse_enabled,
+    )
+
+
+# 全局工作階段存放處
+session_store = _create_session_store()
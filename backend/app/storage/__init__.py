@@ -1,5 +1,19 @@
 from .local import LocalStorage
-from .r2 import R2Storage
-from .gcs import GCSStorage
+
+# R2 (boto3) 與 GCS (google-cloud-storage) 匯入耗時，僅在實際使用時載入
+_LAZY_BACKENDS = {
+    "R2Storage": ".r2",
+    "GCSStorage": ".gcs",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_BACKENDS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    return getattr(importlib.import_module(module_name, __name__), name)
+
 
 __all__ = ["LocalStorage", "R2Storage", "GCSStorage"]
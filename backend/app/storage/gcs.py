@@ -4,13 +4,14 @@ Google Cloud Storage 存儲
 """
 
 import datetime
-import asyncio
 from functools import partial
 from typing import Optional
 
 from google.cloud import storage
 from google.cloud.exceptions import NotFound
 
+from ..executors import STORAGE, run_in_executor
+
 
 class GCSStorage:
     def __init__(
@@ -36,15 +37,13 @@ class GCSStorage:
         content_type: str = "video/mp4",
     ) -> str:
         """上傳檔案到 GCS 並返回下載 URL"""
-        loop = asyncio.get_event_loop()
-
         def _upload():
             blob = self.bucket.blob(filename)
             blob.upload_from_string(content, content_type=content_type)
 
-        await loop.run_in_executor(None, _upload)
+        await run_in_executor(STORAGE, _upload)
 
-        return self.get_download_url(filename)
+        return await run_in_executor(STORAGE, self.get_download_url, filename)
 
     async def upload_from_file(
         self,
@@ -53,22 +52,19 @@ class GCSStorage:
         content_type: str = "video/mp4",
     ) -> str:
         """從本地檔案上傳到 GCS 並返回下載 URL"""
-        loop = asyncio.get_event_loop()
-
         def _upload():
             blob = self.bucket.blob(filename)
             blob.upload_from_filename(file_path, content_type=content_type)
 
-        await loop.run_in_executor(None, _upload)
+        await run_in_executor(STORAGE, _upload)
 
-        return self.get_download_url(filename)
+        return await run_in_executor(STORAGE, self.get_download_url, filename)
 
     async def delete_file(self, filename: str) -> bool:
         """從 GCS 刪除檔案"""
-        loop = asyncio.get_event_loop()
         try:
-            await loop.run_in_executor(
-                None,
+            await run_in_executor(
+                STORAGE,
                 partial(self.bucket.blob(filename).delete),
             )
             return True
@@ -81,7 +77,8 @@ class GCSStorage:
         """
         獲取下載 URL（生成 24 小時有效的 signed URL）
 
-        Note: 需要服務帳號有 storage.objects.get 權限
+        Note: 需要服務帳號有 storage.objects.get 權限；簽章為阻塞呼叫，
+        非同步程式碼中請透過 storage 執行緒池呼叫
         """
         blob = self.bucket.blob(filename)
         url = blob.generate_signed_url(
@@ -93,10 +90,9 @@ class GCSStorage:
 
     async def file_exists(self, filename: str) -> bool:
         """檢查檔案是否存在"""
-        loop = asyncio.get_event_loop()
         try:
-            exists = await loop.run_in_executor(
-                None,
+            exists = await run_in_executor(
+                STORAGE,
                 self.bucket.blob(filename).exists,
             )
             return exists
@@ -105,11 +101,10 @@ class GCSStorage:
 
     async def get_file(self, filename: str) -> Optional[bytes]:
         """下載檔案內容"""
-        loop = asyncio.get_event_loop()
         try:
             blob = self.bucket.blob(filename)
-            content = await loop.run_in_executor(
-                None,
+            content = await run_in_executor(
+                STORAGE,
                 blob.download_as_bytes,
             )
             return content
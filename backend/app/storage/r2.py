@@ -6,9 +6,10 @@ Cloudflare R2 存儲
 import boto3
 from botocore.config import Config
 from typing import Optional
-import asyncio
 from functools import partial
 
+from ..executors import STORAGE, run_in_executor
+
 
 class R2Storage:
     def __init__(
@@ -41,10 +42,8 @@ class R2Storage:
         content_type: str = "video/mp4",
     ) -> str:
         """上傳檔案到 R2 並返回公開 URL"""
-        loop = asyncio.get_event_loop()
-
-        await loop.run_in_executor(
-            None,
+        await run_in_executor(
+            STORAGE,
             partial(
                 self.client.put_object,
                 Bucket=self.bucket_name,
@@ -54,14 +53,13 @@ class R2Storage:
             ),
         )
 
-        return self.get_download_url(filename)
+        return await run_in_executor(STORAGE, self.get_download_url, filename)
 
     async def delete_file(self, filename: str) -> bool:
         """從 R2 刪除檔案"""
-        loop = asyncio.get_event_loop()
         try:
-            await loop.run_in_executor(
-                None,
+            await run_in_executor(
+                STORAGE,
                 partial(
                     self.client.delete_object,
                     Bucket=self.bucket_name,
@@ -85,10 +83,9 @@ class R2Storage:
 
     async def file_exists(self, filename: str) -> bool:
         """檢查檔案是否存在"""
-        loop = asyncio.get_event_loop()
         try:
-            await loop.run_in_executor(
-                None,
+            await run_in_executor(
+                STORAGE,
                 partial(
                     self.client.head_object,
                     Bucket=self.bucket_name,
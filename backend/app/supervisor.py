@@ -0,0 +1,282 @@
+"""
+子程序監管
+所有 yt-dlp / curl / ffmpeg 子程序都經由此處啟動：
+- 每個子程序自成一個程序群組，逾時或任務取消時整組強制終止並回收，不留下孤兒程序
+- 依類型限制同時執行數量
+- 可選的記憶體（RLIMIT_AS）與 CPU 時間（RLIMIT_CPU）上限
+- 即時統計執行中的子程序，供 /metrics 使用
+- 子程序的 CPU 時間與下載量計入目前任務的成本
+"""
+
+import asyncio
+import os
+import signal
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from . import activity
+from .config import get_settings
+
+try:
+    import resource
+except ImportError:  # 非 Unix 平台
+    resource = None
+
+try:
+    _CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+except (AttributeError, ValueError, OSError):
+    _CLOCK_TICKS = 100
+
+
+@dataclass
+class ChildProcess:
+    """執行中的子程序"""
+    pid: int
+    kind: str
+    command: str
+    started_at: float
+
+
+def _cpu_seconds(pid: int) -> Optional[float]:
+    """
+    子程序（含已回收的孫程序）目前累計的 CPU 時間，讀取 /proc/<pid>/stat；
+    無法讀取（已結束或非 Linux）時回傳 None
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # 程序名稱可能含空白與括號，從最後一個 ")" 之後解析；utime、stime、cutime、cstime 為第 14-17 欄
+    fields = data[data.rfind(b")") + 2:].split()
+    try:
+        ticks = sum(int(value) for value in fields[11:15])
+    except (ValueError, IndexError):
+        return None
+    return ticks / _CLOCK_TICKS
+
+
+def _output_size(command: List[str]) -> int:
+    """指令以 -o 指定的輸出檔目前的大小（curl、yt-dlp）"""
+    try:
+        path = command[command.index("-o") + 1]
+        return os.path.getsize(path)
+    except (ValueError, IndexError, OSError):
+        return 0
+
+
+class SubprocessSupervisor:
+    """
+    子程序監管器
+
+    Args:
+        concurrency: 各類型同時執行上限，例如 {"ytdlp": 4}；未列出的類型不限制
+        memory_limit_mb: 單一子程序虛擬記憶體上限（0 表示不限制）
+        cpu_limit_seconds: 單一子程序 CPU 時間上限（0 表示不限制）
+        cpu_sample_interval: CPU 時間取樣間隔；子程序被回收後無法再讀取，
+            最後一次取樣之後的用量不會計入（誤差約一個間隔）
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[Dict[str, int]] = None,
+        memory_limit_mb: int = 0,
+        cpu_limit_seconds: int = 0,
+        cpu_sample_interval: float = 0.1,
+    ):
+        self.concurrency = dict(concurrency or {})
+        self.memory_limit_mb = memory_limit_mb
+        self.cpu_limit_seconds = cpu_limit_seconds
+        self.cpu_sample_interval = cpu_sample_interval
+        self._children: Dict[int, ChildProcess] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._waiting: Dict[str, int] = {}  # 各類型等待並行名額的數量
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.started = 0
+        self.killed = 0
+        self.timeouts = 0
+
+    @staticmethod
+    def classify(command: List[str]) -> str:
+        """依執行檔名稱判斷類型（yt-dlp → ytdlp）"""
+        return os.path.basename(command[0]).replace("-", "")
+
+    def _semaphore(self, kind: str) -> Optional[asyncio.Semaphore]:
+        limit = self.concurrency.get(kind)
+        if not limit:
+            return None
+        # Semaphore 綁定事件迴圈，迴圈更換（例如測試）時重新建立
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphores.clear()
+        if kind not in self._semaphores:
+            self._semaphores[kind] = asyncio.Semaphore(limit)
+        return self._semaphores[kind]
+
+    def _apply_limits(self, pid: int):
+        """設定子程序資源上限（其後衍生的子程序會繼承）"""
+        if resource is None or not hasattr(resource, "prlimit"):
+            return
+        try:
+            if self.memory_limit_mb:
+                limit = self.memory_limit_mb * 1024 * 1024
+                resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+            if self.cpu_limit_seconds:
+                resource.prlimit(
+                    pid, resource.RLIMIT_CPU, (self.cpu_limit_seconds, self.cpu_limit_seconds)
+                )
+        except (OSError, ValueError):
+            # 子程序可能已結束
+            pass
+
+    def _kill_group(self, process: asyncio.subprocess.Process):
+        """終止整個程序群組（包含 yt-dlp 呼叫的 ffmpeg 等孫程序）"""
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        except OSError:
+            process.kill()
+        self.killed += 1
+
+    async def _sample_cpu(self, pid: int, usage: List[float]):
+        """定期記錄子程序的 CPU 時間（usage[0] 為最近一次取樣）"""
+        while True:
+            seconds = _cpu_seconds(pid)
+            if seconds is not None:
+                usage[0] = seconds
+            await asyncio.sleep(self.cpu_sample_interval)
+
+    async def run(
+        self,
+        command: List[str],
+        timeout: float,
+        kind: Optional[str] = None,
+    ) -> Tuple[int, bytes, bytes]:
+        """
+        執行子程序並等待結束
+
+        逾時拋出 asyncio.TimeoutError；逾時或任務被取消時整組終止並回收子程序
+
+        Returns:
+            (returncode, stdout, stderr)
+        """
+        kind = kind or self.classify(command)
+        semaphore = self._semaphore(kind)
+        if semaphore is not None:
+            self._waiting[kind] = self._waiting.get(kind, 0) + 1
+            try:
+                await semaphore.acquire()
+            finally:
+                self._waiting[kind] -= 1
+
+        try:
+            spawn = asyncio.ensure_future(asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+            ))
+            try:
+                process = await asyncio.shield(spawn)
+            except asyncio.CancelledError:
+                # 建立途中被取消時 asyncio 會等子程序自行結束；改為等建立完成後整組終止
+                process = await spawn
+                self._kill_group(process)
+                await asyncio.shield(process.wait())
+                raise
+            self.started += 1
+            self._apply_limits(process.pid)
+            self._children[process.pid] = ChildProcess(
+                pid=process.pid,
+                kind=kind,
+                command=" ".join(command[:2]),
+                started_at=time.monotonic(),
+            )
+            activity.attach_pid(process.pid)
+            usage = [0.0]
+            sampler = asyncio.ensure_future(self._sample_cpu(process.pid, usage))
+            stdout = b""
+
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+            except BaseException as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                if process.returncode is None:
+                    self._kill_group(process)
+                    await asyncio.shield(process.wait())
+                raise
+            finally:
+                sampler.cancel()
+                self._children.pop(process.pid, None)
+                activity.detach_pid(process.pid)
+                # curl 的 stdout 是回應內容或標頭，同樣是自上游接收的資料
+                received = _output_size(command) + (len(stdout) if kind == "curl" else 0)
+                activity.add_cost(cpu_seconds=usage[0], bytes_in=received)
+
+            return process.returncode, stdout, stderr
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    def kill_all(self) -> int:
+        """終止所有執行中的子程序（應用關閉時呼叫），回傳終止數量"""
+        count = 0
+        for child in list(self._children.values()):
+            try:
+                os.killpg(child.pid, signal.SIGKILL)
+                count += 1
+            except OSError:
+                pass
+        return count
+
+    @property
+    def running(self) -> int:
+        return len(self._children)
+
+    def children(self) -> List[ChildProcess]:
+        return list(self._children.values())
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        by_kind: Dict[str, int] = {}
+        for child in self._children.values():
+            by_kind[child.kind] = by_kind.get(child.kind, 0) + 1
+        return {
+            "running": self.running,
+            "by_kind": by_kind,
+            "limits": dict(self.concurrency),
+            "waiting": {kind: count for kind, count in self._waiting.items() if count},
+            "started": self.started,
+            "killed": self.killed,
+            "timeouts": self.timeouts,
+            "children": [
+                {
+                    "pid": child.pid,
+                    "kind": child.kind,
+                    "command": child.command,
+                    "elapsed": round(now - child.started_at, 1),
+                }
+                for child in self._children.values()
+            ],
+        }
+
+
+def _create_supervisor(settings=None) -> SubprocessSupervisor:
+    settings = settings or get_settings()
+    return SubprocessSupervisor(
+        concurrency={
+            "ytdlp": settings.max_ytdlp_processes,
+            "curl": settings.max_curl_processes,
+            "ffmpeg": settings.max_ffmpeg_processes,
+        },
+        memory_limit_mb=settings.subprocess_memory_limit_mb,
+        cpu_limit_seconds=settings.subprocess_cpu_limit_seconds,
+    )
+
+
+# 全局子程序監管器
+supervisor = _create_supervisor()
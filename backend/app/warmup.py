@@ -0,0 +1,91 @@
+"""
+背景預熱
+伺服器開始接受請求後，於背景解析 chromedriver 路徑、填滿瀏覽器池並預先執行 yt-dlp，
+讓第一個真實請求不必承擔冷啟動成本；/ready 依此回報是否已預熱完成
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+from .config import get_settings
+from .supervisor import supervisor
+
+
+class WarmupState:
+    """預熱進度（disabled / pending / running / done）"""
+
+    def __init__(self):
+        self.status = "pending"
+        self.steps: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("disabled", "done")
+
+    def snapshot(self) -> dict:
+        return {"status": self.status, "steps": dict(self.steps)}
+
+    async def _step(self, name: str, coro):
+        """執行單一預熱步驟；失敗只記錄，不影響服務"""
+        started = time.monotonic()
+        try:
+            detail = await coro
+            self.steps[name] = {"ok": True, "detail": detail}
+        except Exception as e:
+            self.steps[name] = {"ok": False, "error": str(e)}
+        self.steps[name]["elapsed"] = round(time.monotonic() - started, 3)
+
+    async def run(self, settings=None):
+        settings = settings or get_settings()
+        self.status = "running"
+        # 讓出事件迴圈，確保伺服器先完成啟動並開始接受請求
+        await asyncio.sleep(0)
+
+        # lite 部署或改用渲染服務時，本程序不啟動瀏覽器
+        if settings.browser_enabled and not settings.render_service_url and settings.browser_pool_size > 0:
+            from .downloaders import browser
+
+            await self._step(
+                "chromedriver",
+                browser.run_in_browser_executor(browser.resolve_chromedriver_path),
+            )
+            await self._step(
+                "browser_pool",
+                browser.run_in_browser_executor(browser.driver_pool.fill),
+            )
+        if settings.warmup_ytdlp:
+            await self._step("ytdlp", _warm_ytdlp())
+
+        self.status = "done"
+        total = sum(step["elapsed"] for step in self.steps.values())
+        print(f"🔥 預熱完成（{total:.1f} 秒）")
+
+    def start(self, settings=None):
+        """於背景啟動預熱；未啟用時直接標記為 disabled"""
+        settings = settings or get_settings()
+        if not settings.warmup_enabled:
+            self.status = "disabled"
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run(settings))
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+async def _warm_ytdlp(timeout: float = 30) -> str:
+    """執行 yt-dlp --version：載入直譯器與套件，後續下載的子程序啟動較快"""
+    _, stdout, _ = await supervisor.run(["yt-dlp", "--version"], timeout=timeout)
+    return stdout.decode().strip()
+
+
+# 全局預熱狀態
+warmup_state = WarmupState()
@@ -0,0 +1,296 @@
+"""
+擷取器微基準測試
+
+以合成的頁面快照（manifest.json 記錄每頁的平台與預期影片 URL）量測各個頁面擷取器。
+快照是依各平台頁面結構手工撰寫的精簡 HTML，並非擷取自線上的真實頁面：
+- "fixture"：直接使用 tests/fixtures/ 中的測試頁面（與擷取器測試共用，不另存副本）
+- "file"：只供基準測試使用、存放在 benchmarks/corpus/ 的頁面（例如瀏覽器渲染後的源碼）
+
+量測項目：
+- 時間：每頁重複執行取中位數，換算為每 MB 頁面的毫秒數
+- 配置：tracemalloc 量測單次擷取的記憶體配置峰值（KB / MB 頁面）
+- 準確度：第一個結果與預期 URL 相同的頁面比例（無影片的頁面應回傳空值）
+
+快照本身只有數 KB，預設以固定亂數種子填充到 --page-mb 大小（模擬真實頁面中大量的
+JSON 資料區塊、腳本與圖片 URL），讓時間反映多 MB 頁面的實際成本
+
+新增快照：測試已有的頁面以 "fixture" 引用；其他頁面存到 corpus/<平台>/ 並以 "file" 引用，
+再在 manifest.json 加上一筆紀錄
+
+用法（於 backend/ 目錄）：
+    python -m benchmarks.extractors                   # 輸出 JSON 報告
+    python -m benchmarks.extractors --check           # 與基準值比較，退步時以狀態碼 1 結束
+    python -m benchmarks.extractors --update-baseline # 以本次結果更新基準值
+"""
+
+import argparse
+import gc
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .startup import BACKEND_DIR
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+FIXTURES_DIR = BACKEND_DIR / "tests" / "fixtures"
+BASELINE_FILE = Path(__file__).resolve().parent / "extractors_baseline.json"
+
+MB = 1024 * 1024
+
+
+@dataclass
+class Page:
+    name: str
+    platform: str
+    source: str
+    expected: Optional[str]
+
+    @property
+    def size_mb(self) -> float:
+        return len(self.source.encode()) / MB
+
+
+@dataclass
+class Extractor:
+    name: str
+    platform: str
+    func: Callable[[str], Optional[str]]
+
+
+# ---------- 頁面填充 ----------
+
+def _hex(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice("0123456789abcdef") for _ in range(length))
+
+
+def _threads_filler(rng: random.Random) -> str:
+    """Threads 頁面中其他用途的 JSON 區塊（跳脫的圖片／大頭貼／靜態資源 URL，不含影片）"""
+    entries = []
+    for _ in range(rng.randint(8, 24)):
+        entries.append(
+            '{"pk":"%d","profile_pic_url":"https:\\/\\/scontent-tpe1-1.cdninstagram.com\\/v\\/t51.2885-19\\/%s_n.jpg'
+            '?stp=dst-jpg_s150x150&_nc_ht=scontent-tpe1-1.cdninstagram.com&oh=00_%s",'
+            '"resource":"https:\\/\\/static.cdninstagram.com\\/rsrc.php\\/v3\\/y%s\\/r\\/%s.js",'
+            '"is_video_call_enabled":false,"text_post_app_badge_label":"%s"}'
+            % (rng.randint(10 ** 17, 10 ** 18), _hex(rng, 24), _hex(rng, 16),
+               _hex(rng, 2), _hex(rng, 11), _hex(rng, 40))
+        )
+    return (
+        '<script type="application/json" data-sjs>{"require":[["ScheduledServerJS","handle",null,'
+        '[{"__bbox":{"define":[["RelayAPIConfigDefaults",[],{"users":[%s]},%d]]}}]]]}</script>\n'
+        '<link rel="preload" href="https://static.cdninstagram.com/rsrc.php/v3i%s/y%s/l/zh_TW/%s.js" as="script">\n'
+        % (",".join(entries), rng.randint(1, 9999), _hex(rng, 2), _hex(rng, 2), _hex(rng, 12))
+    )
+
+
+def _xiaohongshu_filler(rng: random.Random) -> str:
+    """小紅書頁面中的壓縮腳本與其他筆記的圖片資料（\\u002F 跳脫，不含影片）"""
+    notes = []
+    for _ in range(rng.randint(8, 24)):
+        notes.append(
+            '{"id":"%s","type":"normal","cover":{"urlDefault":"http:\\u002F\\u002Fsns-webpic-qc.xhscdn.com'
+            '\\u002F202410191200\\u002F%s\\u002F1040g2sg%s!nd_dft_wlteh_webp_3"},"displayTitle":"%s"}'
+            % (_hex(rng, 24), _hex(rng, 4), _hex(rng, 20), _hex(rng, 30))
+        )
+    code = ";".join(
+        "function %s(e,t,n){var r=n(%d);return e.%s=r.%s(t)}"
+        % ("f" + _hex(rng, 6), rng.randint(1000, 99999), _hex(rng, 4), _hex(rng, 4))
+        for _ in range(rng.randint(20, 60))
+    )
+    return (
+        '<link rel="stylesheet" href="//fe-static.xhscdn.com/formula-static/xhs-pc-web/public/resource/css/%s.css">\n'
+        '<script>window.__FEED_CACHE__=[%s]</script>\n<script>%s</script>\n'
+        % (_hex(rng, 8), ",".join(notes), code)
+    )
+
+
+_FILLERS = {
+    "threads": _threads_filler,
+    "xiaohongshu": _xiaohongshu_filler,
+}
+
+
+def inflate(source: str, platform: str, target_bytes: int, seed: int = 0) -> str:
+    """在 <body> 開頭插入填充內容直到頁面達到指定大小（同一種子產生相同頁面）"""
+    filler = _FILLERS.get(platform)
+    if filler is None or len(source) >= target_bytes:
+        return source
+
+    rng = random.Random(seed)
+    chunks = []
+    size = len(source)
+    while size < target_bytes:
+        chunk = filler(rng)
+        chunks.append(chunk)
+        size += len(chunk)
+
+    body = source.find("<body")
+    position = source.find(">", body) + 1 if body >= 0 else 0
+    return source[:position] + "\n" + "".join(chunks) + source[position:]
+
+
+def load_corpus(corpus_dir: Path = CORPUS_DIR, page_mb: float = 2.0) -> List[Page]:
+    manifest = json.loads((corpus_dir / "manifest.json").read_text(encoding="utf-8"))
+    pages = []
+    for index, entry in enumerate(manifest):
+        if "fixture" in entry:
+            name, path = entry["fixture"], FIXTURES_DIR / entry["fixture"]
+        else:
+            name, path = entry["file"], corpus_dir / entry["file"]
+        source = path.read_text(encoding="utf-8")
+        if page_mb > 0:
+            source = inflate(source, entry["platform"], int(page_mb * MB), seed=index)
+        pages.append(Page(name, entry["platform"], source, entry.get("expected")))
+    return pages
+
+
+# ---------- 擷取器 ----------
+
+def _first_video(items) -> Optional[str]:
+    return next((item.url for item in items if item.type == "video"), None)
+
+
+def load_extractors() -> List[Extractor]:
+    """各平台的擷取器（統一為「頁面源碼 → 第一個影片 URL」）"""
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app.downloaders import threads_page
+    from app.downloaders.threads import ThreadsDownloader
+    from app.downloaders.xiaohongshu import XiaohongshuDownloader
+
+    extractors = [
+        Extractor("threads.page_source", "threads", ThreadsDownloader()._extract_video_url_from_source),
+        Extractor("threads.page_json", "threads", lambda source: _first_video(threads_page.extract_media_items(source))),
+        Extractor("xiaohongshu.page", "xiaohongshu", XiaohongshuDownloader()._extract_video_url),
+    ]
+
+    # 命令列工具（download_threads.py）頂層匯入 selenium，未安裝時略過
+    sys.path.insert(0, str(BACKEND_DIR.parent))
+    try:
+        import download_threads
+    except ImportError as e:
+        print(f"⚠️  略過 cli.page_source: {e}", file=sys.stderr)
+    else:
+        extractors.append(Extractor(
+            "cli.page_source", "threads",
+            lambda source: next(iter(download_threads.find_video_urls(source)), None),
+        ))
+    return extractors
+
+
+# ---------- 量測 ----------
+
+def _time_ms(func: Callable[[str], Optional[str]], source: str, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(source)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _alloc_peak_kb(func: Callable[[str], Optional[str]], source: str) -> float:
+    """單次擷取期間的配置峰值（不含頁面字串本身）"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        func(source)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (peak - before) / 1024
+
+
+def measure(extractor: Extractor, pages: List[Page], repeat: int) -> dict:
+    """單一擷取器在其平台所有頁面上的結果"""
+    per_page = []
+    for page in pages:
+        if page.platform != extractor.platform:
+            continue
+        result = extractor.func(page.source)
+        samples = _time_ms(extractor.func, page.source, repeat)
+        per_page.append({
+            "page": page.name,
+            "size_mb": round(page.size_mb, 3),
+            "median_ms": round(statistics.median(samples), 3),
+            "min_ms": round(min(samples), 3),
+            "alloc_peak_kb": round(_alloc_peak_kb(extractor.func, page.source), 1),
+            "correct": result == page.expected,
+            "result": result,
+        })
+
+    total_mb = sum(p["size_mb"] for p in per_page) or 1.0
+    return {
+        "pages": len(per_page),
+        "ms_per_mb": round(sum(p["median_ms"] for p in per_page) / total_mb, 3),
+        "alloc_kb_per_mb": round(sum(p["alloc_peak_kb"] for p in per_page) / total_mb, 1),
+        "accuracy": round(sum(p["correct"] for p in per_page) / max(len(per_page), 1), 3),
+        "per_page": per_page,
+    }
+
+
+def check(report: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """與基準值比較：時間或配置超過基準 ×(1 + tolerance)、或準確度下降即視為退步"""
+    regressions = []
+    for name, limits in baseline.items():
+        current = report.get(name)
+        if current is None:
+            continue
+        for metric in ("ms_per_mb", "alloc_kb_per_mb"):
+            limit = limits[metric] * (1 + tolerance)
+            if current[metric] > limit:
+                regressions.append(f"{name}.{metric}: {current[metric]} > {limit:.3f}")
+        if current["accuracy"] < limits["accuracy"]:
+            regressions.append(f"{name}.accuracy: {current['accuracy']} < {limits['accuracy']}")
+    return regressions
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="擷取器微基準測試")
+    parser.add_argument("--corpus", type=Path, default=CORPUS_DIR)
+    parser.add_argument("--page-mb", type=float, default=2.0, help="填充後的頁面大小（0 表示使用原始快照）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="", help="只量測名稱包含此字串的擷取器")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="時間與配置允許超出基準值的比例")
+    parser.add_argument("--check", action="store_true", help="與基準值比較，退步時以狀態碼 1 結束")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    pages = load_corpus(args.corpus, args.page_mb)
+    report = {
+        extractor.name: measure(extractor, pages, args.repeat)
+        for extractor in load_extractors()
+        if args.only in extractor.name
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.update_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update({
+            name: {key: result[key] for key in ("ms_per_mb", "alloc_kb_per_mb", "accuracy")}
+            for name, result in report.items()
+        })
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"📝 已更新基準值: {args.baseline}", file=sys.stderr)
+
+    if args.check:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = check(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"❌ 退步: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("✅ 未超過基準值", file=sys.stderr)
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+本機假上游（壓力測試用）
+
+提供三種假服務，讓壓力測試不必連到真正的 Threads / 抖音 / 小紅書：
+- 貼文頁面：/threads.net/@<user>/post/<code>（含 <video> 標籤，指向假 CDN）
+- 假 CDN：/cdn/<name>.mp4?size=<bytes>，可設定首位元組延遲與頻寬
+- 假 yt-dlp：寫入暫存目錄的可執行檔，置於 PATH 最前面；
+  --dump-json 輸出指向假 CDN 的 JSON，-o 則從假 CDN 下載到指定路徑
+
+API 請求中的網址包含平台網域字串（例如 http://127.0.0.1:<port>/douyin.com/video/1），
+因此會被辨識為對應平台，實際流量則全部導向本機
+"""
+
+import asyncio
+import os
+import stat
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from aiohttp import web
+
+_POST_PAGE = """<!DOCTYPE html>
+<html><head><title>Fake post</title></head>
+<body>
+<article>
+<video playsinline src="{video_url}"{poster}></video>
+</article>
+{padding}
+</body></html>
+"""
+
+_FAKE_YTDLP = '''#!{python}
+"""假 yt-dlp（由 benchmarks.fake_upstream 產生）"""
+import json
+import sys
+import time
+import urllib.request
+
+CDN = {cdn!r}
+SIZE = {size}
+LATENCY = {latency}
+
+args = sys.argv[1:]
+if "--version" in args:
+    print("2099.01.01-fake")
+    sys.exit(0)
+
+time.sleep(LATENCY)
+url = CDN + "/cdn/ytdlp.mp4?size=%d" % SIZE
+if "--dump-json" in args:
+    print(json.dumps({{"id": "fake", "url": url, "ext": "mp4", "duration": 12}}))
+    sys.exit(0)
+
+if "-o" in args:
+    output = args[args.index("-o") + 1]
+    with urllib.request.urlopen(url) as resp, open(output, "wb") as f:
+        while True:
+            chunk = resp.read(65536)
+            if not chunk:
+                break
+            f.write(chunk)
+    sys.exit(0)
+
+print("ERROR: unsupported invocation", file=sys.stderr)
+sys.exit(1)
+'''
+
+
+@dataclass
+class UpstreamConfig:
+    """
+    Args:
+        latency: 頁面與 CDN 的首位元組延遲（秒）
+        bandwidth: CDN 每個連線的頻寬（bytes/秒，0 表示不限速）
+        video_size: 影片大小（bytes）
+        page_padding: 頁面額外填充的大小（bytes，模擬真實頁面的體積）
+        ytdlp_latency: 假 yt-dlp 啟動到開始下載的延遲（模擬擷取器耗時）
+        poster: 貼文頁面是否附封面（False 時解析改走 ffmpeg 擷取縮圖的路徑）
+    """
+    latency: float = 0.05
+    bandwidth: int = 0
+    video_size: int = 2 * 1024 * 1024
+    page_padding: int = 200 * 1024
+    ytdlp_latency: float = 0.2
+    poster: bool = True
+
+
+class FakeUpstream:
+    """假上游伺服器"""
+
+    def __init__(self, config: Optional[UpstreamConfig] = None):
+        self.config = config or UpstreamConfig()
+        self.base_url = ""
+        self.requests = 0
+        self.bytes_sent = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    def _app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/threads.net/{path:.*}", self._post_page)
+        app.router.add_get("/cdn/{name}", self._cdn)
+        return app
+
+    async def _post_page(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(self.config.latency)
+        poster = f' poster="{self.base_url}/cdn/poster.jpg?size=2048"' if self.config.poster else ""
+        body = _POST_PAGE.format(
+            video_url=f"{self.base_url}/cdn/threads.mp4?size={self.config.video_size}",
+            poster=poster,
+            padding="<!-- " + "x" * self.config.page_padding + " -->",
+        )
+        self.bytes_sent += len(body)
+        return web.Response(text=body, content_type="text/html")
+
+    async def _cdn(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        size = int(request.query.get("size", self.config.video_size))
+        await asyncio.sleep(self.config.latency)
+
+        response = web.StreamResponse(headers={"Content-Length": str(size)})
+        response.content_type = "image/jpeg" if request.match_info["name"].endswith(".jpg") else "video/mp4"
+        await response.prepare(request)
+
+        chunk_size = 64 * 1024
+        chunk = b"\0" * chunk_size
+        remaining = size
+        while remaining > 0:
+            part = chunk[: min(chunk_size, remaining)]
+            await response.write(part)
+            remaining -= len(part)
+            self.bytes_sent += len(part)
+            if self.config.bandwidth:
+                await asyncio.sleep(len(part) / self.config.bandwidth)
+        await response.write_eof()
+        return response
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{bound_port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def write_fake_ytdlp(self, directory: Path) -> Path:
+        """產生假 yt-dlp 可執行檔，回傳其所在目錄（加到 PATH 最前面）"""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / "yt-dlp"
+        path.write_text(
+            _FAKE_YTDLP.format(
+                python=sys.executable,
+                cdn=self.base_url,
+                size=self.config.video_size,
+                latency=self.config.ytdlp_latency,
+            )
+        )
+        path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        return directory
+
+    def post_url(self, platform: str, index: int) -> str:
+        """各平台的假貼文網址（包含平台網域字串以通過平台辨識）"""
+        if platform == "threads":
+            return f"{self.base_url}/threads.net/@bench/post/B{index:08d}"
+        if platform == "douyin":
+            return f"{self.base_url}/douyin.com/video/{7000000000000000000 + index}"
+        if platform == "xiaohongshu":
+            return f"{self.base_url}/xiaohongshu.com/explore/{index:024x}"
+        if platform == "direct":
+            return f"{self.base_url}/cdn/direct-{index}.mp4?size={self.config.video_size}"
+        raise ValueError(f"未知平台: {platform}")
+
+
+def fake_path_env(bin_dir: Path) -> str:
+    """假 yt-dlp 優先於系統 yt-dlp 的 PATH"""
+    return f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
@@ -0,0 +1,360 @@
+"""
+API 壓力測試
+
+啟動本機假上游（貼文頁面、假 yt-dlp、可設定延遲與頻寬的假 CDN）與 uvicorn，
+以固定平均到達率（Poisson）送出 /api/download 與 /api/parse 請求，下載任務輪詢至結束。
+
+報告（JSON）：
+- 各操作的成功/失敗/被拒數、吞吐量、p50/p95/p99 延遲（下載為送出到任務結束）
+- 伺服器程序樹的 RSS 峰值與子程序數峰值
+- 假上游收到的請求數與傳送位元組數
+
+用法（於 backend/ 目錄）：
+    python -m benchmarks.load --rate 5 --duration 30 --mix threads=2,douyin=1,xiaohongshu=1,parse=1
+    python -m benchmarks.load --bandwidth 2000000 --latency 0.2 --workers 2 --output report.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from .fake_upstream import FakeUpstream, UpstreamConfig, fake_path_env
+from .startup import BACKEND_DIR, _free_port
+
+OPERATIONS = ("threads", "douyin", "xiaohongshu", "direct", "parse")
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """解析操作比例，例如 "threads=2,douyin=1,parse=1" """
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"未知操作: {name}（可用: {', '.join(OPERATIONS)}）")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """nearest-rank 百分位數"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def tree_stats(root_pid: int) -> Tuple[int, int]:
+    """讀取 /proc 取得程序樹的 (RSS 總和 bytes, 子孫程序數)"""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    children: Dict[int, List[int]] = defaultdict(list)
+    rss: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        pid = int(entry)
+        children[int(fields[1])].append(pid)
+        rss[pid] = int(fields[21]) * page_size
+
+    total, count = rss.get(root_pid, 0), 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        count += 1
+        stack.extend(children.get(pid, []))
+    return total, count
+
+
+class Sampler:
+    """定期取樣伺服器程序樹的 RSS 與子程序數"""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_children = 0
+        self.samples = 0
+
+    async def run(self):
+        while True:
+            rss, children = tree_stats(self.pid)
+            self.peak_rss = max(self.peak_rss, rss)
+            self.peak_children = max(self.peak_children, children)
+            self.samples += 1
+            await asyncio.sleep(self.interval)
+
+
+class Recorder:
+    """各操作的結果與延遲"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, operation: str, outcome: str, latency: Optional[float] = None):
+        self.outcomes[operation][outcome] += 1
+        if latency is not None and outcome == "ok":
+            self.latencies[operation].append(latency)
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        report = {}
+        names = sorted(self.outcomes)
+        for name in names + ["all"]:
+            if name == "all":
+                outcomes: Dict[str, int] = defaultdict(int)
+                for per_op in self.outcomes.values():
+                    for key, value in per_op.items():
+                        outcomes[key] += value
+                latencies = [v for values in self.latencies.values() for v in values]
+            else:
+                outcomes = self.outcomes[name]
+                latencies = self.latencies[name]
+            report[name] = {
+                "count": sum(outcomes.values()),
+                "outcomes": dict(outcomes),
+                "throughput_per_second": round(outcomes.get("ok", 0) / elapsed, 3) if elapsed else 0,
+                "latency_ms": {
+                    key: round(value * 1000, 1) if value is not None else None
+                    for key, value in (
+                        ("p50", percentile(latencies, 0.50)),
+                        ("p95", percentile(latencies, 0.95)),
+                        ("p99", percentile(latencies, 0.99)),
+                        ("max", max(latencies) if latencies else None),
+                    )
+                },
+            }
+        return report
+
+
+async def _download(
+    session: aiohttp.ClientSession,
+    api: str,
+    url: str,
+    poll_interval: float,
+    timeout: float,
+) -> str:
+    """送出下載任務並輪詢至結束，回傳結果分類"""
+    async with session.post(f"{api}/api/download", json={"url": url}) as resp:
+        if resp.status in (429, 503):
+            return "rejected"
+        if resp.status != 200:
+            return f"http_{resp.status}"
+        task_id = (await resp.json())["taskId"]
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(poll_interval)
+        async with session.get(f"{api}/api/status/{task_id}") as resp:
+            if resp.status != 200:
+                return f"status_http_{resp.status}"
+            status = (await resp.json())["status"]
+        if status in TERMINAL_STATUSES:
+            return "ok" if status == "completed" else status
+    return "timeout"
+
+
+async def _parse(session: aiohttp.ClientSession, api: str, url: str) -> str:
+    async with session.post(f"{api}/api/parse", json={"url": url}) as resp:
+        if resp.status in (429, 503):
+            return "rejected"
+        if resp.status != 200:
+            return f"http_{resp.status}"
+        return "ok" if (await resp.json()).get("success") else "failed"
+
+
+async def drive(
+    api: str,
+    upstream: FakeUpstream,
+    rate: float,
+    duration: float,
+    mix: Dict[str, float],
+    recorder: Recorder,
+    seed: int = 0,
+    poll_interval: float = 0.2,
+    task_timeout: float = 120.0,
+) -> float:
+    """
+    以 Poisson 到達送出請求（開迴圈：不等待前一個請求完成）
+
+    Returns:
+        從第一個請求到最後一個請求結束的秒數
+    """
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    pending = set()
+    started = time.monotonic()
+    index = 0
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        async def one(operation: str, url: str):
+            begin = time.monotonic()
+            try:
+                if operation == "parse":
+                    outcome = await _parse(session, api, url)
+                else:
+                    outcome = await _download(session, api, url, poll_interval, task_timeout)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                outcome = f"error_{type(e).__name__}"
+            recorder.record(operation, outcome, time.monotonic() - begin)
+
+        while time.monotonic() - started < duration:
+            operation = rng.choices(names, weights)[0]
+            platform = "threads" if operation == "parse" else operation
+            index += 1
+            task = asyncio.ensure_future(one(operation, upstream.post_url(platform, index)))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            await asyncio.sleep(rng.expovariate(rate))
+
+        if pending:
+            await asyncio.gather(*pending)
+    return time.monotonic() - started
+
+
+def start_server(port: int, env: Dict[str, str], workers: int) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--port", str(port),
+        "--log-level", "warning",
+        "--workers", str(workers),
+    ]
+    return subprocess.Popen(
+        command,
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(api: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{api}/health") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.05)
+    raise TimeoutError("uvicorn 未在時限內回應 /health")
+
+
+async def run(args) -> dict:
+    upstream = FakeUpstream(
+        UpstreamConfig(
+            latency=args.latency,
+            bandwidth=args.bandwidth,
+            video_size=args.video_size,
+            ytdlp_latency=args.ytdlp_latency,
+        )
+    )
+    await upstream.start()
+
+    workdir = Path(tempfile.mkdtemp(prefix="video-downloader-bench-"))
+    bin_dir = upstream.write_fake_ytdlp(workdir / "bin")
+    env = {
+        **os.environ,
+        "PATH": fake_path_env(bin_dir),
+        "LOCAL_STORAGE_PATH": str(workdir / "files"),
+        "RATE_LIMIT_ENABLED": "false",
+        "WARMUP_ENABLED": "false",
+        "MAX_CONCURRENT_TASKS": str(args.max_concurrent),
+        "MAX_TASKS_PER_CLIENT": "0",
+    }
+    if args.workers > 1:
+        env["SHARED_STATE_PATH"] = str(workdir / "state")
+
+    port = _free_port()
+    api = f"http://127.0.0.1:{port}"
+    server = start_server(port, env, args.workers)
+    sampler = Sampler(server.pid)
+    sampling = None
+    try:
+        await wait_ready(api)
+        sampling = asyncio.ensure_future(sampler.run())
+        recorder = Recorder()
+        elapsed = await drive(
+            api, upstream, args.rate, args.duration, parse_mix(args.mix), recorder, seed=args.seed
+        )
+    finally:
+        if sampling is not None:
+            sampling.cancel()
+        server.terminate()
+        server.wait(timeout=15)
+        await upstream.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "config": {
+            "rate": args.rate,
+            "duration": args.duration,
+            "mix": args.mix,
+            "workers": args.workers,
+            "max_concurrent_tasks": args.max_concurrent,
+            "latency": args.latency,
+            "bandwidth": args.bandwidth,
+            "video_size": args.video_size,
+            "ytdlp_latency": args.ytdlp_latency,
+            "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "operations": recorder.summary(elapsed),
+        "server": {
+            "peak_rss_bytes": sampler.peak_rss,
+            "peak_children": sampler.peak_children,
+            "samples": sampler.samples,
+        },
+        "upstream": {"requests": upstream.requests, "bytes_sent": upstream.bytes_sent},
+    }
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="API 壓力測試（本機假上游）")
+    parser.add_argument("--rate", type=float, default=5.0, help="平均每秒送出的請求數")
+    parser.add_argument("--duration", type=float, default=20.0, help="送出請求的秒數")
+    parser.add_argument("--mix", default="threads=2,douyin=1,xiaohongshu=1,parse=1", help="操作比例")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker 數")
+    parser.add_argument("--max-concurrent", type=int, default=5, help="MAX_CONCURRENT_TASKS")
+    parser.add_argument("--latency", type=float, default=0.05, help="假上游首位元組延遲（秒）")
+    parser.add_argument("--bandwidth", type=int, default=0, help="假 CDN 每連線頻寬（bytes/秒，0 不限速）")
+    parser.add_argument("--video-size", type=int, default=2 * 1024 * 1024, help="影片大小（bytes）")
+    parser.add_argument("--ytdlp-latency", type=float, default=0.2, help="假 yt-dlp 擷取延遲（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="另存 JSON 報告的路徑")
+    args = parser.parse_args(argv)
+    parse_mix(args.mix)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+長時間穩定性（soak）測試
+
+以本機假上游（benchmarks.fake_upstream）連續執行大量下載與解析，定期取樣伺服器：
+- rss_bytes：uvicorn 主程序的 RSS
+- fds：主程序開啟的檔案描述元數
+- children：子孫程序數（yt-dlp、curl、ffmpeg 等）
+- temp_bytes / temp_files：伺服器 TMPDIR 的大小與檔案數
+- storage_bytes：本地存儲目錄大小
+- stored_tasks：任務表大小（/metrics 的 tasks.stored）
+
+判定方式：略過暖機期後把取樣分成前後兩半，後半的最大值比前半多出超過容許值
+（max(絕對值, 相對值 × 前半最大值)）即視為無限增長。全部送完後等待一輪定期清理，
+閒置時不得留下子程序與暫存檔。任一項失敗時以狀態碼 1 結束
+
+任務紀錄與本地檔案的保留時間縮短為 --retention 秒，讓定期清理在測試期間多次執行
+
+用法（於 backend/ 目錄）：
+    python -m benchmarks.soak --tasks 20000 --concurrency 16
+    python -m benchmarks.soak --tasks 2000 --output soak.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import aiohttp
+
+from .fake_upstream import FakeUpstream, UpstreamConfig, fake_path_env
+from .load import Recorder, _download, _parse, parse_mix, start_server, tree_stats, wait_ready
+from .startup import _free_port
+
+# 各指標的容許增長：(絕對值, 相對於前半最大值的比例)
+TOLERANCES = {
+    "rss_bytes": (32 * 1024 * 1024, 0.10),
+    "fds": (16, 0.10),
+    "children": (8, 0.0),
+    "temp_bytes": (1024 * 1024, 0.0),
+    "temp_files": (8, 0.0),
+    "storage_bytes": (4 * 1024 * 1024, 0.25),
+    "stored_tasks": (64, 0.25),
+}
+
+
+def _dir_usage(path: Path) -> tuple:
+    """(總位元組, 檔案數)"""
+    total = files = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+                files += 1
+            except OSError:
+                pass
+    return total, files
+
+
+async def sample(session: aiohttp.ClientSession, api: str, pid: int, workdir: Path, started: float) -> dict:
+    _, children = tree_stats(pid)
+    with open(f"/proc/{pid}/statm") as f:
+        rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    temp_bytes, temp_files = _dir_usage(workdir / "tmp")
+    storage_bytes, _ = _dir_usage(workdir / "files")
+    async with session.get(f"{api}/metrics") as resp:
+        stored = (await resp.json())["tasks"].get("stored")
+    return {
+        "elapsed": round(time.monotonic() - started, 2),
+        "rss_bytes": rss,
+        "fds": len(os.listdir(f"/proc/{pid}/fd")),
+        "children": children,
+        "temp_bytes": temp_bytes,
+        "temp_files": temp_files,
+        "storage_bytes": storage_bytes,
+        "stored_tasks": stored,
+    }
+
+
+def growth(samples: List[dict], warmup: float) -> Dict[str, dict]:
+    """略過暖機期後，後半最大值相對前半最大值的增長與是否超過容許值"""
+    steady = samples[int(len(samples) * warmup):]
+    half = len(steady) // 2
+    first, second = steady[:half], steady[half:]
+    result = {}
+    for metric, (absolute, relative) in TOLERANCES.items():
+        if not first or not second:
+            continue
+        before = max(s[metric] for s in first)
+        after = max(s[metric] for s in second)
+        allowed = max(absolute, relative * before)
+        result[metric] = {
+            "first_half_max": before,
+            "second_half_max": after,
+            "growth": after - before,
+            "allowed": allowed,
+            "bounded": after - before <= allowed,
+        }
+    return result
+
+
+async def drive(
+    api: str,
+    upstream: FakeUpstream,
+    tasks: int,
+    concurrency: int,
+    mix: Dict[str, float],
+    recorder: Recorder,
+    seed: int = 0,
+    poll_interval: float = 0.1,
+    task_timeout: float = 120.0,
+):
+    """固定並行數的封閉迴圈：每個工作者完成一個請求後才送出下一個"""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    remaining = iter(range(tasks))
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        async def worker():
+            for index in remaining:
+                operation = rng.choices(names, weights)[0]
+                platform = "threads" if operation == "parse" else operation
+                url = upstream.post_url(platform, index)
+                begin = time.monotonic()
+                try:
+                    if operation == "parse":
+                        outcome = await _parse(session, api, url)
+                    else:
+                        outcome = await _download(session, api, url, poll_interval, task_timeout)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    outcome = f"error_{type(e).__name__}"
+                recorder.record(operation, outcome, time.monotonic() - begin)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def run(args) -> dict:
+    upstream = FakeUpstream(
+        UpstreamConfig(
+            latency=0.0,
+            video_size=args.video_size,
+            page_padding=0,
+            ytdlp_latency=0.0,
+            poster=False,
+        )
+    )
+    await upstream.start()
+
+    workdir = Path(tempfile.mkdtemp(prefix="video-downloader-soak-"))
+    (workdir / "tmp").mkdir()
+    bin_dir = upstream.write_fake_ytdlp(workdir / "bin")
+    env = {
+        **os.environ,
+        "PATH": fake_path_env(bin_dir),
+        "TMPDIR": str(workdir / "tmp"),
+        "LOCAL_STORAGE_PATH": str(workdir / "files"),
+        "RATE_LIMIT_ENABLED": "false",
+        "WARMUP_ENABLED": "false",
+        "MAX_CONCURRENT_TASKS": str(args.concurrency),
+        "MAX_TASKS_PER_CLIENT": "0",
+        "MAX_BACKLOG_TASKS": "0",
+        "TASK_RETENTION_SECONDS": str(args.retention),
+        "CLEANUP_INTERVAL_SECONDS": str(args.cleanup_interval),
+    }
+
+    port = _free_port()
+    api = f"http://127.0.0.1:{port}"
+    server = start_server(port, env, workers=1)
+    samples: List[dict] = []
+    recorder = Recorder()
+    started = time.monotonic()
+    try:
+        await wait_ready(api)
+        async with aiohttp.ClientSession() as session:
+
+            async def sampling():
+                while True:
+                    samples.append(await sample(session, api, server.pid, workdir, started))
+                    await asyncio.sleep(args.sample_interval)
+
+            sampler = asyncio.ensure_future(sampling())
+            try:
+                await drive(api, upstream, args.tasks, args.concurrency, parse_mix(args.mix), recorder, seed=args.seed)
+                elapsed = time.monotonic() - started
+                # 等待一輪定期清理後量測閒置狀態
+                await asyncio.sleep(args.retention + args.cleanup_interval + 1)
+            finally:
+                sampler.cancel()
+            idle = await sample(session, api, server.pid, workdir, started)
+    finally:
+        server.terminate()
+        server.wait(timeout=15)
+        await upstream.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    metrics = growth(samples, args.warmup)
+    idle_checks = {
+        "no_children": idle["children"] == 0,
+        "no_temp_files": idle["temp_files"] == 0,
+        "tasks_cleaned": idle["stored_tasks"] == 0,
+    }
+    return {
+        "config": {
+            "tasks": args.tasks,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "video_size": args.video_size,
+            "retention": args.retention,
+            "cleanup_interval": args.cleanup_interval,
+            "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "operations": recorder.summary(elapsed),
+        "samples": len(samples),
+        "growth": metrics,
+        "idle": idle,
+        "idle_checks": idle_checks,
+        "passed": all(m["bounded"] for m in metrics.values()) and all(idle_checks.values()),
+        "timeline": samples if args.timeline else None,
+    }
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="長時間穩定性測試（本機假上游）")
+    parser.add_argument("--tasks", type=int, default=20000, help="下載與解析請求總數")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時進行的請求數")
+    parser.add_argument("--mix", default="threads=3,direct=3,parse=2,douyin=1,xiaohongshu=1", help="操作比例")
+    parser.add_argument("--video-size", type=int, default=64 * 1024, help="影片大小（bytes）")
+    parser.add_argument("--retention", type=int, default=20, help="TASK_RETENTION_SECONDS")
+    parser.add_argument("--cleanup-interval", type=float, default=5.0, help="CLEANUP_INTERVAL_SECONDS")
+    parser.add_argument("--sample-interval", type=float, default=2.0, help="取樣間隔（秒）")
+    parser.add_argument("--warmup", type=float, default=0.2, help="判定增長時略過的前段比例")
+    parser.add_argument("--timeline", action="store_true", help="報告中附上所有取樣")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="另存 JSON 報告的路徑")
+    args = parser.parse_args(argv)
+    parse_mix(args.mix)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+    if not report["passed"]:
+        raise SystemExit(1)
+    return report
+
+
+if __name__ == "__main__":
+    main()
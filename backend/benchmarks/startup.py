@@ -0,0 +1,116 @@
+"""
+冷啟動基準測試
+
+量測兩個指標（皆為全新子程序，模擬 Cloud Run 冷啟動）：
+- import：`import app.main` 所需時間，以及匯入後是否載入了重量級套件
+- ready：啟動 uvicorn 到 /health 首次回應 200 的時間
+
+用法（於 backend/ 目錄）：
+    python -m benchmarks.startup --runs 5
+輸出 JSON 至 stdout
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = (
+    "selenium",
+    "webdriver_manager",
+    "boto3",
+    "google.cloud.storage",
+    "yt_dlp",
+)
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({"elapsed": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import() -> dict:
+    """全新直譯器中匯入 app.main 的時間"""
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SCRIPT],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    # 最後一行為量測結果（前面可能有啟動訊息）
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_ready(timeout: float = 30.0) -> float:
+    """啟動 uvicorn 直到 /health 回應 200 的秒數"""
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env={**os.environ, "WARMUP_ENABLED": "false"},
+    )
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError("uvicorn 未在時限內回應 /health")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def _summary(values) -> dict:
+    return {
+        "min": round(min(values), 4),
+        "median": round(statistics.median(values), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="冷啟動基準測試")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-server", action="store_true", help="只量測匯入時間")
+    args = parser.parse_args(argv)
+
+    imports = [measure_import() for _ in range(args.runs)]
+    report = {
+        "runs": args.runs,
+        "import_seconds": _summary([r["elapsed"] for r in imports]),
+        "heavy_modules_loaded": sorted({m for r in imports for m in r["loaded"]}),
+    }
+    if not args.skip_server:
+        report["health_seconds"] = _summary([measure_ready() for _ in range(args.runs)])
+
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
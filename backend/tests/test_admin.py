@@ -0,0 +1,170 @@
+"""
+管理端點與線上剖析測試
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.activity import activity_registry, set_step, strategy_scope
+from app.main import app, settings
+from app.profiling import ProfilerBusy, SamplingProfiler, collapsed, memory_tracker
+from app.supervisor import supervisor
+
+TOKEN = "secret-token"
+
+
+@pytest.fixture
+def admin_client(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", TOKEN)
+    return TestClient(app, headers={"X-Admin-Token": TOKEN})
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestAdminAuth:
+    """管理權杖測試"""
+
+    def test_disabled_without_token(self, client: TestClient, monkeypatch):
+        """未設定 admin_token 時端點如同不存在"""
+        monkeypatch.setattr(settings, "admin_token", "")
+        response = client.post("/admin/memory/stop", headers={"X-Admin-Token": "anything"})
+        assert response.status_code == 404
+
+    def test_wrong_token(self, client: TestClient, monkeypatch):
+        monkeypatch.setattr(settings, "admin_token", TOKEN)
+        assert client.post("/admin/memory/stop").status_code == 401
+        assert client.post("/admin/memory/stop", headers={"X-Admin-Token": "nope"}).status_code == 401
+
+
+class TestCpuProfiler:
+    """取樣式 CPU 剖析測試"""
+
+    def test_samples_other_threads(self):
+        """剖析結果包含其他執行緒的堆疊，且不含剖析器自身"""
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name="busy-worker")
+        worker.start()
+        try:
+            stacks = SamplingProfiler().sample(0.2, interval=0.002)
+        finally:
+            stop.set()
+            worker.join()
+
+        text = collapsed(stacks)
+        line = next(line for line in text.splitlines() if line.startswith("thread:busy-worker;"))
+        assert "busy_loop (tests/test_admin.py:" in line
+        assert int(line.rsplit(" ", 1)[1]) > 0
+
+    def test_one_profile_at_a_time(self):
+        profiler = SamplingProfiler()
+        thread = threading.Thread(target=profiler.sample, args=(0.3,))
+        thread.start()
+        time.sleep(0.05)
+        try:
+            with pytest.raises(ProfilerBusy):
+                profiler.sample(0.1)
+        finally:
+            thread.join()
+
+    def test_endpoint_returns_collapsed_stacks(self, admin_client: TestClient):
+        response = admin_client.post("/admin/profile/cpu", params={"seconds": 0.1})
+        assert response.status_code == 200
+        assert int(response.headers["X-Profile-Samples"]) > 0
+        assert response.text.startswith("thread:")
+
+    def test_endpoint_rejects_long_profiles(self, admin_client: TestClient):
+        response = admin_client.post("/admin/profile/cpu", params={"seconds": settings.profile_max_seconds + 1})
+        assert response.status_code == 400
+
+
+class TestMemorySnapshots:
+    """tracemalloc 快照測試"""
+
+    def test_diff_shows_growth(self, admin_client: TestClient):
+        """基準之後的配置出現在差異的最前面"""
+        assert admin_client.get("/admin/memory/snapshot").status_code == 409
+
+        try:
+            assert admin_client.post("/admin/memory/start").json()["tracing"] is True
+            leak = [bytearray(1024) for _ in range(2000)]
+            data = admin_client.get("/admin/memory/snapshot", params={"limit": 5}).json()
+            # 差異最大的是上面這行配置，且涵蓋其全部大小
+            assert "test_admin.py" in data["top"][0]["location"]
+            assert data["top"][0]["size_diff_kb"] >= sum(len(chunk) for chunk in leak) // 1024
+        finally:
+            status = admin_client.post("/admin/memory/stop").json()
+        assert status["tracing"] is False
+        assert not memory_tracker.tracing
+
+
+class TestLiveState:
+    """執行中任務即時狀態測試"""
+
+    async def test_running_task_details(self, async_client, monkeypatch, tmp_path):
+        """執行中的任務顯示策略、步驟、子程序 PID 與已寫入的位元組"""
+        monkeypatch.setattr(settings, "admin_token", TOKEN)
+        monkeypatch.setattr(settings, "local_storage_path", str(tmp_path))
+        (tmp_path / "task-1.mp4.ytdlp.part").write_bytes(b"x" * 1000)
+        (tmp_path / "other.mp4").write_bytes(b"x" * 10)
+        started = asyncio.Event()
+
+        async def job():
+            with activity_registry.track("task-1", "threads"):
+                with strategy_scope("ytdlp"):
+                    set_step("ytdlp")
+                    started.set()
+                    await supervisor.run(["sleep", "30"], timeout=30, kind="ytdlp")
+
+        task = asyncio.ensure_future(job())
+        await started.wait()
+        while not supervisor.running:
+            await asyncio.sleep(0.01)
+        try:
+            response = await async_client.get("/admin/state", headers={"X-Admin-Token": TOKEN})
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        assert response.status_code == 200
+        data = response.json()
+        [entry] = [t for t in data["tasks"] if t["task_id"] == "task-1"]
+        assert entry["platform"] == "threads"
+        assert entry["strategies"][0]["name"] == "ytdlp"
+        assert entry["strategies"][0]["step"] == "ytdlp"
+        assert entry["pids"] == [child["pid"] for child in data["pools"]["subprocesses"]["children"]]
+        assert entry["bytes_transferred"] == 1000
+        assert data["storage"]["files"] == 2
+        assert data["storage"]["bytes"] == 1010
+        assert data["lanes"]["subprocesses"]["ytdlp"]["running"] == 1
+
+        # 任務結束後即從狀態中移除，PID 也一併解除
+        assert activity_registry.get("task-1") is None
+
+    async def test_hedged_strategies_are_isolated(self):
+        """對沖時各策略在自己的 asyncio.Task 中記錄步驟，互不覆蓋"""
+        with activity_registry.track("task-2", "douyin") as activity:
+            gate = asyncio.Event()
+
+            async def attempt(name: str, step: str):
+                with strategy_scope(name):
+                    set_step(step)
+                    await gate.wait()
+
+            attempts = [
+                asyncio.ensure_future(attempt("ytdlp", "ytdlp")),
+                asyncio.ensure_future(attempt("api", "curl")),
+            ]
+            await asyncio.sleep(0)
+            steps = {s["name"]: s["step"] for s in activity.snapshot()["strategies"]}
+            gate.set()
+            await asyncio.gather(*attempts)
+
+        assert steps == {"ytdlp": "ytdlp", "api": "curl"}
+        assert activity.strategies == {}
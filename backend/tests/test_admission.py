@@ -0,0 +1,131 @@
+"""
+准入控制測試
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.admission import AdmissionController, AdmissionRejected, admission, descendant_rss, process_tree_rss
+
+
+class FakeMemory:
+    """可調整的記憶體讀數"""
+
+    def __init__(self, usage: int, limit: int = 1000):
+        self.usage = usage
+        self.limit = limit
+
+    def __call__(self):
+        return self.usage, self.limit
+
+
+def make_controller(memory: FakeMemory, **kwargs) -> AdmissionController:
+    return AdmissionController(
+        high_watermark=0.8,
+        critical_watermark=0.9,
+        sample_interval=0,
+        reader=memory,
+        rss_reader=lambda: 0,
+        **kwargs,
+    )
+
+
+class TestAdmissionController:
+    """水位判斷測試"""
+
+    async def test_rejects_when_backlog_full(self):
+        """測試積壓超過上限時回傳 429"""
+        controller = make_controller(FakeMemory(100), max_backlog=2)
+        await controller.check_new_task(backlog=1)
+
+        with pytest.raises(AdmissionRejected) as exc:
+            await controller.check_new_task(backlog=2)
+        assert exc.value.status_code == 429
+
+    async def test_rejects_over_critical_watermark(self):
+        """測試記憶體達臨界水位時回傳 503"""
+        controller = make_controller(FakeMemory(950))
+        with pytest.raises(AdmissionRejected) as exc:
+            await controller.check_new_task(backlog=0)
+        assert exc.value.status_code == 503
+
+    async def test_uses_process_tree_rss_without_cgroup_limit(self):
+        """測試沒有 cgroup 上限時以程序樹 RSS 對照記憶體預算，而非整機用量"""
+        rss = {"value": 950}
+        controller = AdmissionController(
+            high_watermark=0.8,
+            critical_watermark=0.9,
+            sample_interval=0,
+            memory_limit=1000,
+            reader=lambda: (None, None),
+            rss_reader=lambda: rss["value"],
+        )
+        with pytest.raises(AdmissionRejected):
+            await controller.check_new_task(backlog=0)
+
+        rss["value"] = 100
+        await controller.check_new_task(backlog=0)
+        assert controller.snapshot()["memory_source"] == "process"
+        assert controller.snapshot()["process_tree_rss"] == 100
+
+    async def test_concurrent_waiters_share_one_sample(self):
+        """測試多個等待者共用同一次取樣"""
+        calls = []
+
+        def reader():
+            calls.append(1)
+            return 100, 1000
+
+        controller = AdmissionController(sample_interval=60, reader=reader, rss_reader=lambda: 0)
+        await asyncio.gather(*(controller.sample() for _ in range(10)))
+        assert len(calls) == 1
+
+    async def test_delays_until_memory_recovers(self):
+        """測試超過高水位時延後，回落後放行"""
+        memory = FakeMemory(850)
+        controller = make_controller(memory, wait_timeout=5)
+
+        async def recover():
+            await asyncio.sleep(0.05)
+            memory.usage = 500
+
+        asyncio.ensure_future(recover())
+        await controller.wait_for_memory("瀏覽器啟動", poll_interval=0.01)
+        assert controller.delayed == 1
+        assert controller.rejected == 0
+
+    async def test_gives_up_after_wait_timeout(self):
+        """測試等待逾時後拒絕"""
+        controller = make_controller(FakeMemory(850), wait_timeout=0.05)
+        with pytest.raises(AdmissionRejected):
+            await controller.wait_for_memory("下載", poll_interval=0.01)
+        assert controller.rejected == 1
+
+    def test_descendant_rss_counts_children(self):
+        """測試子程序 RSS 加總"""
+        import subprocess
+
+        child = subprocess.Popen(["sleep", "5"])
+        try:
+            assert descendant_rss() > 0
+            assert process_tree_rss() > descendant_rss()
+        finally:
+            child.kill()
+            child.wait()
+
+
+class TestDownloadAdmission:
+    """建立任務時的准入控制測試"""
+
+    def test_create_download_returns_retry_after(self, client: TestClient, sample_urls: dict, monkeypatch):
+        """測試負載過高時回傳 503 與 Retry-After"""
+        monkeypatch.setattr(admission, "_reader", FakeMemory(990))
+        monkeypatch.setattr(admission, "_sample", None)
+        monkeypatch.setattr(admission, "sample_interval", 0)
+
+        response = client.post("/api/download", json={"url": sample_urls["threads"]})
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(int(admission.retry_after))
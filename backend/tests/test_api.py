@@ -26,6 +26,50 @@ class TestHealthEndpoint:
         assert "version" in data
         assert "endpoints" in data
 
+    def test_metrics_endpoint(self, client: TestClient):
+        """測試運行指標端點"""
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        data = response.json()
+        assert "blocked_count" in data["event_loop"]
+        assert "strategies" in data
+        assert "circuits" in data
+
+
+class TestStartup:
+    """冷啟動與就緒檢查測試"""
+
+    def test_ready_after_lifespan(self):
+        """測試 lifespan 建立存儲後 /ready 回傳 200（未啟用預熱）"""
+        from app.main import app
+
+        with TestClient(app) as client:
+            response = client.get("/ready")
+            assert response.status_code == 200
+            data = response.json()
+            assert data["status"] == "ready"
+            assert data["warmup"]["status"] == "disabled"
+
+    def test_import_skips_heavy_dependencies(self):
+        """測試匯入 app.main 不會載入 selenium、雲端 SDK 等重量級套件"""
+        import subprocess
+        import sys
+        from pathlib import Path
+
+        script = (
+            "import sys, app.main; "
+            "print([m for m in ('selenium', 'webdriver_manager', 'boto3', "
+            "'google.cloud.storage', 'yt_dlp', 'app.downloaders.threads') if m in sys.modules])"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=Path(__file__).resolve().parent.parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        assert output.strip().splitlines()[-1] == "[]"
+
 
 class TestDownloadEndpoint:
     """下載端點測試"""
@@ -98,6 +142,26 @@ class TestDownloadEndpoint:
         assert response.status_code == 422  # Validation error
 
 
+    def test_forwarded_requests_limited_per_original_client(self, client: TestClient, monkeypatch):
+        """瀏覽器層轉交的請求不受 lite worker IP 的限流，改以原客戶端計數"""
+        from app.config import get_settings
+        from app.main import limiter
+
+        monkeypatch.setattr(get_settings(), "browser_worker_token", "worker-secret")
+
+        def post(original: str):
+            headers = {"X-Worker-Token": "worker-secret", "X-Forwarded-Client": original}
+            return client.post("/api/download", json={"url": ""}, headers=headers)
+
+        try:
+            assert [post("ip:8.8.4.4").status_code for _ in range(10)] == [400] * 10
+            assert post("ip:8.8.4.4").status_code == 429
+            # 同一個 lite worker 轉交的其他使用者不受影響
+            assert post("ip:1.1.1.1").status_code == 400
+        finally:
+            limiter.reset()
+
+
 class TestStatusEndpoint:
     """狀態查詢端點測試"""
 
@@ -133,3 +197,59 @@ class TestFileEndpoint:
         """測試下載不存在的檔案"""
         response = client.get("/api/files/nonexistent.mp4")
         assert response.status_code == 404
+
+    def test_served_bytes_added_to_task_cost(self, client: TestClient):
+        """測試提供下載的檔案大小計入任務的成本總結"""
+        from app.main import get_storage
+        from app.queue import task_queue
+
+        task = task_queue.create_task("https://cdn.example.com/v.mp4", "direct")
+        summary = {"step": "task", "success": True, "elapsed": 1.0, "strategy": None, "cost": {"bytes_out": 0}}
+        task_queue.update_task(task.id, attempts=[summary])
+        path = get_storage().get_file_path(f"{task.id}.mp4")
+        path.write_bytes(b"x" * 1500)
+        try:
+            assert client.get(f"/api/files/{task.id}.mp4").status_code == 200
+        finally:
+            path.unlink()
+
+        assert task_queue.get_task(task.id).attempts[-1]["cost"]["bytes_out"] == 1500
+        assert "costs" in client.get("/metrics").json()
+
+
+class TestLongRunningCleanup:
+    """長時間運行的資源清理測試"""
+
+    async def test_thumbnail_temp_file_removed_on_failure(self, tmp_path, monkeypatch):
+        """測試 ffmpeg 執行失敗時縮圖暫存檔仍被刪除"""
+        import tempfile
+
+        from app import main
+
+        async def missing_ffmpeg(command, timeout=None):
+            raise FileNotFoundError("ffmpeg")
+
+        monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+        monkeypatch.setattr(main.supervisor, "run", missing_ffmpeg)
+
+        assert await main.extract_video_thumbnail("https://example.com/v.mp4") is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_remove_expired_files(self, tmp_path, monkeypatch):
+        """測試只刪除超過保留時間的本地檔案"""
+        import os
+        import time
+
+        from app import main
+
+        monkeypatch.setattr(main.settings, "local_storage_path", str(tmp_path))
+        old = tmp_path / "old.mp4"
+        recent = tmp_path / "recent.mp4"
+        old.write_bytes(b"x")
+        recent.write_bytes(b"x")
+        expired = time.time() - 7200
+        os.utime(old, (expired, expired))
+
+        assert main.remove_expired_files(max_age_seconds=3600) == 1
+        assert not old.exists()
+        assert recent.exists()
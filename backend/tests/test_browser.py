@@ -0,0 +1,253 @@
+"""
+瀏覽器網路監聽測試（使用假 driver，不需要 Chrome）
+"""
+
+import json
+import time
+
+from app.downloaders import browser
+
+
+def response_event(url: str, mime_type: str = "video/mp4") -> dict:
+    message = {
+        "message": {
+            "method": "Network.responseReceived",
+            "params": {"response": {"url": url, "mimeType": mime_type}},
+        }
+    }
+    return {"message": json.dumps(message)}
+
+
+class FakeDriver:
+    """模擬 driver：每次讀取日誌回傳預先排好的一批事件"""
+
+    def __init__(self, batches, page_media=None, page_source="<html></html>", cookies=None):
+        self.batches = list(batches)
+        self.cookies = cookies or []
+        self.cdp_commands = []
+        self.visited = None
+        self.page_media = page_media or {}
+        self.scripts = 0
+        self.source_reads = 0
+        self._page_source = page_source
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.cdp_commands.append((cmd, params))
+
+    def get(self, url):
+        self.visited = url
+
+    def get_log(self, log_type):
+        assert log_type == "performance"
+        return self.batches.pop(0) if self.batches else []
+
+    def execute_script(self, script):
+        self.scripts += 1
+        return self.page_media
+
+    def get_cookies(self):
+        return self.cookies
+
+    @property
+    def page_source(self):
+        self.source_reads += 1
+        return self._page_source
+
+
+class TestMediaDetection:
+    """媒體回應判斷測試"""
+
+    def test_is_media_response(self):
+        """測試只接受 CDN 上的影片"""
+        assert browser.is_media_response(
+            "https://scontent.cdninstagram.com/o1/v/t16/f2/m69/a.mp4?efg=1", "video/mp4"
+        )
+        assert browser.is_media_response(
+            "https://video-tpe1-1.xx.fbcdn.net/o1/v/t2/f2/m86/b.mp4?bytestart=0"
+        )
+        assert not browser.is_media_response(
+            "https://scontent.cdninstagram.com/v/t51/poster.jpg", "image/jpeg"
+        )
+        assert not browser.is_media_response("https://evil.example.com/a.mp4", "video/mp4")
+
+    def test_strip_range_params(self):
+        """測試去除 DASH 片段參數"""
+        url = "https://video.fbcdn.net/v/a.mp4?efg=x&bytestart=0&byteend=1023&oh=1"
+        assert browser.strip_range_params(url) == "https://video.fbcdn.net/v/a.mp4?efg=x&oh=1"
+
+    def test_media_urls_from_log_dedupes_segments(self):
+        """測試同一影片的多個片段只列一次"""
+        entries = [
+            response_event("https://www.threads.net/api/graphql", "application/json"),
+            response_event("https://video.fbcdn.net/v/a.mp4?efg=x&bytestart=0&byteend=10"),
+            response_event("https://video.fbcdn.net/v/a.mp4?efg=x&bytestart=11&byteend=20"),
+            {"message": "not json"},
+        ]
+        assert browser.media_urls_from_log(entries) == ["https://video.fbcdn.net/v/a.mp4?efg=x"]
+
+
+class TestCaptureMedia:
+    """事件驅動擷取測試"""
+
+    def test_returns_on_first_media_response(self):
+        """測試觀察到影片回應即返回"""
+        driver = FakeDriver([
+            [],  # 清除舊事件
+            [response_event("https://www.threads.net/", "text/html")],
+            [response_event("https://video.fbcdn.net/v/a.mp4")],
+            [response_event("https://video.fbcdn.net/v/never-read.mp4")],
+        ])
+
+        result = browser.capture_media(driver, "https://www.threads.net/@u/post/A", timeout=5, poll_interval=0)
+
+        assert result.media_urls == ["https://video.fbcdn.net/v/a.mp4"]
+        assert result.timed_out is False
+        assert driver.visited == "https://www.threads.net/@u/post/A"
+        blocked = dict(driver.cdp_commands)["Network.setBlockedURLs"]["urls"]
+        assert "*.css" in blocked and "*.woff2" in blocked and "*.jpg" in blocked
+
+    def test_hard_deadline(self):
+        """測試沒有媒體時於截止時間返回"""
+        driver = FakeDriver([])
+        result = browser.capture_media(driver, "https://www.threads.net/", timeout=0.05, poll_interval=0.01)
+        assert result.media_urls == []
+        assert result.timed_out is True
+
+
+    def test_image_post_returns_without_video_response(self):
+        """測試圖片貼文沒有影片回應，DOM 出現 CDN 圖片後即返回，不等到截止時間"""
+        driver = FakeDriver([], page_media={
+            "images": [{"src": "https://scontent.cdninstagram.com/a.jpg", "width": 1080}],
+        })
+
+        started = time.monotonic()
+        result = browser.capture_media(driver, "https://www.threads.net/@u/post/A", timeout=5, poll_interval=0.01)
+
+        assert time.monotonic() - started < 1
+        assert result.timed_out is False
+        assert result.media_urls == []
+        assert result.page_media["images"][0]["width"] == 1080
+
+    def test_video_element_without_url_keeps_waiting(self):
+        """測試影片貼文的 <video> 尚無網址時，不因海報圖片提早返回"""
+        driver = FakeDriver([], page_media={
+            "videos": [{"src": "blob:https://www.threads.net/1", "poster": ""}],
+            "images": [{"src": "https://scontent.cdninstagram.com/poster.jpg", "width": 720}],
+        })
+
+        result = browser.capture_media(driver, "https://www.threads.net/", timeout=0.1, poll_interval=0.01)
+
+        assert result.timed_out is True
+        assert result.page_media is None
+
+
+class TestRender:
+    """批次渲染測試"""
+
+    def test_collects_dom_media_in_one_script(self):
+        """測試 DOM 媒體以單次腳本取回，有影片時不讀取頁面源碼"""
+        driver = FakeDriver(
+            [],
+            page_media={
+                "videos": [{"src": "https://video.fbcdn.net/v/dom.mp4", "poster": ""}],
+                "images": [{"src": "https://scontent.cdninstagram.com/a.jpg", "width": 1080}],
+            },
+        )
+
+        result = browser.render(driver, "https://www.threads.net/@u/post/A", timeout=0.01)
+
+        assert driver.scripts == 1
+        assert driver.source_reads == 0
+        assert result.videos[0]["src"].endswith("dom.mp4")
+        assert result.images[0]["width"] == 1080
+        assert result.sources == []
+        assert result.page_source is None
+
+    def test_returns_cookies(self):
+        """測試渲染結果附上瀏覽器中的 cookie，供 HTTP 擷取重用"""
+        cookies = [{"name": "csrftoken", "value": "abc", "domain": ".threads.net", "path": "/"}]
+        driver = FakeDriver([], cookies=cookies)
+
+        result = browser.render(driver, "https://www.threads.net/", timeout=0.01)
+
+        assert result.cookies == cookies
+
+    def test_falls_back_to_page_source(self):
+        """測試網路與 DOM 皆無影片時才讀取頁面源碼"""
+        driver = FakeDriver([], page_media=None, page_source="<html>video</html>")
+
+        result = browser.render(driver, "https://www.threads.net/", timeout=0.01)
+
+        assert result.timed_out is True
+        assert driver.source_reads == 1
+        assert result.page_source == "<html>video</html>"
+
+    async def test_runs_on_browser_executor(self):
+        """測試 WebDriver 呼叫在瀏覽器專用執行緒中執行"""
+        import threading
+
+        name = await browser.run_in_browser_executor(lambda: threading.current_thread().name)
+        assert name.startswith("browser")
+
+
+class TestDriverPath:
+    """chromedriver 路徑快取測試"""
+
+    def test_resolves_once_and_caches_on_disk(self, tmp_path, monkeypatch):
+        """測試只安裝一次，之後由行程內或磁碟快取取得"""
+        driver_bin = tmp_path / "chromedriver"
+        driver_bin.write_text("")
+        driver_bin.chmod(0o755)
+        cache_file = tmp_path / "cache" / "chromedriver.json"
+        calls = []
+
+        def install(chromium):
+            calls.append(chromium)
+            return str(driver_bin)
+
+        monkeypatch.setattr(browser, "_driver_path", None)
+        assert browser.resolve_chromedriver_path(str(cache_file), install) == str(driver_bin)
+        assert browser.resolve_chromedriver_path(str(cache_file), install) == str(driver_bin)
+        assert json.loads(cache_file.read_text())["path"] == str(driver_bin)
+
+        # 模擬新的行程：只剩磁碟快取
+        monkeypatch.setattr(browser, "_driver_path", None)
+        assert browser.resolve_chromedriver_path(str(cache_file), install) == str(driver_bin)
+        assert len(calls) == 1
+
+
+class TestDriverPool:
+    """瀏覽器池測試"""
+
+    def test_reuses_idle_drivers(self):
+        """測試歸還的 driver 會被重用，超過容量或不可重用時關閉"""
+        created = []
+
+        class Driver:
+            quit_called = False
+
+            def quit(self):
+                self.quit_called = True
+
+        def factory():
+            created.append(Driver())
+            return created[-1]
+
+        pool = browser.DriverPool(size=1, factory=factory)
+        assert pool.fill() == 1
+
+        first = pool.acquire()
+        second = pool.acquire()
+        assert len(created) == 2
+
+        pool.release(first)
+        pool.release(second)
+        assert pool.idle_count == 1
+        assert second.quit_called is True
+        assert pool.acquire() is first
+
+        pool.release(first, reusable=False)
+        assert first.quit_called is True
+
+        pool.close()
+        assert pool.idle_count == 0
@@ -0,0 +1,178 @@
+"""
+斷路器測試
+"""
+
+import pytest
+
+from app.circuit import (
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+    CircuitState,
+    circuit_breakers,
+)
+from app.downloaders.base import ERROR_CIRCUIT_OPEN, BaseDownloader, DownloadResult
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCircuitBreaker:
+    """斷路器狀態轉換測試"""
+
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    @pytest.fixture
+    def breaker(self, clock: FakeClock):
+        return CircuitBreaker("test", failure_threshold=3, recovery_timeout=30, clock=clock)
+
+    def _fail(self, breaker: CircuitBreaker, times: int = 1):
+        for _ in range(times):
+            with breaker.guard() as call:
+                call.failure()
+
+    def test_opens_after_threshold(self, breaker: CircuitBreaker):
+        """測試連續失敗達門檻後開啟"""
+        self._fail(breaker, 2)
+        assert breaker.state == CircuitState.CLOSED
+        self._fail(breaker)
+        assert breaker.state == CircuitState.OPEN
+
+        with pytest.raises(CircuitOpenError) as exc_info:
+            with breaker.guard():
+                pass
+        assert "test" in str(exc_info.value)
+        assert exc_info.value.retry_after == pytest.approx(30)
+
+    def test_success_resets_failures(self, breaker: CircuitBreaker):
+        """測試成功後重置失敗計數"""
+        self._fail(breaker, 2)
+        with breaker.guard() as call:
+            call.success()
+        self._fail(breaker, 2)
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_exception_counts_as_failure(self, breaker: CircuitBreaker):
+        """測試區塊內例外視為失敗"""
+        for _ in range(3):
+            with pytest.raises(TimeoutError):
+                with breaker.guard():
+                    raise TimeoutError()
+        assert breaker.state == CircuitState.OPEN
+
+    def test_half_open_probe_closes(self, breaker: CircuitBreaker, clock: FakeClock):
+        """測試半開狀態探測成功後關閉"""
+        self._fail(breaker, 3)
+        clock.now = 31
+        assert breaker.state == CircuitState.HALF_OPEN
+
+        with breaker.guard() as probe:
+            # 探測進行中，其他請求仍被拒絕
+            with pytest.raises(CircuitOpenError):
+                with breaker.guard():
+                    pass
+            probe.success()
+
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_half_open_probe_failure_reopens(self, breaker: CircuitBreaker, clock: FakeClock):
+        """測試半開狀態探測失敗後重新開啟"""
+        self._fail(breaker, 3)
+        clock.now = 31
+        self._fail(breaker)
+        assert breaker.state == CircuitState.OPEN
+
+    def test_unreported_call_releases_probe(self, breaker: CircuitBreaker, clock: FakeClock):
+        """測試未回報結果的探測會釋放名額"""
+        self._fail(breaker, 3)
+        clock.now = 31
+        with breaker.guard():
+            pass
+        assert breaker.state == CircuitState.HALF_OPEN
+        with breaker.guard() as call:
+            call.success()
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_registry_cdn_hosts(self):
+        """測試依 CDN 主機區分斷路器"""
+        registry = CircuitBreakerRegistry()
+        a = registry.for_cdn("https://scontent.cdninstagram.com/v/a.mp4")
+        b = registry.for_cdn("https://scontent.cdninstagram.com/v/b.mp4")
+        c = registry.for_cdn("https://video.fbcdn.net/x.mp4")
+        assert a is b
+        assert a is not c
+        assert a.name == "cdn:scontent.cdninstagram.com"
+
+
+class TestStrategyCircuit:
+    """策略鏈與斷路器整合測試"""
+
+    class FailingDownloader(BaseDownloader):
+        platform_name = "circuit-test"
+        download_strategies = ("only",)
+
+        def __init__(self):
+            self.calls = 0
+
+        def is_valid_url(self, url: str) -> bool:
+            return True
+
+        async def download(self, url, output_path, progress_callback=None):
+            return await self._run_download_strategies(url, output_path, progress_callback)
+
+        async def _try_only(self, url, output_path, progress_callback):
+            self.calls += 1
+            return DownloadResult(success=False, error="upstream changed")
+
+    @pytest.fixture(autouse=True)
+    def reset_breakers(self):
+        circuit_breakers.reset()
+        yield
+        circuit_breakers.reset()
+
+    async def test_fails_fast_when_open(self):
+        """測試斷路器開啟後不再呼叫上游"""
+        downloader = self.FailingDownloader()
+        threshold = circuit_breakers.failure_threshold
+
+        for _ in range(threshold):
+            result = await downloader.download("https://example.com", "/tmp/out.mp4")
+            assert result.error == "upstream changed"
+
+        result = await downloader.download("https://example.com", "/tmp/out.mp4")
+        assert downloader.calls == threshold
+        assert result.error_kind == ERROR_CIRCUIT_OPEN
+        assert "circuit-test:only" in result.error
+
+    async def test_host_breaker_open_is_not_a_strategy_failure(self, monkeypatch):
+        """測試頁面主機的斷路器開啟時快速失敗，不計入頁面解析策略的斷路器與統計"""
+        from app.downloaders import XiaohongshuDownloader
+        from app.downloaders.planner import strategy_planner
+
+        page = circuit_breakers.get("xiaohongshu:page")
+        for _ in range(circuit_breakers.failure_threshold):
+            with page.guard() as call:
+                call.failure()
+
+        async def no_process(*args, **kwargs):
+            raise AssertionError("斷路器開啟時不應呼叫上游")
+
+        downloader = XiaohongshuDownloader()
+        monkeypatch.setattr(downloader, "_run_process", no_process)
+        recorded = []
+        monkeypatch.setattr(strategy_planner, "record", lambda *args: recorded.append(args))
+
+        result = await downloader._attempt_download(
+            "parse_page", "https://www.xiaohongshu.com/explore/a", "/tmp/out.mp4", None
+        )
+
+        assert result.error_kind == ERROR_CIRCUIT_OPEN
+        assert recorded == []
+        assert circuit_breakers.get("xiaohongshu:parse_page").snapshot()["failures"] == 0
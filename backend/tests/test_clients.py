@@ -0,0 +1,79 @@
+"""
+客戶端識別測試
+"""
+
+from types import SimpleNamespace
+
+from starlette.requests import Request
+
+from app.clients import client_address, client_id, forwarded_client, parse_api_keys
+
+
+def make_request(peer: str, headers=None) -> Request:
+    return Request({
+        "type": "http",
+        "method": "POST",
+        "path": "/api/download",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": (peer, 50000),
+    })
+
+
+def make_settings(api_keys: str = "", hops: int = 1, worker_token: str = ""):
+    return SimpleNamespace(api_keys=api_keys, forwarded_trusted_hops=hops, browser_worker_token=worker_token)
+
+
+def test_parse_api_keys():
+    assert parse_api_keys("partner=s3cr3t, n8n=abc,broken,=x") == {"s3cr3t": "partner", "abc": "n8n"}
+
+
+def test_only_configured_api_keys_are_accepted():
+    settings = make_settings(api_keys="partner=s3cr3t")
+
+    assert client_id(make_request("1.2.3.4", {"X-API-Key": "s3cr3t"}), settings) == "key:partner"
+    # 自行編造的 key 不能換到新的分組
+    assert client_id(make_request("1.2.3.4", {"X-API-Key": "made-up"}), settings) == "ip:1.2.3.4"
+
+
+def test_frontend_users_get_their_own_lane():
+    settings = make_settings()
+
+    alice = make_request("10.0.0.2", {"X-Forwarded-For": "8.8.4.4"})
+    bob = make_request("10.0.0.2", {"X-Forwarded-For": "1.1.1.1"})
+    assert client_id(alice, settings) == "ip:8.8.4.4"
+    assert client_id(bob, settings) == "ip:1.1.1.1"
+
+
+def test_spoofed_forwarded_for_is_ignored():
+    settings = make_settings()
+
+    # 使用者自行帶入的值在左側，前端附加的真實位址在最右側
+    spoofed = make_request("10.0.0.2", {"X-Forwarded-For": "1.1.1.1, 8.8.4.4"})
+    assert client_address(spoofed, settings) == "8.8.4.4"
+
+    # 直接連線的外部對端不是可信代理，不採用 X-Forwarded-For
+    direct = make_request("8.8.4.4", {"X-Forwarded-For": "1.1.1.1"})
+    assert client_address(direct, settings) == "8.8.4.4"
+
+
+def test_trusted_hops():
+    headers = {"X-Forwarded-For": "1.1.1.1, 8.8.4.4, 10.0.0.5"}
+
+    assert client_address(make_request("10.0.0.2", headers), make_settings(hops=2)) == "8.8.4.4"
+    assert client_address(make_request("10.0.0.2", headers), make_settings(hops=0)) == "10.0.0.2"
+    # 代理層數比實際多時取最左側，不會越界
+    assert client_address(make_request("10.0.0.2", headers), make_settings(hops=9)) == "1.1.1.1"
+
+
+def test_forwarded_client_requires_worker_token():
+    settings = make_settings(worker_token="worker-secret")
+    forwarded = {"X-Worker-Token": "worker-secret", "X-Forwarded-Client": "ip:8.8.4.4"}
+
+    # lite worker 轉交的請求沿用原客戶端，不算在 lite worker 的 IP 上
+    assert client_id(make_request("10.0.0.9", forwarded), settings) == "ip:8.8.4.4"
+
+    wrong = {**forwarded, "X-Worker-Token": "guess"}
+    assert forwarded_client(make_request("10.0.0.9", wrong), settings) is None
+    assert client_id(make_request("10.0.0.9", wrong), settings) == "ip:10.0.0.9"
+    # 未設定密鑰時一律不採用
+    assert forwarded_client(make_request("10.0.0.9", forwarded), make_settings()) is None
@@ -0,0 +1,107 @@
+"""
+任務成本統計測試
+"""
+
+import asyncio
+import sys
+
+import pytest
+
+from app import activity
+from app.activity import activity_registry, attach_browser, detach_browser, strategy_scope
+from app.costs import Cost, CostLedger
+from app.downloaders.base import BaseDownloader, DownloadResult
+from app.downloaders.planner import strategy_planner
+from app.retry import retry_scope
+from app.supervisor import SubprocessSupervisor
+
+# 忙碌約 0.4 秒後寫出 5000 bytes 到 -o 指定的檔案
+BUSY_WRITER = (
+    "import sys, time\n"
+    "end = time.process_time() + 0.4\n"
+    "while time.process_time() < end: pass\n"
+    "open(sys.argv[2], 'wb').write(b'x' * 5000)\n"
+)
+
+
+@pytest.fixture
+def ledger(monkeypatch) -> CostLedger:
+    ledger = CostLedger()
+    monkeypatch.setattr(activity, "cost_ledger", ledger)
+    return ledger
+
+
+class FakeDownloader(BaseDownloader):
+    platform_name = "fake"
+    download_strategies = ("first", "second")
+
+    def is_valid_url(self, url: str) -> bool:
+        return True
+
+    async def download(self, url, output_path, progress_callback=None):
+        return await self._run_download_strategies(url, output_path, progress_callback)
+
+    async def _try_first(self, url, output_path, progress_callback):
+        activity.add_cost(bytes_in=100)
+        return DownloadResult(success=False, error="first failed")
+
+    async def _try_second(self, url, output_path, progress_callback):
+        attach_browser("session-1")
+        await asyncio.sleep(0.05)
+        detach_browser()
+        with open(output_path, "wb") as f:
+            f.write(b"x" * 2000)
+        activity.add_cost(bytes_in=2000)
+        return DownloadResult(success=True, file_path=output_path)
+
+
+class TestCosts:
+    """子程序、瀏覽器與下載量的成本歸屬"""
+
+    async def test_subprocess_cpu_and_bytes(self, tmp_path, ledger: CostLedger):
+        """子程序的 CPU 時間與 -o 輸出檔大小計入執行它的策略"""
+        supervisor = SubprocessSupervisor(cpu_sample_interval=0.02)
+        output = tmp_path / "out.mp4"
+        with activity_registry.track("t1", "threads") as task:
+            with strategy_scope("ytdlp"):
+                await supervisor.run([sys.executable, "-c", BUSY_WRITER, "-o", str(output)], timeout=30)
+
+        cost = task.costs["ytdlp"]
+        assert 0.2 <= cost.cpu_seconds <= 1.0
+        assert cost.bytes_in == 5000
+        assert ledger.totals("threads", "ytdlp").bytes_in == 5000
+
+    async def test_strategy_costs_in_trace_and_ledger(self, tmp_path, ledger: CostLedger):
+        """每次嘗試附上該策略的成本，任務結束時依平台與策略彙總"""
+        strategy_planner.reset()
+        attempts = []
+        with activity_registry.track("t2", "fake") as task:
+            with retry_scope(attempts):
+                result = await FakeDownloader().download("https://example.com", str(tmp_path / "t2.mp4"))
+        strategy_planner.reset()
+
+        assert result.success
+        first, second = attempts
+        assert first["cost"]["bytes_in"] == 100
+        assert second["cost"]["storage_bytes"] == 2000
+        assert second["cost"]["browser_seconds"] >= 0.05
+
+        summary = task.summary()
+        assert summary["strategy"] == "second"
+        assert summary["cost"]["bytes_in"] == 2100
+
+        snapshot = ledger.snapshot()["by_platform"]["fake"]
+        assert snapshot["second"]["runs"] == 1
+        assert snapshot["second"]["storage_bytes"] == 2000
+        assert snapshot["first"]["bytes_in"] == 100
+
+    def test_ledger_late_costs_do_not_count_runs(self):
+        ledger = CostLedger()
+        ledger.record("threads", "html", Cost(bytes_in=10))
+        ledger.record("threads", "html", Cost(bytes_out=500), count=False)
+        ledger.record("direct", "", Cost(storage_bytes=1))
+
+        snapshot = ledger.snapshot()["by_platform"]
+        assert snapshot["threads"]["html"]["runs"] == 1
+        assert snapshot["threads"]["html"]["bytes_out"] == 500
+        assert snapshot["direct"]["task"]["storage_bytes"] == 1
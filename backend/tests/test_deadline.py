@@ -0,0 +1,102 @@
+"""
+任務截止時間與自適應逾時測試
+"""
+
+import asyncio
+
+from app.deadline import StepTimeouts, budget, current_deadline, deadline_scope
+from app.downloaders.base import ERROR_DEADLINE, BaseDownloader, DownloadResult
+from app.downloaders.planner import strategy_planner
+
+
+class SlowDownloader(BaseDownloader):
+    """測試用下載器：第一個策略很慢，第二個策略記錄收到的時間預算"""
+
+    platform_name = "deadline_test"
+    download_strategies = ("slow", "fast")
+
+    def __init__(self):
+        self.budgets = []
+
+    def is_valid_url(self, url: str) -> bool:
+        return True
+
+    async def parse(self, url: str):
+        raise NotImplementedError
+
+    async def download(self, url, output_path, progress_callback=None):
+        return await self._run_download_strategies(url, output_path, progress_callback)
+
+    async def _try_slow(self, url, output_path, progress_callback):
+        await asyncio.sleep(30)
+        return DownloadResult(success=True)
+
+    async def _try_fast(self, url, output_path, progress_callback):
+        self.budgets.append(budget(300))
+        return DownloadResult(success=False, error="fast failed")
+
+
+class TestDeadline:
+    """截止時間傳遞測試"""
+
+    def test_budget_without_deadline(self):
+        """測試沒有截止時間時使用步驟預設值"""
+        assert current_deadline() is None
+        assert budget(120) == 120
+
+    def test_nested_scope_keeps_earlier_deadline(self):
+        """測試內層不會延長外層截止時間"""
+        with deadline_scope(5) as outer:
+            with deadline_scope(60) as inner:
+                assert inner is outer
+                assert budget(120) <= 5
+        assert current_deadline() is None
+
+    async def test_strategy_chain_stops_at_deadline(self, monkeypatch):
+        """測試慢策略在時限到時被中斷，後續策略不再執行"""
+        monkeypatch.setattr(strategy_planner, "plan", lambda platform, strategies: list(strategies))
+        downloader = SlowDownloader()
+
+        with deadline_scope(0.2):
+            result = await asyncio.wait_for(downloader.download("u", "/tmp/x.mp4"), timeout=5)
+
+        assert result.success is False
+        assert result.error_kind == ERROR_DEADLINE
+        assert downloader.budgets == []
+
+
+class TestStepTimeouts:
+    """自適應步驟逾時測試"""
+
+    def test_uses_default_until_enough_samples(self):
+        """測試樣本不足時使用預設值"""
+        timeouts = StepTimeouts(min_samples=3)
+        timeouts.record("threads", "ytdlp_info", 2.0)
+        assert timeouts.timeout_for("threads", "ytdlp_info", 60) == 60
+
+    def test_adapts_to_latency_percentile(self):
+        """測試逾時依百分位數 × 倍數調整並受上下限約束"""
+        timeouts = StepTimeouts(min_samples=5, percentile=0.95, multiplier=2.0, min_timeout=10)
+        for elapsed in (5, 6, 7, 8, 12):
+            timeouts.record("threads", "ytdlp_info", elapsed)
+
+        assert timeouts.timeout_for("threads", "ytdlp_info", 60) == 24
+        # 不超過預設值
+        assert timeouts.timeout_for("threads", "ytdlp_info", 20) == 20
+
+        for _ in range(5):
+            timeouts.record("douyin", "resolve_url", 0.5)
+        # 不低於最小值
+        assert timeouts.timeout_for("douyin", "resolve_url", 30) == 10
+        assert timeouts.snapshot()["threads"]["ytdlp_info"]["samples"] == 5
+
+    def test_transfer_steps_keep_default(self):
+        """測試檔案傳輸步驟不因一串小檔案而縮短逾時"""
+        timeouts = StepTimeouts(min_samples=3, min_timeout=1)
+        for _ in range(10):
+            timeouts.record("threads", "cdn_download", 0.5)
+            timeouts.record("threads", "ytdlp_download", 0.5)
+
+        assert timeouts.timeout_for("threads", "cdn_download", 120) == 120
+        assert timeouts.timeout_for("threads", "ytdlp_download", 120) == 120
+        assert "threads" not in timeouts.snapshot()
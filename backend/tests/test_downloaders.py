@@ -2,8 +2,19 @@
 下載器測試
 """
 
+import asyncio
+import os
+import subprocess
+import sys
+
 import pytest
+from aiohttp import web
 
+from app import browser_tier
+from app.config import get_settings
+from app.downloaders.base import ERROR_NEEDS_BROWSER, BaseDownloader, DownloadResult
+from app.retry import ERROR_PERMANENT
+from app.downloaders.planner import strategy_planner
 from app.downloaders import (
     get_downloader,
     get_downloader_by_platform,
@@ -13,6 +24,16 @@ from app.downloaders import (
 )
 
 
+def _alive(pid: int) -> bool:
+    """程序是否仍在執行（已結束但尚未回收的殭屍程序視為已結束）"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            state = f.read().rsplit(")", 1)[1].split()[0]
+    except (FileNotFoundError, ProcessLookupError, IndexError):
+        return False
+    return state not in ("Z", "X")
+
+
 class TestGetDownloader:
     """下載器選擇測試"""
 
@@ -138,3 +159,210 @@ class TestDouyinDownloader:
     def test_is_valid_url_false(self, downloader: DouyinDownloader):
         """測試無效 URL"""
         assert downloader.is_valid_url("https://www.youtube.com/watch") is False
+
+
+class TestHedgedStrategies:
+    """對沖模式測試"""
+
+    class SlowFastDownloader(BaseDownloader):
+        platform_name = "hedge-test"
+        download_strategies = ("slow", "fast")
+
+        def __init__(self):
+            self.cancelled = []
+
+        def is_valid_url(self, url: str) -> bool:
+            return True
+
+        async def download(self, url, output_path, progress_callback=None):
+            return await self._run_download_strategies(url, output_path, progress_callback)
+
+        async def _try_slow(self, url, output_path, progress_callback):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                self.cancelled.append("slow")
+                raise
+            return DownloadResult(success=False)
+
+        async def _try_fast(self, url, output_path, progress_callback):
+            with open(output_path, "wb") as f:
+                f.write(b"0" * 2000)
+            return DownloadResult(success=True, file_path=output_path)
+
+    @pytest.fixture(autouse=True)
+    def hedge_settings(self, monkeypatch):
+        settings = get_settings()
+        monkeypatch.setattr(settings, "hedge_enabled", True)
+        monkeypatch.setattr(settings, "hedge_delay_seconds", 0.05)
+        strategy_planner.reset()
+        yield
+        strategy_planner.reset()
+
+    async def test_first_success_wins_and_cancels_loser(self, tmp_path):
+        """測試先成功者勝出，其餘策略被取消"""
+        downloader = self.SlowFastDownloader()
+        output_path = str(tmp_path / "task.mp4")
+
+        result = await downloader.download("https://example.com", output_path)
+
+        assert result.success is True
+        assert result.file_path == output_path
+        assert os.path.getsize(output_path) == 2000
+        assert downloader.cancelled == ["slow"]
+        # 暫存檔已移除或已改名
+        assert sorted(os.listdir(tmp_path)) == ["task.mp4"]
+
+    async def test_run_process_kills_child_on_cancel(self, tmp_path):
+        """測試取消時終止子程序與其孫程序（整個程序群組）"""
+        pid_file = tmp_path / "pids"
+        script = f"sleep 30 & echo $$ $! > {pid_file}; wait"
+        downloader = self.SlowFastDownloader()
+        task = asyncio.ensure_future(downloader._run_process(["sh", "-c", script], timeout=60))
+        for _ in range(100):
+            if pid_file.exists() and pid_file.read_text().strip():
+                break
+            await asyncio.sleep(0.02)
+        child, grandchild = (int(pid) for pid in pid_file.read_text().split())
+
+        task.cancel()
+        # 需立即終止，而非等子程序自行結束
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, 5)
+
+        for _ in range(100):
+            if not _alive(child) and not _alive(grandchild):
+                break
+            await asyncio.sleep(0.02)
+        assert not _alive(child)
+        assert not _alive(grandchild)
+
+
+class TestLiteProfile:
+    """lite 部署（不使用瀏覽器）測試"""
+
+    class HttpOnlyFails(ThreadsDownloader):
+        async def _try_html(self, url, output_path, progress_callback):
+            return DownloadResult(success=False, error="找不到影片")
+
+        async def _try_ytdlp(self, url, output_path, progress_callback):
+            return DownloadResult(success=False, error="yt-dlp 失敗")
+
+        async def _try_selenium(self, url, output_path, progress_callback):
+            raise AssertionError("lite 部署不應啟動瀏覽器")
+
+    @pytest.fixture(autouse=True)
+    def lite_settings(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "deployment_profile", "lite")
+        strategy_planner.reset()
+        yield
+        strategy_planner.reset()
+
+    async def test_reports_needs_browser(self, tmp_path):
+        """略過瀏覽器策略且其他策略都失敗時回報需要瀏覽器層"""
+        result = await self.HttpOnlyFails().download("https://www.threads.net/@u/post/1", str(tmp_path / "a.mp4"))
+        assert result.success is False
+        assert result.error_kind == ERROR_NEEDS_BROWSER
+        assert "lite" in result.error
+
+    async def test_permanent_failure_kept(self, tmp_path):
+        """貼文不存在時瀏覽器也無濟於事，維持原錯誤"""
+
+        class Gone(self.HttpOnlyFails):
+            async def _try_html(self, url, output_path, progress_callback):
+                return DownloadResult(success=False, error="貼文不存在", error_kind=ERROR_PERMANENT)
+
+        result = await Gone().download("https://www.threads.net/@u/post/1", str(tmp_path / "a.mp4"))
+        assert result.success is False
+        assert result.error_kind != ERROR_NEEDS_BROWSER
+
+    def test_render_service_keeps_browser_strategies(self, monkeypatch):
+        """設定渲染服務時 lite 部署仍可執行瀏覽器策略（由渲染服務程序代為渲染）"""
+        downloader = ThreadsDownloader()
+        assert "selenium" not in downloader._available_strategies(downloader.download_strategies)
+        monkeypatch.setattr(get_settings(), "render_service_url", "unix:/tmp/render.sock")
+        assert "selenium" in downloader._available_strategies(downloader.download_strategies)
+
+    def test_selenium_not_imported(self):
+        """lite 部署啟動與預熱都不匯入 Selenium"""
+        code = (
+            "import asyncio, sys\n"
+            "from app.main import app\n"
+            "from app.warmup import warmup_state\n"
+            "from app.config import get_settings\n"
+            "asyncio.run(warmup_state.run(get_settings()))\n"
+            "assert 'selenium' not in sys.modules, 'selenium imported'\n"
+        )
+        env = {**os.environ, "DEPLOYMENT_PROFILE": "lite", "BROWSER_POOL_SIZE": "1", "WARMUP_YTDLP": "false"}
+        backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        completed = subprocess.run([sys.executable, "-c", code], cwd=backend, env=env, capture_output=True, timeout=60)
+        assert completed.returncode == 0, completed.stderr.decode()
+
+
+class TestBrowserWorkerForwarding:
+    """轉交瀏覽器 worker 測試"""
+
+    @pytest.fixture
+    async def worker(self, monkeypatch):
+        """假的 full 部署：任務查詢兩次後完成"""
+        state = {"polls": 0, "cancelled": [], "clients": []}
+
+        async def create(request):
+            state["clients"].append((request.headers.get("X-Worker-Token"), request.headers.get("X-Forwarded-Client")))
+            state["payload"] = await request.json()
+            return web.json_response({"taskId": "remote-1"})
+
+        async def status(request):
+            state["polls"] += 1
+            done = state["polls"] >= 2
+            return web.json_response({
+                "taskId": "remote-1",
+                "status": "completed" if done else "processing",
+                "progress": 100 if done else 50,
+                "downloadUrl": "/api/files/remote-1.mp4" if done else None,
+            })
+
+        async def cancel(request):
+            state["cancelled"].append(request.match_info["task_id"])
+            return web.json_response({})
+
+        app = web.Application()
+        app.router.add_post("/api/download", create)
+        app.router.add_get("/api/status/{task_id}", status)
+        app.router.add_delete("/api/tasks/{task_id}", cancel)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        settings = get_settings()
+        monkeypatch.setattr(settings, "deployment_profile", "lite")
+        monkeypatch.setattr(settings, "browser_worker_url", f"http://127.0.0.1:{port}")
+        monkeypatch.setattr(settings, "browser_worker_poll_interval", 0.01)
+        monkeypatch.setattr(settings, "browser_worker_token", "worker-secret")
+        state["url"] = f"http://127.0.0.1:{port}"
+        yield state
+        await runner.cleanup()
+
+    async def test_forward_download(self, worker):
+        assert browser_tier.enabled()
+        result = await browser_tier.forward_download("https://www.threads.net/@u/post/1", "threads", "video", "ip:1.2.3.4")
+
+        assert result.success is True
+        assert result.download_url == f"{worker['url']}/api/files/remote-1.mp4"
+        assert worker["clients"] == [("worker-secret", "ip:1.2.3.4")]
+        assert worker["payload"]["platform"] == "threads"
+
+    async def test_cancel_propagates(self, worker, monkeypatch):
+        """本機任務被取消時取消遠端任務"""
+        monkeypatch.setattr(get_settings(), "browser_worker_poll_interval", 10)
+        task = asyncio.ensure_future(
+            browser_tier.forward_download("https://www.threads.net/@u/post/1", "threads", None, "anonymous")
+        )
+        while not worker["polls"]:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert worker["cancelled"] == ["remote-1"]
@@ -0,0 +1,82 @@
+"""
+具名執行緒池測試
+"""
+
+import asyncio
+import threading
+
+from app import executors
+from app.executors import InstrumentedExecutor
+
+
+class TestInstrumentedExecutor:
+    """佇列深度與等待時間統計測試"""
+
+    async def test_tracks_queue_depth_and_wait(self):
+        """測試執行緒不足時工作排隊，並記錄等待時間"""
+        executor = InstrumentedExecutor("test", max_workers=1)
+        release = threading.Event()
+        try:
+            first = asyncio.ensure_future(executor.run(release.wait, 5))
+            second = asyncio.ensure_future(executor.run(lambda: "done"))
+            await asyncio.sleep(0.05)
+
+            snapshot = executor.snapshot()
+            assert snapshot["running"] == 1
+            assert snapshot["queued"] == 1
+
+            release.set()
+            assert await second == "done"
+            await first
+
+            snapshot = executor.snapshot()
+            assert snapshot["queued"] == 0
+            assert snapshot["completed"] == 2
+            assert snapshot["max_queued"] >= 1
+            assert snapshot["max_wait_ms"] >= 40
+        finally:
+            release.set()
+            executor.shutdown()
+
+    async def test_cancelled_before_start_leaves_queue(self):
+        """測試排隊中的呼叫被取消後不會一直計入佇列深度"""
+        executor = InstrumentedExecutor("test", max_workers=1)
+        release = threading.Event()
+        try:
+            first = asyncio.ensure_future(executor.run(release.wait, 5))
+            second = asyncio.ensure_future(executor.run(lambda: "never"))
+            await asyncio.sleep(0.05)
+            assert executor.snapshot()["queued"] == 1
+
+            second.cancel()
+            await asyncio.gather(second, return_exceptions=True)
+            release.set()
+            await first
+
+            snapshot = executor.snapshot()
+            assert snapshot["queued"] == 0
+            assert snapshot["running"] == 0
+            assert snapshot["cancelled"] == 1
+            assert snapshot["completed"] == 1
+        finally:
+            release.set()
+            executor.shutdown()
+
+    async def test_workload_classes_are_isolated(self):
+        """測試瀏覽器執行緒池塞滿時不影響存儲執行緒池"""
+        browser = executors.get_executor(executors.BROWSER)
+        release = threading.Event()
+        blockers = [
+            asyncio.ensure_future(browser.run(release.wait, 5))
+            for _ in range(browser.max_workers)
+        ]
+        try:
+            name = await asyncio.wait_for(
+                executors.run_in_executor(executors.STORAGE, lambda: threading.current_thread().name),
+                timeout=1,
+            )
+            assert name.startswith("storage")
+            assert executors.snapshot()["browser"]["running"] == browser.max_workers
+        finally:
+            release.set()
+            await asyncio.gather(*blockers)
@@ -0,0 +1,38 @@
+"""
+事件迴圈延遲監測測試
+"""
+
+import asyncio
+import time
+
+from app.loop_monitor import LoopLagMonitor
+
+
+class TestLoopLagMonitor:
+    """阻塞偵測測試"""
+
+    async def test_detects_blocking_call(self):
+        """測試同步 sleep 阻塞事件迴圈時計數增加"""
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+        monitor.start()
+        await asyncio.sleep(0.03)
+
+        time.sleep(0.1)  # 模擬在事件迴圈上執行的阻塞呼叫
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+
+        snapshot = monitor.snapshot()
+        assert snapshot["blocked_count"] >= 1
+        assert snapshot["max_lag_ms"] >= 50
+        assert snapshot["running"] is False
+
+    async def test_idle_loop_not_blocked(self):
+        """測試閒置時不誤判"""
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.5)
+        monitor.start()
+        monitor.start()  # 重複啟動無作用
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+        assert monitor.samples >= 1
+        assert monitor.blocked_count == 0
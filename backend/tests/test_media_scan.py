@@ -0,0 +1,94 @@
+"""
+頁面影片 URL 掃描測試
+"""
+
+from pathlib import Path
+
+from app.downloaders.threads import ThreadsDownloader
+from app.media_scan import best_video_url, decode_url, scan_video_urls, strip_range_params
+
+FIXTURES = Path(__file__).parent / "fixtures" / "threads"
+
+
+class TestDecode:
+    """跳脫還原測試"""
+
+    def test_json_escapes(self):
+        assert decode_url("https:\\/\\/a.cdninstagram.com\\/v.mp4?a=1\\u0026b=2") == (
+            "https://a.cdninstagram.com/v.mp4?a=1&b=2"
+        )
+        assert decode_url("http:\\u002F\\u002Fsns-video-bd.xhscdn.com\\u002Fs.mp4") == (
+            "http://sns-video-bd.xhscdn.com/s.mp4"
+        )
+
+    def test_html_entities(self):
+        assert decode_url("https://a.com/v.mp4?a=1&amp;b=2") == "https://a.com/v.mp4?a=1&b=2"
+
+    def test_strip_range_params_first_in_query(self):
+        """範圍參數位於查詢字串開頭時仍保留其餘參數的 ? 分隔"""
+        url = "https://video.fbcdn.net/v/abc.mp4?bytestart=0&byteend=999&efg=xyz"
+        assert strip_range_params(url) == "https://video.fbcdn.net/v/abc.mp4?efg=xyz"
+        assert strip_range_params("https://video.fbcdn.net/v/abc.mp4?bytestart=0&byteend=9") == (
+            "https://video.fbcdn.net/v/abc.mp4"
+        )
+
+
+class TestScan:
+    """掃描與排序測試"""
+
+    def test_ranks_by_json_dimensions(self):
+        """同一物件中的 width/height 決定排序，而非出現順序"""
+        source = (
+            '{"width": 480, "height": 854, "url": "https:\\/\\/a.cdninstagram.com\\/low.mp4"},'
+            '{"width": 1080, "height": 1920, "url": "https:\\/\\/a.cdninstagram.com\\/high.mp4"}'
+        )
+        candidates = scan_video_urls(source, "threads")
+        assert [c.url for c in candidates] == [
+            "https://a.cdninstagram.com/high.mp4",
+            "https://a.cdninstagram.com/low.mp4",
+        ]
+        assert candidates[0].height == 1080
+
+    def test_ranks_by_url_hints(self):
+        """沒有 JSON 欄位時採用 URL 中的解析度與位元率"""
+        source = (
+            '"https://v.douyinvod.com/a/play/?video_id=1&ratio=540p&br=900" '
+            '"https://v.douyinvod.com/a/play/?video_id=1&ratio=720p&br=800" '
+            '"https://v.douyinvod.com/a/play/?video_id=1&ratio=720p&br=1200"'
+        )
+        assert [c.url.rsplit("&", 1)[1] for c in scan_video_urls(source, "douyin")] == [
+            "br=1200", "br=800", "br=900",
+        ]
+
+    def test_dedupes_escaped_and_plain(self):
+        """同一個 URL 以不同跳脫方式出現時只保留一次（保留第一次出現的位置）"""
+        source = (
+            '<video src="https://a.cdninstagram.com/v.mp4?a=1&amp;b=2"></video>'
+            '<script>{"url":"https:\\/\\/a.cdninstagram.com\\/v.mp4?a=1&b=2"}</script>'
+        )
+        candidates = scan_video_urls(source, "threads")
+        assert len(candidates) == 1
+        assert candidates[0].position == source.index("https://")
+
+    def test_filters_hosts_and_non_video(self):
+        """只保留平台 CDN 上的影片，忽略靜態資源與圖片"""
+        source = (
+            '<link href="https://static.cdninstagram.com/rsrc.php/VideoPlayer.js">'
+            '<img src="https://a.cdninstagram.com/poster.jpg">'
+            '<a href="https://example.com/other.mp4">'
+        )
+        assert scan_video_urls(source, "threads") == []
+        assert best_video_url(source) == "https://example.com/other.mp4"
+
+    def test_threads_fixtures(self):
+        """Threads 頁面快照（JSON 跳脫、輪播、embed 的 &amp;、登入牆）"""
+        downloader = ThreadsDownloader()
+        expected = {
+            "post_video.html": "https://scontent-tpe1-1.cdninstagram.com/o1/v/t16/f2/m69/video_720.mp4?efg=abc&oh=00_2",
+            "post_carousel.html": "https://scontent-tpe1-1.cdninstagram.com/o1/v/t16/f2/m69/slide2.mp4?efg=xyz",
+            "embed_video.html": "https://scontent-tpe1-1.cdninstagram.com/o1/v/t16/f2/m69/embed_video.mp4?efg=abc&oh=00_3",
+            "login_wall.html": None,
+        }
+        for name, url in expected.items():
+            source = (FIXTURES / name).read_text(encoding="utf-8")
+            assert downloader._extract_video_url_from_source(source) == url, name
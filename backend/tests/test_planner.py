@@ -0,0 +1,112 @@
+"""
+策略規劃器測試
+"""
+
+import random
+
+import pytest
+
+from app.downloaders.base import BaseDownloader, DownloadResult
+from app.downloaders.planner import StrategyPlanner, strategy_planner
+
+
+class TestStrategyPlanner:
+    """策略規劃器測試"""
+
+    @pytest.fixture
+    def planner(self):
+        return StrategyPlanner(min_samples=5, explore_ratio=0.0, rng=random.Random(0))
+
+    def test_keeps_default_order_without_stats(self, planner: StrategyPlanner):
+        """測試無統計資料時保持預設順序"""
+        assert planner.plan("threads", ["ytdlp", "selenium"]) == ["ytdlp", "selenium"]
+
+    def test_orders_by_expected_time_to_success(self, planner: StrategyPlanner):
+        """測試依預期成功時間排序"""
+        for _ in range(10):
+            planner.record("threads", "ytdlp", success=False, latency=60)
+            planner.record("threads", "selenium", success=True, latency=8)
+        for _ in range(5):
+            planner.record("threads", "ytdlp", success=True, latency=60)
+
+        assert planner.plan("threads", ["ytdlp", "selenium"]) == ["selenium", "ytdlp"]
+
+    def test_skips_broken_strategy(self, planner: StrategyPlanner):
+        """測試跳過明顯失效的策略"""
+        for _ in range(10):
+            planner.record("douyin", "parse_page", success=False, latency=5)
+            planner.record("douyin", "ytdlp", success=True, latency=10)
+
+        assert planner.is_broken("douyin", "parse_page") is True
+        assert planner.plan("douyin", ["ytdlp", "parse_page"]) == ["ytdlp"]
+
+    def test_probes_broken_strategy(self):
+        """測試失效策略仍接收探測流量"""
+        planner = StrategyPlanner(min_samples=5, explore_ratio=1.0)
+        for _ in range(10):
+            planner.record("douyin", "parse_page", success=False, latency=5)
+            planner.record("douyin", "ytdlp", success=True, latency=10)
+
+        assert planner.plan("douyin", ["parse_page", "ytdlp"]) == ["ytdlp", "parse_page"]
+
+    def test_all_broken_still_tries_everything(self, planner: StrategyPlanner):
+        """測試全部失效時仍嘗試所有策略"""
+        for _ in range(10):
+            planner.record("threads", "ytdlp", success=False, latency=60)
+            planner.record("threads", "selenium", success=False, latency=10)
+
+        assert planner.plan("threads", ["ytdlp", "selenium"]) == ["selenium", "ytdlp"]
+
+    def test_rolling_window(self):
+        """測試滾動視窗只保留最近的結果"""
+        planner = StrategyPlanner(window_size=5, min_samples=5)
+        for _ in range(5):
+            planner.record("threads", "ytdlp", success=False, latency=1)
+        assert planner.is_broken("threads", "ytdlp") is True
+
+        for _ in range(5):
+            planner.record("threads", "ytdlp", success=True, latency=1)
+        assert planner.is_broken("threads", "ytdlp") is False
+        assert planner.snapshot()["threads"]["ytdlp"]["samples"] == 5
+
+
+class TestStrategyChain:
+    """下載器策略鏈測試"""
+
+    class FakeDownloader(BaseDownloader):
+        platform_name = "fake"
+        download_strategies = ("first", "second")
+
+        def __init__(self):
+            self.calls = []
+
+        def is_valid_url(self, url: str) -> bool:
+            return True
+
+        async def download(self, url, output_path, progress_callback=None):
+            return await self._run_download_strategies(url, output_path, progress_callback)
+
+        async def _try_first(self, url, output_path, progress_callback):
+            self.calls.append("first")
+            return DownloadResult(success=False, error="first failed")
+
+        async def _try_second(self, url, output_path, progress_callback):
+            self.calls.append("second")
+            return DownloadResult(success=True, file_path=output_path)
+
+    @pytest.fixture(autouse=True)
+    def reset_planner(self):
+        strategy_planner.reset()
+        yield
+        strategy_planner.reset()
+
+    async def test_falls_back_and_records(self):
+        """測試依序回退並記錄結果"""
+        downloader = self.FakeDownloader()
+        result = await downloader.download("https://example.com", "/tmp/out.mp4")
+
+        assert result.success is True
+        assert downloader.calls == ["first", "second"]
+        stats = strategy_planner.snapshot()["fake"]
+        assert stats["first"]["success_rate"] == 0.0
+        assert stats["second"]["success_rate"] == 1.0
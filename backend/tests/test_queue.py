@@ -2,10 +2,12 @@
 任務隊列測試
 """
 
+import threading
+
 import pytest
 from datetime import datetime, timedelta
 
-from app.queue import TaskQueue, TaskStatus, Task
+from app.queue import SqliteTaskQueue, TaskQueue, TaskStatus, Task
 
 
 class TestTaskQueue:
@@ -51,6 +53,17 @@ class TestTaskQueue:
         )
         assert updated.status == TaskStatus.PROCESSING
 
+    def test_finished_status_is_not_overwritten(self, queue: TaskQueue):
+        """測試已取消的任務不會被執行端的完成結果覆寫"""
+        task = queue.create_task("https://test.com", "threads")
+        queue.update_task(task.id, status=TaskStatus.CANCELLED, error="任務已取消")
+
+        updated = queue.update_task(task.id, status=TaskStatus.COMPLETED, download_url="/api/files/x")
+        assert updated.status == TaskStatus.CANCELLED
+        assert updated.download_url is None
+        # 不變更狀態的更新（例如嘗試紀錄）仍會寫入
+        assert queue.update_task(task.id, attempts=[{"step": "task"}]).attempts == [{"step": "task"}]
+
     def test_update_task_progress(self, queue: TaskQueue):
         """測試更新任務進度"""
         task = queue.create_task("https://test.com", "threads")
@@ -95,6 +108,15 @@ class TestTaskQueue:
         result = queue.delete_task("nonexistent")
         assert result is False
 
+    def test_count(self, queue: TaskQueue):
+        """測試任務表大小包含已結束的任務"""
+        task = queue.create_task("https://test.com", "threads")
+        queue.create_task("https://test.com/2", "threads")
+        queue.update_task(task.id, status=TaskStatus.COMPLETED)
+
+        assert queue.count() == 2
+        assert queue.count_active() == 1
+
     def test_cleanup_old_tasks(self, queue: TaskQueue):
         """測試清理舊任務"""
         # 建立任務
@@ -115,3 +137,86 @@ class TestTaskQueue:
         cleaned = queue.cleanup_old_tasks(max_age_seconds=3600)
         assert cleaned == 0
         assert queue.get_task(task.id) is not None
+
+
+class TestSqliteTaskQueue(TestTaskQueue):
+    """SQLite 任務表測試（沿用內存隊列的所有測試）"""
+
+    @pytest.fixture
+    def queue(self, tmp_path):
+        queue = SqliteTaskQueue(str(tmp_path / "tasks.db"))
+        yield queue
+        queue.close()
+
+    def test_cleanup_old_tasks(self, queue: SqliteTaskQueue):
+        """測試清理舊任務"""
+        task = queue.create_task("https://test.com", "threads")
+
+        # 建立時間存在資料庫中，直接修改欄位模擬舊任務
+        old = (datetime.now() - timedelta(hours=2)).timestamp()
+        queue._execute("UPDATE tasks SET created_at = ? WHERE id = ?", (old, task.id))
+
+        assert queue.cleanup_old_tasks(max_age_seconds=3600) == 1
+        assert queue.get_task(task.id) is None
+
+    def test_concurrent_access_from_threads(self, queue: SqliteTaskQueue):
+        """測試多個執行緒共用連線讀寫時，查詢結果都在持有鎖時取回"""
+        task = queue.create_task("https://test.com", "threads")
+        errors = []
+
+        def worker(index):
+            try:
+                for progress in range(100):
+                    queue.update_task(task.id, progress=progress)
+                    assert queue.get_task(task.id).id == task.id
+                    assert queue.count() == 1
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+
+    def test_shared_between_workers(self, tmp_path):
+        """測試兩個 worker 開啟同一個資料庫時共用任務"""
+        path = str(tmp_path / "tasks.db")
+        worker_a = SqliteTaskQueue(path)
+        worker_b = SqliteTaskQueue(path)
+
+        task = worker_a.create_task("https://test.com", "threads", media_type="video", client="ip:1.2.3.4")
+        worker_a.update_task(task.id, progress=40, attempts=[{"step": "ytdlp", "success": False}])
+
+        seen = worker_b.get_task(task.id)
+        assert seen.progress == 40
+        assert seen.media_type == "video"
+        assert seen.client == "ip:1.2.3.4"
+        assert seen.attempts == [{"step": "ytdlp", "success": False}]
+        assert worker_b.count_active() == 1
+
+        worker_b.update_task(task.id, status=TaskStatus.CANCELLED)
+        assert worker_a.get_task(task.id).status == TaskStatus.CANCELLED
+        assert worker_a.count_active() == 0
+
+        # 執行端隨後回報完成，不會蓋掉其他 worker 的取消
+        worker_a.update_task(task.id, status=TaskStatus.COMPLETED, progress=100)
+        assert worker_b.get_task(task.id).status == TaskStatus.CANCELLED
+
+    def test_find_abandoned(self, queue: SqliteTaskQueue):
+        """測試以最後查詢時間找出無人查詢的任務（只計算開始處理後的閒置時間）"""
+        stale = queue.create_task("https://test.com/a", "threads")
+        queued = queue.create_task("https://test.com/b", "threads")
+        queue.update_task(stale.id, status=TaskStatus.PROCESSING)
+        old = (datetime.now() - timedelta(seconds=120)).timestamp()
+        queue._execute("UPDATE tasks SET last_polled_at = ? WHERE id IN (?, ?)", (old, stale.id, queued.id))
+
+        assert [task.id for task in queue.find_abandoned(60)] == [stale.id]
+        queue.touch(stale.id)
+        assert queue.find_abandoned(60) == []
+
+        # 開始處理時重新計算閒置時間
+        queue.update_task(queued.id, status=TaskStatus.PROCESSING)
+        assert queue.find_abandoned(60) == []
@@ -0,0 +1,46 @@
+"""
+共用限流計數測試
+"""
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+from app.config import Settings
+from app.ratelimit import SQLiteStorage, storage_uri
+
+
+def test_storage_uri(tmp_path):
+    assert storage_uri(Settings(shared_state_path="")) == "memory://"
+    assert storage_uri(Settings(shared_state_path=str(tmp_path))) == f"sqlite://{tmp_path}/ratelimit.db"
+
+
+def test_counts_are_shared_between_workers(tmp_path):
+    """測試兩個 worker 的限流器共用同一份計數"""
+    uri = f"sqlite://{tmp_path}/ratelimit.db"
+    worker_a = FixedWindowRateLimiter(storage_from_string(uri))
+    worker_b = FixedWindowRateLimiter(storage_from_string(uri))
+    limit = parse("3/minute")
+
+    assert worker_a.hit(limit, "ip:1.2.3.4")
+    assert worker_b.hit(limit, "ip:1.2.3.4")
+    assert worker_a.hit(limit, "ip:1.2.3.4")
+    assert not worker_b.hit(limit, "ip:1.2.3.4")
+    # 其他客戶端不受影響
+    assert worker_b.hit(limit, "ip:5.6.7.8")
+
+
+def test_expired_window_restarts(tmp_path):
+    storage = SQLiteStorage(f"sqlite://{tmp_path}/ratelimit.db")
+
+    assert storage.incr("key", expiry=60) == 1
+    assert storage.incr("key", expiry=60, amount=2) == 3
+    assert storage.get("key") == 3
+
+    storage._conn.execute("UPDATE rate_limits SET expires_at = 0")
+    assert storage.get("key") == 0
+    assert storage.incr("key", expiry=60) == 1
+
+    storage.clear("key")
+    assert storage.get("key") == 0
+    assert storage.check()
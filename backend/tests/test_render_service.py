@@ -0,0 +1,128 @@
+"""
+瀏覽器渲染服務測試（以假的 driver 與渲染函式取代 Chrome）
+"""
+
+import asyncio
+import threading
+
+import pytest
+from aiohttp import web
+
+from app import activity
+from app.activity import activity_registry, strategy_scope
+from app.config import get_settings
+from app.downloaders import ThreadsDownloader
+from app.downloaders.browser import DriverPool, RenderResult
+from app.render_service import RenderService, RenderServiceError, _create_service, create_app, request_render
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+class SlowRender:
+    """渲染會卡住直到測試放行；url 含 crash 時丟出例外"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = 0
+
+    def __call__(self, driver, url, timeout):
+        self.started += 1
+        self.release.wait(5)
+        if "crash" in url:
+            raise RuntimeError("chrome crashed")
+        return RenderResult(media_urls=[f"https://scontent.cdninstagram.com/v/{self.started}.mp4"])
+
+
+@pytest.fixture
+async def service(tmp_path):
+    """以 Unix socket 啟動服務：並行 1、佇列 1"""
+    render = SlowRender()
+    pool = DriverPool(size=1, factory=FakeDriver)
+    service = RenderService(concurrency=1, queue_limit=1, pool=pool, render=render)
+    runner = web.AppRunner(create_app(service, warm=False))
+    await runner.setup()
+    path = str(tmp_path / "render.sock")
+    await web.UnixSite(runner, path).start()
+    service.url = f"unix:{path}"
+    service.fake_render = render
+    yield service
+    render.release.set()
+    await runner.cleanup()
+
+
+async def _wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+
+class TestRenderService:
+    """並行上限、佇列與 driver 歸還"""
+
+    def test_concurrency_capped_by_browser_threads(self, monkeypatch):
+        """並行上限不超過瀏覽器執行緒數，否則請求只會在執行緒池中排隊"""
+        settings = get_settings()
+        monkeypatch.setattr(settings, "browser_executor_workers", 2)
+        monkeypatch.setattr(settings, "render_service_concurrency", 6)
+        assert _create_service(settings).concurrency == 2
+
+        monkeypatch.setattr(settings, "render_service_concurrency", 1)
+        assert _create_service(settings).concurrency == 1
+
+    async def test_render_over_socket(self, service):
+        service.fake_render.release.set()
+        result, browser_seconds = await request_render("https://www.threads.net/@u/post/1", 5, service.url)
+
+        assert result.media_urls == ["https://scontent.cdninstagram.com/v/1.mp4"]
+        assert browser_seconds >= 0
+        assert service.pool.snapshot() == {"size": 1, "idle": 1, "leased": 0}
+
+    async def test_queue_full_rejected(self, service):
+        """一個渲染中、一個排隊時，第三個請求立即收到 503"""
+        first = asyncio.ensure_future(request_render("https://www.threads.net/@u/post/1", 5, service.url))
+        await _wait_for(lambda: service.running == 1)
+        second = asyncio.ensure_future(request_render("https://www.threads.net/@u/post/2", 5, service.url))
+        await _wait_for(lambda: service.waiting == 1)
+
+        with pytest.raises(RenderServiceError) as exc_info:
+            await request_render("https://www.threads.net/@u/post/3", 5, service.url)
+        assert exc_info.value.status == 503
+
+        service.fake_render.release.set()
+        await asyncio.gather(first, second)
+        assert service.snapshot()["rendered"] == 2
+        assert service.snapshot()["rejected"] == 1
+
+    async def test_crashed_driver_not_reused(self, service):
+        service.fake_render.release.set()
+        with pytest.raises(RenderServiceError) as exc_info:
+            await request_render("https://www.threads.net/@u/crash", 5, service.url)
+
+        assert exc_info.value.status == 502
+        assert service.pool.snapshot()["idle"] == 0
+        assert service.running == 0
+
+    async def test_threads_uses_render_service(self, service, monkeypatch):
+        """設定 render_service_url 時 ThreadsDownloader 不建立本機 driver，並計入瀏覽器成本"""
+        service.fake_render.release.set()
+        monkeypatch.setattr(get_settings(), "render_service_url", service.url)
+
+        def no_local_driver():
+            raise AssertionError("should not launch a local browser")
+
+        monkeypatch.setattr(ThreadsDownloader, "_launch_driver", no_local_driver)
+        with activity_registry.track("render-1", "threads") as task:
+            with strategy_scope("selenium"):
+                rendered = await ThreadsDownloader()._render("https://www.threads.net/@u/post/1")
+                assert activity.current_activity().strategies["selenium"].step == "render_service"
+
+        assert rendered.media_urls
+        assert "selenium" in task.costs
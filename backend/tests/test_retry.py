@@ -0,0 +1,235 @@
+"""
+重試策略測試
+"""
+
+import random
+
+import pytest
+
+from app.circuit import circuit_breakers
+from app.downloaders import cdn
+from app.downloaders.base import BaseDownloader, DownloadResult
+from app.retry import (
+    ERROR_EXTRACTOR,
+    ERROR_MEDIA,
+    ERROR_PERMANENT,
+    ERROR_THROTTLED,
+    ERROR_TRANSIENT,
+    AttemptFailed,
+    RetryPolicy,
+    classify_curl_exit,
+    classify_http_status,
+    classify_message,
+    parse_retry_after,
+    retry_scope,
+    run_with_retry,
+)
+
+
+def instant_policy(max_attempts=3) -> RetryPolicy:
+    """不實際等待的重試策略"""
+    return RetryPolicy(max_attempts=max_attempts, base_delay=0.0, max_delay=0.0)
+
+
+class TestClassification:
+    """錯誤分類測試"""
+
+    def test_http_status(self):
+        assert classify_http_status(429) == ERROR_THROTTLED
+        assert classify_http_status(403) == ERROR_THROTTLED
+        assert classify_http_status(404) == ERROR_PERMANENT
+        assert classify_http_status(503) == ERROR_TRANSIENT
+        assert classify_http_status(200) is None
+
+    def test_curl_exit(self):
+        assert classify_curl_exit(28) == ERROR_TRANSIENT  # 逾時
+        assert classify_curl_exit(6) == ERROR_TRANSIENT  # 無法解析主機
+        assert classify_curl_exit(3) == ERROR_PERMANENT  # 網址格式錯誤
+
+    def test_ytdlp_messages(self):
+        assert classify_message("ERROR: HTTP Error 429: Too Many Requests") == ERROR_THROTTLED
+        assert classify_message("ERROR: This post is private") == ERROR_PERMANENT
+        assert classify_message("ERROR: HTTP Error 404: Not Found") == ERROR_PERMANENT
+        # 需要 cookie/登入只代表這個擷取方式取不到，不代表貼文不存在
+        assert classify_message("ERROR: Use --cookies-from-browser or --cookies for authentication") != ERROR_PERMANENT
+        assert classify_message("ERROR: login required") != ERROR_PERMANENT
+        assert classify_message("ERROR: Connection reset by peer") == ERROR_TRANSIENT
+        assert classify_message("ERROR: [Threads] Unable to extract video url") == ERROR_EXTRACTOR
+        assert classify_message("") is None
+
+    def test_retry_after(self):
+        assert parse_retry_after("120") == 120.0
+        assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # 已過去的日期
+        assert parse_retry_after("soon") is None
+
+
+class TestBackoff:
+    """退避時間測試"""
+
+    def test_exponential_with_jitter(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=10.0, rng=random.Random(1))
+        for attempt, ceiling in ((1, 1.0), (2, 2.0), (3, 4.0), (6, 10.0)):
+            delays = [policy.backoff(attempt) for _ in range(50)]
+            assert all(0 <= d <= ceiling for d in delays)
+            assert len(set(delays)) > 1
+
+    def test_retry_after_is_honored(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=30.0)
+        assert policy.backoff(1, retry_after=20) >= 20
+        # Retry-After 過長時以 max_delay 為上限
+        assert policy.backoff(1, retry_after=3600) == 30.0
+
+
+class TestRunWithRetry:
+    """重試執行測試"""
+
+    async def test_retries_transient_then_succeeds(self):
+        calls = []
+
+        async def operation():
+            calls.append(1)
+            if len(calls) < 3:
+                raise AttemptFailed("連線中斷", ERROR_TRANSIENT)
+            return "ok"
+
+        attempts = []
+        with retry_scope(attempts, retries=5):
+            assert await run_with_retry("step", operation, instant_policy()) == "ok"
+
+        assert len(calls) == 3
+        assert [a["success"] for a in attempts] == [False, False, True]
+        assert attempts[0]["error_kind"] == ERROR_TRANSIENT
+
+    async def test_permanent_is_not_retried(self):
+        calls = []
+
+        async def operation():
+            calls.append(1)
+            raise AttemptFailed("找不到", ERROR_PERMANENT)
+
+        with pytest.raises(AttemptFailed):
+            await run_with_retry("step", operation, instant_policy())
+        assert len(calls) == 1
+
+    async def test_task_budget_is_shared(self):
+        calls = []
+
+        async def operation():
+            calls.append(1)
+            raise AttemptFailed("限流", ERROR_THROTTLED)
+
+        with retry_scope([], retries=3):
+            with pytest.raises(AttemptFailed):
+                await run_with_retry("a", operation, instant_policy(max_attempts=3))
+            with pytest.raises(AttemptFailed):
+                await run_with_retry("b", operation, instant_policy(max_attempts=3))
+
+        # 第一步使用 2 次重試，第二步只剩 1 次
+        assert len(calls) == 3 + 2
+
+
+class TestCdnDownload:
+    """CDN 下載重試測試"""
+
+    def setup_method(self):
+        circuit_breakers.reset()
+
+    def test_parse_response_uses_last_hop(self):
+        stdout = (
+            b"HTTP/1.1 302 Found\r\nRetry-After: 99\r\n\r\n"
+            b"HTTP/1.1 429 Too Many Requests\r\nRetry-After: 7\r\n\r\n\n429"
+        )
+        assert cdn.parse_response(stdout) == (429, 7.0)
+        assert cdn.parse_response(b"HTTP/1.1 200 OK\r\n\r\n\n200") == (200, None)
+
+    async def test_retries_throttled_response(self, tmp_path):
+        output_path = str(tmp_path / "video.mp4")
+        responses = [b"HTTP/1.1 429 Too Many Requests\r\nRetry-After: 0\r\n\r\n\n429", b"\n200"]
+
+        async def run(command, timeout):
+            stdout = responses.pop(0)
+            if stdout.endswith(b"200"):
+                with open(output_path, "wb") as f:
+                    f.write(b"x" * 2000)
+            return 0, stdout, b""
+
+        attempts = []
+        with retry_scope(attempts, retries=3):
+            await cdn.fetch_to_file(
+                "https://cdn.example.com/v.mp4", output_path, run, policy=instant_policy()
+            )
+
+        assert [a["success"] for a in attempts] == [False, True]
+        assert attempts[0]["error_kind"] == ERROR_THROTTLED
+
+    async def test_not_found_does_not_trip_breaker(self, tmp_path):
+        async def run(command, timeout):
+            return 0, b"\n404", b""
+
+        for _ in range(circuit_breakers.failure_threshold + 1):
+            with pytest.raises(AttemptFailed) as exc:
+                await cdn.fetch_to_file(
+                    "https://gone.example.com/v.mp4", str(tmp_path / "v.mp4"), run,
+                    policy=instant_policy(),
+                )
+            assert exc.value.kind == ERROR_MEDIA
+
+    async def test_invalid_file_is_media_error(self, tmp_path):
+        async def run(command, timeout):
+            return 0, b"\n200", b""
+
+        with pytest.raises(AttemptFailed) as exc:
+            await cdn.fetch_to_file(
+                "https://cdn.example.com/v.mp4", str(tmp_path / "v.mp4"), run, policy=instant_policy()
+            )
+        assert exc.value.kind == ERROR_MEDIA
+
+
+class PermanentDownloader(BaseDownloader):
+    """測試用下載器：第一個策略回報貼文不存在"""
+
+    platform_name = "retry_test"
+    download_strategies = ("gone", "other")
+
+    def __init__(self):
+        self.called = []
+
+    def is_valid_url(self, url: str) -> bool:
+        return True
+
+    async def download(self, url, output_path, progress_callback=None):
+        return await self._run_download_strategies(url, output_path, progress_callback)
+
+    async def _try_gone(self, url, output_path, progress_callback):
+        self.called.append("gone")
+        return DownloadResult(success=False, error="私人貼文", error_kind=ERROR_PERMANENT)
+
+    async def _try_other(self, url, output_path, progress_callback):
+        self.called.append("other")
+        return DownloadResult(success=False)
+
+
+async def test_permanent_failure_stops_strategy_chain(tmp_path):
+    downloader = PermanentDownloader()
+    attempts = []
+    with retry_scope(attempts):
+        result = await downloader.download("https://example.com/p", str(tmp_path / "v.mp4"))
+
+    assert result.error_kind == ERROR_PERMANENT
+    assert downloader.called == ["gone"]
+    assert attempts == [
+        {"step": "gone", "success": False, "elapsed": attempts[0]["elapsed"], "error_kind": ERROR_PERMANENT}
+    ]
+
+
+async def test_media_failure_continues_strategy_chain(tmp_path):
+    class StaleCdnDownloader(PermanentDownloader):
+        async def _try_gone(self, url, output_path, progress_callback):
+            self.called.append("gone")
+            return DownloadResult(success=False, error="下載失敗（HTTP 403）", error_kind=ERROR_MEDIA)
+
+    downloader = StaleCdnDownloader()
+    with retry_scope([]):
+        await downloader.download("https://example.com/p", str(tmp_path / "v.mp4"))
+
+    assert downloader.called == ["gone", "other"]
@@ -0,0 +1,233 @@
+"""
+任務取消測試
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.queue import SqliteTaskQueue, TaskQueue, TaskStatus, task_queue
+from app.scheduler import FairQueue, TaskScheduler, parse_weights
+from app.supervisor import SubprocessSupervisor
+
+
+class TestTaskScheduler:
+    """取消傳遞測試"""
+
+    async def test_cancel_kills_running_subprocess(self):
+        """測試取消任務時終止其子程序"""
+        queue = TaskQueue()
+        scheduler = TaskScheduler(queue)
+        supervisor = SubprocessSupervisor()
+        task = queue.create_task("https://www.threads.net/@u/post/A", "threads")
+
+        async def work():
+            await supervisor.run(["sleep", "30"], timeout=60)
+
+        runner = asyncio.ensure_future(scheduler.run(task.id, work()))
+        await asyncio.sleep(0.2)
+        assert supervisor.running == 1
+
+        assert scheduler.cancel(task.id) is True
+        await asyncio.wait_for(runner, timeout=5)
+
+        assert task.status == TaskStatus.CANCELLED
+        assert supervisor.running == 0
+        assert not scheduler.is_running(task.id)
+        # 已結束的任務不能再取消
+        assert scheduler.cancel(task.id) is False
+
+    def test_cancels_abandoned_tasks(self):
+        """測試長時間無人查詢的任務被自動取消"""
+        queue = TaskQueue()
+        scheduler = TaskScheduler(queue, abandon_seconds=60)
+        stale = queue.create_task("https://www.threads.net/@u/post/A", "threads")
+        fresh = queue.create_task("https://www.threads.net/@u/post/B", "threads")
+        queued = queue.create_task("https://www.threads.net/@u/post/C", "threads")
+        queue.update_task(stale.id, status=TaskStatus.PROCESSING)
+        queue.update_task(fresh.id, status=TaskStatus.PROCESSING)
+        stale.last_polled_at = datetime.now() - timedelta(seconds=120)
+        # 排隊中的任務不論多久沒被查詢都不取消
+        queued.last_polled_at = datetime.now() - timedelta(seconds=120)
+
+        assert scheduler.cancel_abandoned() == 1
+        assert stale.status == TaskStatus.CANCELLED
+        assert fresh.status == TaskStatus.PROCESSING
+        assert queued.status == TaskStatus.PENDING
+
+    def test_abandon_disabled_by_default(self):
+        queue = TaskQueue()
+        task = queue.create_task("https://www.threads.net/@u/post/A", "threads")
+        queue.update_task(task.id, status=TaskStatus.PROCESSING)
+        task.last_polled_at = datetime.now() - timedelta(days=1)
+
+        assert TaskScheduler(queue).cancel_abandoned() == 0
+
+    async def test_cancel_from_another_worker(self, tmp_path):
+        """測試共用任務表時，其他 worker 的取消會中斷本地任務"""
+        path = str(tmp_path / "tasks.db")
+        local = TaskScheduler(SqliteTaskQueue(path))
+        remote = TaskScheduler(SqliteTaskQueue(path))
+        task = local.queue.create_task("https://www.threads.net/@u/post/A", "threads")
+
+        runner = asyncio.ensure_future(local.run(task.id, asyncio.sleep(30)))
+        await asyncio.sleep(0.05)
+        assert remote.cancel(task.id) is True
+
+        assert local.cancel_revoked() == 1
+        await asyncio.wait_for(runner, timeout=5)
+        assert not local.is_running(task.id)
+
+    async def test_process_download_removes_partial_files(self, monkeypatch):
+        """測試取消後刪除部分檔案"""
+        task = task_queue.create_task("https://www.threads.net/@u/post/A", "threads")
+        storage_dir = Path(main.settings.local_storage_path)
+        storage_dir.mkdir(parents=True, exist_ok=True)
+        partial = storage_dir / f"{task.id}.ytdlp.mp4"
+
+        async def slow_download(task_id):
+            partial.write_bytes(b"partial")
+            await asyncio.sleep(30)
+
+        monkeypatch.setattr(main, "run_download", slow_download)
+        runner = asyncio.ensure_future(main.process_download(task.id))
+        await asyncio.sleep(0.05)
+        assert partial.exists()
+
+        main.scheduler.cancel(task.id)
+        await asyncio.wait_for(runner, timeout=5)
+
+        assert not partial.exists()
+        assert task.status == TaskStatus.CANCELLED
+
+    async def test_cancel_during_completion_removes_files(self, monkeypatch):
+        """測試其他 worker 在下載完成前一刻取消：結果不覆寫取消，檔案也不保留"""
+        task = task_queue.create_task("https://www.threads.net/@u/post/A", "threads")
+        storage_dir = Path(main.settings.local_storage_path)
+        storage_dir.mkdir(parents=True, exist_ok=True)
+        output = storage_dir / f"{task.id}.mp4"
+
+        async def finished_download(task_id):
+            output.write_bytes(b"video")
+            # 其他 worker 只更新了任務表，本地協程沒有被中斷
+            task_queue.update_task(task_id, status=TaskStatus.CANCELLED, error="任務已取消")
+            task_queue.update_task(task_id, status=TaskStatus.COMPLETED, progress=100, download_url="/api/files/x")
+
+        monkeypatch.setattr(main, "run_download", finished_download)
+        await asyncio.wait_for(main.process_download(task.id), timeout=5)
+
+        assert task.status == TaskStatus.CANCELLED
+        assert task.download_url is None
+        assert not output.exists()
+
+
+class TestFairQueue:
+    """加權公平排程測試"""
+
+    async def _run_all(self, fair_queue: FairQueue, submissions):
+        """依序送出 (client, name) 任務，回傳實際執行順序"""
+        order = []
+        queue = TaskQueue()
+        scheduler = TaskScheduler(queue, fair_queue=fair_queue)
+
+        async def work(name):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+        runners = [
+            asyncio.ensure_future(scheduler.run(f"{client}-{name}", work(name), client=client))
+            for client, name in submissions
+        ]
+        await asyncio.wait_for(asyncio.gather(*runners), timeout=5)
+        return order
+
+    async def test_interactive_client_is_not_starved(self):
+        """測試大量送出任務的客戶端不會餓死後到的互動使用者"""
+        submissions = [("bulk", f"b{i}") for i in range(10)] + [("user", "u0")]
+        order = await self._run_all(FairQueue(max_concurrent=1), submissions)
+
+        assert order.index("u0") <= 2
+
+    async def test_weights_share_slots(self):
+        """測試權重 2 的客戶端每輪執行 2 個任務"""
+        submissions = [("heavy", f"h{i}") for i in range(4)] + [("light", f"l{i}") for i in range(4)]
+        order = await self._run_all(
+            FairQueue(max_concurrent=1, weights={"heavy": 2}), submissions
+        )
+
+        # 第一個任務在其他任務排隊前已直接放行，之後依 2:1 輪流
+        assert order[1:7] == ["h1", "h2", "l0", "h3", "l1", "l2"]
+
+    async def test_per_client_limit(self):
+        """測試單一客戶端同時執行的任務數上限"""
+        fair_queue = FairQueue(per_client_limit=2)
+        peak = 0
+
+        async def work():
+            nonlocal peak
+            peak = max(peak, fair_queue.running)
+            await asyncio.sleep(0.01)
+
+        scheduler = TaskScheduler(TaskQueue(), fair_queue=fair_queue)
+        await asyncio.gather(*(scheduler.run(f"t{i}", work(), client="bulk") for i in range(6)))
+
+        assert peak == 2
+        assert fair_queue.snapshot()["running"] == 0
+
+    async def test_cancel_while_queued(self):
+        """測試排隊中的任務被取消時不會執行，也不佔用名額"""
+        queue = TaskQueue()
+        fair_queue = FairQueue(max_concurrent=1)
+        scheduler = TaskScheduler(queue, fair_queue=fair_queue)
+        first = queue.create_task("https://www.threads.net/@u/post/A", "threads")
+        second = queue.create_task("https://www.threads.net/@u/post/B", "threads")
+        started = []
+
+        async def work(name, seconds):
+            started.append(name)
+            await asyncio.sleep(seconds)
+
+        running = asyncio.ensure_future(scheduler.run(first.id, work("first", 0.1)))
+        queued = asyncio.ensure_future(scheduler.run(second.id, work("second", 0)))
+        await asyncio.sleep(0.02)
+        assert fair_queue.waiting == 1
+
+        assert scheduler.cancel(second.id) is True
+        await asyncio.wait_for(asyncio.gather(running, queued), timeout=5)
+
+        assert started == ["first"]
+        assert fair_queue.snapshot()["running"] == 0
+        assert fair_queue.waiting == 0
+
+    def test_parse_weights(self):
+        assert parse_weights("key:partner=4, ip:10.0.0.5=2,bad") == {
+            "key:partner": 4.0,
+            "ip:10.0.0.5": 2.0,
+        }
+
+
+class TestCancelEndpoint:
+    """DELETE /api/tasks/{task_id} 測試"""
+
+    def test_cancel_pending_task(self, client: TestClient):
+        """測試取消尚未開始的任務"""
+        task = task_queue.create_task("https://www.threads.net/@u/post/A", "threads")
+
+        response = client.delete(f"/api/tasks/{task.id}")
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "cancelled"
+
+    def test_cancel_finished_task(self, client: TestClient):
+        """測試已完成的任務回傳 409"""
+        task = task_queue.create_task("https://www.threads.net/@u/post/A", "threads")
+        task_queue.update_task(task.id, status=TaskStatus.COMPLETED)
+
+        assert client.delete(f"/api/tasks/{task.id}").status_code == 409
+
+    def test_cancel_nonexistent_task(self, client: TestClient):
+        """測試不存在的任務回傳 404"""
+        assert client.delete("/api/tasks/nonexistent").status_code == 404
@@ -0,0 +1,132 @@
+"""
+工作階段（cookie）重用測試
+"""
+
+import os
+import time
+
+import pytest
+from aiohttp import web
+
+from app import sessions
+from app.downloaders import ThreadsDownloader, threads, threads_page
+from app.downloaders.browser import RenderResult
+from app.sessions import SessionStore
+
+COOKIES = [
+    {"name": "csrftoken", "value": "abc", "domain": ".threads.net", "path": "/", "secure": True},
+    {"name": "sessionid", "value": "s1", "domain": ".threads.net", "path": "/", "httpOnly": True,
+     "expiry": int(time.time()) + 3600},
+    {"name": "other", "value": "x", "domain": ".example.com", "path": "/"},
+]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch) -> SessionStore:
+    store = SessionStore(directory=str(tmp_path / "sessions"), max_age=3600)
+    monkeypatch.setattr(sessions, "session_store", store)
+    monkeypatch.setattr(threads, "session_store", store)
+    monkeypatch.setattr(threads_page, "session_store", store)
+    return store
+
+
+class TestSessionStore:
+    """擷取、持久化、到期與輪替"""
+
+    async def test_capture_persists_and_reloads(self, store: SessionStore):
+        await store.capture("threads", COOKIES)
+
+        reloaded = SessionStore(directory=store.directory, max_age=3600)
+        header = reloaded.cookie_header("threads", "https://www.threads.net/@u/post/1")
+        assert header == "csrftoken=abc; sessionid=s1"
+        # secure cookie 不送往 http，其他網域的 cookie 不送出
+        assert reloaded.cookie_header("threads", "http://www.threads.net/") == "sessionid=s1"
+        assert reloaded.cookie_header("threads", "https://www.instagram.com/") is None
+
+    async def test_expired_cookies_and_rotation(self, store: SessionStore):
+        expired = {"name": "old", "value": "1", "domain": ".threads.net", "expiry": int(time.time()) - 1}
+        await store.capture("threads", [expired, COOKIES[0]])
+        assert store.cookie_header("threads", "https://www.threads.net/") == "csrftoken=abc"
+
+        store.max_age = 0
+        assert store.get("threads") is None
+        assert store.snapshot()["rotated"] == 1
+
+    async def test_invalidate_removes_file(self, store: SessionStore):
+        await store.capture("threads", COOKIES)
+        await store.invalidate("threads", "test")
+
+        assert store.get("threads") is None
+        assert not os.listdir(store.directory)
+        assert store.snapshot()["invalidated"] == 1
+
+    async def test_cookie_file_netscape_format(self, store: SessionStore):
+        await store.capture("threads", COOKIES)
+        async with store.cookie_file("threads") as path:
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        assert not os.path.exists(path)
+
+        assert lines[0] == "# Netscape HTTP Cookie File"
+        assert lines[1].split("\t") == [".threads.net", "TRUE", "/", "TRUE", "0", "csrftoken", "abc"]
+        assert lines[2].startswith("#HttpOnly_.threads.net\t")
+
+    async def test_no_session_no_cookie_file(self, store: SessionStore):
+        async with store.cookie_file("threads") as path:
+            assert path is None
+
+
+class TestSessionReuse:
+    """瀏覽器渲染擷取、HTTP 與 yt-dlp 重用"""
+
+    async def test_successful_render_captured(self, store: SessionStore):
+        downloader = ThreadsDownloader()
+        await downloader._remember_session(RenderResult(timed_out=True, cookies=COOKIES))
+        assert store.get("threads") is None
+
+        await downloader._remember_session(RenderResult(media_urls=["https://video.fbcdn.net/a.mp4"], cookies=COOKIES))
+        assert len(store.get("threads").cookies) == 3
+
+    async def test_fetch_page_sends_cookie_and_rotates_on_challenge(self, store: SessionStore):
+        seen = []
+
+        async def page(request):
+            seen.append(request.headers.get("Cookie"))
+            if request.path == "/blocked":
+                raise web.HTTPFound("/accounts/login/")
+            return web.Response(text="<html></html>")
+
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", page)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            await store.capture("threads", [{"name": "sessionid", "value": "s1", "domain": "127.0.0.1", "path": "/"}])
+            assert await threads_page.fetch_page(f"http://127.0.0.1:{port}/post") == "<html></html>"
+            await threads_page.fetch_page(f"http://127.0.0.1:{port}/blocked")
+        finally:
+            await runner.cleanup()
+
+        assert seen[:2] == ["sessionid=s1", "sessionid=s1"]
+        assert store.get("threads") is None
+
+    async def test_ytdlp_uses_cookies_and_drops_rejected_session(self, store: SessionStore, monkeypatch):
+        commands = []
+
+        async def fake_run_process(self, command, timeout, step):
+            commands.append(command)
+            cookie_file = command[command.index("--cookies") + 1]
+            assert os.path.exists(cookie_file)
+            return 1, b"", b"ERROR: HTTP Error 429: Too Many Requests"
+
+        monkeypatch.setattr(ThreadsDownloader, "_run_process", fake_run_process)
+        await store.capture("threads", COOKIES)
+
+        result = await ThreadsDownloader()._parse_with_ytdlp("https://www.threads.net/@u/post/1")
+
+        assert result.success is False
+        assert commands[0][:2] == ["yt-dlp", "--cookies"]
+        assert store.get("threads") is None
@@ -0,0 +1,88 @@
+"""
+子程序監管測試
+"""
+
+import asyncio
+import sys
+
+import pytest
+
+from app.supervisor import SubprocessSupervisor
+
+
+def pid_alive(pid: int) -> bool:
+    """程序仍在執行（已結束但尚未被 init 回收的殭屍程序不算）"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+class TestSubprocessSupervisor:
+    """逾時終止、並行上限與資源限制測試"""
+
+    async def test_timeout_kills_process_group(self, tmp_path):
+        """測試逾時時連同孫程序一併終止並回收"""
+        supervisor = SubprocessSupervisor()
+        pid_file = tmp_path / "grandchild.pid"
+        command = ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"]
+
+        with pytest.raises(asyncio.TimeoutError):
+            await supervisor.run(command, timeout=0.5)
+
+        grandchild = int(pid_file.read_text())
+        await asyncio.sleep(0.1)
+        assert not pid_alive(grandchild)
+        assert supervisor.running == 0
+        assert supervisor.snapshot()["timeouts"] == 1
+        assert supervisor.snapshot()["killed"] == 1
+
+    async def test_cancel_kills_child(self):
+        """測試任務取消時終止子程序"""
+        supervisor = SubprocessSupervisor()
+        task = asyncio.ensure_future(supervisor.run(["sleep", "30"], timeout=60))
+        await asyncio.sleep(0.2)
+
+        [child] = supervisor.children()
+        assert child.kind == "sleep"
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not pid_alive(child.pid)
+        assert supervisor.running == 0
+
+    async def test_per_kind_concurrency_limit(self):
+        """測試同類型子程序依上限排隊執行"""
+        supervisor = SubprocessSupervisor(concurrency={"sleep": 1})
+        peak = 0
+
+        async def watch():
+            nonlocal peak
+            while True:
+                peak = max(peak, supervisor.snapshot()["by_kind"].get("sleep", 0))
+                await asyncio.sleep(0.01)
+
+        watcher = asyncio.ensure_future(watch())
+        try:
+            results = await asyncio.gather(
+                supervisor.run(["sleep", "0.2"], timeout=5),
+                supervisor.run(["sleep", "0.2"], timeout=5),
+            )
+        finally:
+            watcher.cancel()
+
+        assert [code for code, _, _ in results] == [0, 0]
+        assert peak == 1
+        assert supervisor.started == 2
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="需要 prlimit")
+    async def test_memory_limit(self):
+        """測試超過記憶體上限的子程序失敗"""
+        supervisor = SubprocessSupervisor(memory_limit_mb=256)
+        script = "import time; time.sleep(0.2); x = bytearray(512 * 1024 * 1024)"
+        code, _, stderr = await supervisor.run([sys.executable, "-c", script], timeout=10)
+
+        assert code != 0
+        assert b"MemoryError" in stderr
@@ -0,0 +1,120 @@
+"""
+Threads 頁面解析測試（使用儲存的 HTML fixtures）
+"""
+
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+
+from app.downloaders import threads_page
+from app.downloaders.threads_page import (
+    extract_media_items,
+    get_embed_url,
+    get_shortcode,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures" / "threads"
+
+
+def load_fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+class TestThreadsPageHelpers:
+    """網址處理測試"""
+
+    def test_get_shortcode(self):
+        """測試取得 shortcode"""
+        assert get_shortcode("https://www.threads.net/@user/post/C9xVideo1") == "C9xVideo1"
+        assert get_shortcode("https://www.threads.com/t/ABC_123-x?igshid=1") == "ABC_123-x"
+        assert get_shortcode("https://www.threads.net/@user") is None
+
+    def test_get_embed_url(self):
+        """測試 /embed 網址"""
+        assert (
+            get_embed_url("https://www.threads.net/@user/post/ABC/?xmt=1")
+            == "https://www.threads.net/@user/post/ABC/embed"
+        )
+        assert get_embed_url("https://www.threads.net/@u/post/ABC/embed") == (
+            "https://www.threads.net/@u/post/ABC/embed"
+        )
+
+
+class TestExtractMediaItems:
+    """內嵌 JSON 解析測試"""
+
+    def test_video_post(self):
+        """測試單一影片貼文：選最高解析度並帶出尺寸與時長"""
+        items = extract_media_items(load_fixture("post_video.html"), "C9xVideo1")
+
+        assert len(items) == 1
+        video = items[0]
+        assert video.type == "video"
+        assert "video_720.mp4" in video.url
+        assert "&oh=00_2" in video.url
+        assert "poster_720.jpg" in video.thumbnail
+        assert (video.width, video.height) == (720, 1280)
+        assert video.duration == "1:15"
+
+    def test_selects_target_post_over_replies(self):
+        """測試只回傳目標貼文，不包含回覆中的媒體"""
+        items = extract_media_items(load_fixture("post_video.html"), "C9xReply1")
+        assert [item.url.rsplit("/", 1)[-1] for item in items] == ["reply_1080.jpg"]
+
+    def test_carousel_post(self):
+        """測試輪播貼文依序列出所有項目"""
+        items = extract_media_items(load_fixture("post_carousel.html"), "C9xCarou1")
+
+        assert [item.type for item in items] == ["image", "video", "image"]
+        assert "slide1_1440.jpg" in items[0].url
+        assert (items[0].width, items[0].height) == (1440, 1800)
+        assert items[1].duration == "0:12"
+        assert "slide2_poster.jpg" in items[1].thumbnail
+
+    def test_embed_video_tag(self):
+        """測試 embed 頁面的 <video> 標籤並還原 HTML 實體"""
+        items = extract_media_items(load_fixture("embed_video.html"), "C9xVideo1")
+
+        assert len(items) == 1
+        assert items[0].url.endswith("embed_video.mp4?efg=abc&oh=00_3")
+        assert items[0].thumbnail.endswith("embed_poster.jpg?stp=a&oh=1")
+
+    def test_login_wall_has_no_media(self):
+        """測試登入牆頁面回傳空列表"""
+        assert extract_media_items(load_fixture("login_wall.html"), "C9xVideo1") == []
+
+
+class TestFetchMediaItems:
+    """HTTP 抓取測試（本機假伺服器）"""
+
+    @pytest.fixture
+    async def server_url(self):
+        async def post(request):
+            return web.Response(text=load_fixture("login_wall.html"), content_type="text/html")
+
+        async def embed(request):
+            return web.Response(text=load_fixture("embed_video.html"), content_type="text/html")
+
+        app = web.Application()
+        app.router.add_get("/@user/post/C9xVideo1", post)
+        app.router.add_get("/@user/post/C9xVideo1/embed", embed)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        yield f"http://127.0.0.1:{port}"
+        await runner.cleanup()
+
+    async def test_falls_back_to_embed(self, server_url: str):
+        """測試主頁面無媒體時改抓 /embed"""
+        items = await threads_page.fetch_media_items(f"{server_url}/@user/post/C9xVideo1")
+
+        assert len(items) == 1
+        assert items[0].type == "video"
+        assert "embed_video.mp4" in items[0].url
+
+    async def test_not_found(self, server_url: str):
+        """測試頁面不存在時回傳空列表"""
+        assert await threads_page.fetch_media_items(f"{server_url}/@user/post/Missing") == []
@@ -3,18 +3,74 @@
 """
 Threads 下載腳本 - 專為 n8n 設計
 使用 Selenium 模擬瀏覽器來繞過反爬蟲機制
+
+放在完整的專案目錄中執行時，頁面影片 URL 掃描沿用後端的 backend/app/media_scan.py
+（跳脫還原、畫質排序）；單獨複製到其他地方執行時改用下方較簡單的內建掃描，仍可獨立運作
 """
 
 import sys
 import os
+import re
+import json
 import time
+import random
 import subprocess
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# 與後端共用的頁面影片 URL 掃描（只依賴標準函式庫）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+try:
+    from app.media_scan import scan_video_urls, strip_range_params
+except ImportError:
+    scan_video_urls = None
+
+    def strip_range_params(url):
+        """去除 DASH 片段的 bytestart/byteend 參數，取得完整檔案 URL"""
+        parsed = urlparse(url)
+        query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+                 if k not in ("bytestart", "byteend")]
+        return urlunparse(parsed._replace(query=urlencode(query)))
+
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 
+# 不需要的資源類型，在網路層直接封鎖
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.css",
+]
+
+# 內建掃描：頁面源碼中可能的影片 URL 模式（依優先順序）
+SOURCE_VIDEO_PATTERNS = [
+    r'https?:(?:\\?/){2}[^"\s<>]+?\.(?:mp4|mov|webm)[^"\s<>]*',
+    r'https?:(?:\\?/){2}[^"\s<>]*(?:cdninstagram|fbcdn)[^"\s<>]*',
+]
+
+def find_video_urls(page_source):
+    """頁面源碼中的候選影片 URL（已解碼跳脫、去重，依畫質由高到低）"""
+    if scan_video_urls is not None:
+        return [candidate.url for candidate in scan_video_urls(page_source, "threads")]
+    # 內建掃描：只還原常見跳脫，依模式順序與出現順序排列
+    candidates = []
+    for pattern in SOURCE_VIDEO_PATTERNS:
+        for raw in re.findall(pattern, page_source):
+            url = raw.rstrip("\\").replace("\\/", "/").replace("\\u0026", "&").replace("&amp;", "&")
+            if url not in candidates:
+                candidates.append(url)
+    return candidates
+
+# 重試等待：指數退避 + 抖動（至少等待一半），避免固定間隔的重試同時打到上游
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 30.0
+
+def retry_delay(attempt):
+    """第 attempt 次（從 0 起算）失敗後的等待秒數"""
+    ceiling = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(ceiling / 2, ceiling)
+
 def setup_chrome_driver():
     """設置 Chrome 瀏覽器驅動"""
     try:
@@ -27,6 +83,9 @@ def setup_chrome_driver():
         chrome_options.add_argument("--disable-gpu")
         chrome_options.add_argument("--window-size=1920,1080")
         chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+        # DOMContentLoaded 後即返回，之後由網路事件判斷影片是否已出現
+        chrome_options.page_load_strategy = "eager"
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
         
         # 在 Docker 容器中設置 Chrome 二進制檔案路徑
         chrome_options.binary_location = "/usr/bin/chromium-browser"
@@ -36,11 +95,45 @@ def setup_chrome_driver():
         
         # 嘗試創建驅動
         driver = webdriver.Chrome(service=service, options=chrome_options)
+
+        # 封鎖圖片、字型與樣式表，減少頻寬與渲染時間
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
         return driver
     except Exception as e:
         print(f"❌ 無法創建 Chrome 驅動: {e}")
         return None
 
+def wait_for_media_response(driver, timeout=20, poll_interval=0.2):
+    """
+    監聽 DevTools 網路事件，觀察到 fbcdn/cdninstagram 的影片回應就立即返回
+
+    取代固定秒數的等待：快的頁面不到一秒即可返回，慢的頁面最多等待 timeout 秒
+    """
+    deadline = time.time() + timeout
+    media_urls = []
+    while True:
+        for entry in driver.get_log("performance"):
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            if message.get("method") != "Network.responseReceived":
+                continue
+            response = message.get("params", {}).get("response", {})
+            media_url = response.get("url", "")
+            host = urlparse(media_url).hostname or ""
+            is_cdn = host.endswith("fbcdn.net") or host.endswith("cdninstagram.com")
+            is_video = (response.get("mimeType") or "").startswith("video/") or ".mp4" in media_url
+            if is_cdn and is_video:
+                # 去除 DASH 片段的位元組範圍參數，取得完整檔案
+                media_url = strip_range_params(media_url)
+                if media_url not in media_urls:
+                    media_urls.append(media_url)
+        if media_urls or time.time() >= deadline:
+            return media_urls
+        time.sleep(poll_interval)
+
 def download_threads_video(url, video_id, is_retry=False):
     """下載 Threads 影片"""
     print(f"🎯 開始下載 Threads 影片: {url}")
@@ -64,9 +157,9 @@ def download_threads_video(url, video_id, is_retry=False):
             print("🌐 正在加載頁面...")
             driver.get(url)
             
-            # 等待頁面加載，增加等待時間
-            print("⏳ 等待頁面完全加載...")
-            time.sleep(10 + (attempt * 5))  # 每次重試增加等待時間
+            # 等待影片網路回應出現（每次重試放寬截止時間）
+            print("⏳ 等待影片網路回應...")
+            captured_urls = wait_for_media_response(driver, timeout=10 + (attempt * 5))
             
             print("📄 頁面標題:", driver.title)
             print("🔗 當前 URL:", driver.current_url)
@@ -74,30 +167,39 @@ def download_threads_video(url, video_id, is_retry=False):
             # 嘗試多種影片檢測策略
             video_found = False
             
+            # 策略 0: 使用網路層捕捉到的影片 URL
+            for captured_url in captured_urls:
+                print(f"✅ 捕捉到影片回應: {captured_url}")
+                output_file = f"/data/video/{video_id}.mp4"
+                if download_with_curl(captured_url, video_id, output_file):
+                    video_found = True
+                    break
+            
             # 策略 1: 等待影片元素出現
-            print("🔍 策略 1: 等待影片元素...")
-            try:
-                video_elements = WebDriverWait(driver, 20).until(
-                    EC.presence_of_all_elements_located((By.TAG_NAME, "video"))
-                )
+            if not video_found:
+                print("🔍 策略 1: 等待影片元素...")
+                try:
+                    video_elements = WebDriverWait(driver, 20).until(
+                        EC.presence_of_all_elements_located((By.TAG_NAME, "video"))
+                    )
                 
-                print(f"🎥 找到 {len(video_elements)} 個影片元素")
+                    print(f"🎥 找到 {len(video_elements)} 個影片元素")
                 
-                for i, video in enumerate(video_elements):
-                    src = video.get_attribute('src')
-                    print(f"  影片 {i+1}: {src}")
+                    for i, video in enumerate(video_elements):
+                        src = video.get_attribute('src')
+                        print(f"  影片 {i+1}: {src}")
                     
-                    if src and src.startswith('http'):
-                        print(f"✅ 找到影片 URL: {src}")
+                        if src and src.startswith('http'):
+                            print(f"✅ 找到影片 URL: {src}")
                         
-                        # 嘗試下載影片
-                        success = download_video_with_ytdlp(src, video_id)
-                        if success:
-                            video_found = True
-                            break
+                            # 嘗試下載影片
+                            success = download_video_with_ytdlp(src, video_id)
+                            if success:
+                                video_found = True
+                                break
                 
-            except Exception as e:
-                print(f"⚠️  策略 1 失敗: {e}")
+                except Exception as e:
+                    print(f"⚠️  策略 1 失敗: {e}")
             
             # 策略 2: 查找其他媒體元素
             if not video_found:
@@ -185,32 +287,15 @@ def download_threads_video(url, video_id, is_retry=False):
                     page_source = driver.page_source
                     
                     # 查找可能的影片 URL 模式
-                    import re
-                    video_patterns = [
-                        r'https?://[^"\s]+\.mp4[^"\s]*',
-                        r'https?://[^"\s]+\.mov[^"\s]*',
-                        r'https?://[^"\s]+\.webm[^"\s]*',
-                        r'https?://[^"\s]+video[^"\s]*',
-                        r'https?://[^"\s]+media[^"\s]*',
-                        r'https?://[^"\s]+instagram[^"\s]*\.fbcdn[^"\s]*',
-                        r'https?://[^"\s]+cdninstagram[^"\s]*'
-                    ]
-                    
-                    for pattern in video_patterns:
-                        matches = re.findall(pattern, page_source)
-                        if matches:
-                            print(f"🔍 找到匹配的 URL 模式: {pattern}")
-                            for match in matches:
-                                print(f"  匹配: {match}")
-                                
-                                # 嘗試下載
-                                success = download_video_with_ytdlp(match, video_id)
-                                if success:
-                                    video_found = True
-                                    break
-                            if video_found:
-                                break
-                                
+                    for match in find_video_urls(page_source):
+                        print(f"  匹配: {match}")
+
+                        # 嘗試下載
+                        success = download_video_with_ytdlp(match, video_id)
+                        if success:
+                            video_found = True
+                            break
+
                 except Exception as e:
                     print(f"⚠️  策略 5 失敗: {e}")
             
@@ -221,8 +306,9 @@ def download_threads_video(url, video_id, is_retry=False):
             else:
                 print(f"❌ 嘗試 {attempt + 1} 未找到可下載的影片")
                 if attempt < max_attempts - 1:
-                    print("🔄 等待後重試...")
-                    time.sleep(5)
+                    delay = retry_delay(attempt)
+                    print(f"🔄 等待 {delay:.1f} 秒後重試...")
+                    time.sleep(delay)
                 driver.quit()
                 continue
                 
@@ -231,8 +317,9 @@ def download_threads_video(url, video_id, is_retry=False):
             if driver:
                 driver.quit()
             if attempt < max_attempts - 1:
-                print("🔄 等待後重試...")
-                time.sleep(5)
+                delay = retry_delay(attempt)
+                print(f"🔄 等待 {delay:.1f} 秒後重試...")
+                time.sleep(delay)
             continue
     
     print("❌ 所有主要策略嘗試都失敗了")
@@ -277,26 +364,13 @@ def download_threads_with_backup_strategy(url, video_id):
             print("✅ 成功獲取頁面內容")
             
             # 分析頁面內容，尋找影片 URL
-            import re
-            video_patterns = [
-                r'https?://[^"\s]+\.mp4[^"\s]*',
-                r'https?://[^"\s]+\.mov[^"\s]*',
-                r'https?://[^"\s]+\.webm[^"\s]*',
-                r'https?://[^"\s]+video[^"\s]*',
-                r'https?://[^"\s]+media[^"\s]*'
-            ]
-            
-            for pattern in video_patterns:
-                matches = re.findall(pattern, result.stdout)
-                if matches:
-                    print(f"🔍 找到匹配的 URL 模式: {pattern}")
-                    for match in matches:
-                        print(f"  匹配: {match}")
-                        
-                        # 嘗試下載
-                        success = download_video_with_ytdlp(match, video_id)
-                        if success:
-                            return True
+            for match in find_video_urls(result.stdout):
+                print(f"  匹配: {match}")
+
+                # 嘗試下載
+                success = download_video_with_ytdlp(match, video_id)
+                if success:
+                    return True
         else:
             print(f"❌ curl 失敗: {result.stderr}")
             
@@ -309,28 +383,18 @@ def download_threads_with_backup_strategy(url, video_id):
         driver = setup_chrome_driver()
         if driver:
             driver.get(url)
-            time.sleep(3)
+            wait_for_media_response(driver, timeout=3)
             
             # 快速檢查頁面
             page_source = driver.page_source
             
             # 查找影片 URL
-            import re
-            video_patterns = [
-                r'https?://[^"\s]+\.mp4[^"\s]*',
-                r'https?://[^"\s]+\.mov[^"\s]*',
-                r'https?://[^"\s]+\.webm[^"\s]*',
-            ]
-            
-            for pattern in video_patterns:
-                matches = re.findall(pattern, page_source)
-                if matches:
-                    for match in matches:
-                        success = download_video_with_ytdlp(match, video_id)
-                        if success:
-                            driver.quit()
-                            return True
-            
+            for match in find_video_urls(page_source):
+                success = download_video_with_ytdlp(match, video_id)
+                if success:
+                    driver.quit()
+                    return True
+
             driver.quit()
     except Exception as e:
         print(f"❌ 無頭模式出錯: {e}")
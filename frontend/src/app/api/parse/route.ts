@@ -1,4 +1,5 @@
 import { NextRequest, NextResponse } from 'next/server';
+import { forwardedFor } from '@/lib/forwarded';
 
 const BACKEND_URL = process.env.BACKEND_URL || 'http://localhost:7988';
 
@@ -14,12 +15,18 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    // 轉發到後端
+    // 轉發到後端（附上使用者 IP，讓後端依使用者限流）
+    const headers: Record<string, string> = {
+      'Content-Type': 'application/json',
+    };
+    const clientChain = forwardedFor(request);
+    if (clientChain) {
+      headers['X-Forwarded-For'] = clientChain;
+    }
+
     const response = await fetch(`${BACKEND_URL}/api/parse`, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
+      headers,
       body: JSON.stringify({ url, platform }),
     });
 
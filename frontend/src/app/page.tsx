@@ -189,7 +189,7 @@ export default function Home() {
 
         if (data.status === 'completed') {
           return data.downloadUrl;
-        } else if (data.status === 'failed') {
+        } else if (data.status === 'failed' || data.status === 'cancelled') {
           return null;
         }
       } catch {
@@ -0,0 +1,17 @@
+import { NextRequest } from 'next/server';
+
+/**
+ * 轉發到後端時的 X-Forwarded-For
+ *
+ * 將前端看到的對端位址附加到既有的 X-Forwarded-For 之後，而不是原樣轉傳：
+ * 使用者自行帶入的值只會留在左側，後端依 FORWARDED_TRUSTED_HOPS 從右側取第一個不可信的位址
+ */
+export function forwardedFor(request: NextRequest): string | null {
+  const existing = request.headers.get('x-forwarded-for');
+  // Next.js 自架時 request.ip 可能為空；此時 Next.js 只在沒有標頭時以對端位址補上
+  const peer = request.ip;
+  if (!peer) {
+    return existing;
+  }
+  return existing ? `${existing}, ${peer}` : peer;
+}